@@ -105,10 +105,15 @@ def register_blueprints(app):
 def setup_hooks(app):
     """Configura hooks de request/response"""
     from backend.db import init_db, csrf_protect, generate_csrf_token
+    from backend.connections import release_connections
     
     # Inicializar base de datos
     init_db()
     
+    # Las conexiones SQLite se reutilizan por hilo; al acabar cada petición
+    # se deshace cualquier transacción que haya quedado abierta
+    app.teardown_appcontext(release_connections)
+    
     # Configurar CSRF protection
     app.before_request(csrf_protect)
     app.jinja_env.globals['csrf_token'] = generate_csrf_token
@@ -1,89 +1,136 @@
 """
 Módulo de IA para Un Podcast Seguro
 Implementa RAG (Retrieval Augmented Generation) usando Gemini y SQLite FTS5
+
+El LLM se elige con LLM_PROVIDER (ver backend/llm_providers.py).
 """
-import os
-import json
-import sqlite3
-from google import genai
+import time
+import asyncio
 from backend.config import Config
+from backend.connections import get_connection
+from backend.cache import TTLCache
+from backend.singleflight import SingleFlight, wait_async
+from backend.text_es import normalize_query, estimate_tokens
+from backend.search import get_search_connection, get_index_generation, search_transcripts
+from backend.prompting import assemble_prompt
+from backend.intents import route_query
+from backend.llm_gateway import LLMGateway, TokenBudget
+from backend.llm_providers import create_provider
+from backend.extractive import extractive_answer
+from backend import metrics
 
-# Configurar Gemini
-client = None
-if Config.GEMINI_API_KEY:
-    try:
-        client = genai.Client(api_key=Config.GEMINI_API_KEY)
-    except Exception as e:
-        print(f"Error configuring Gemini client: {e}")
-else:
-    print("Warning: GEMINI_API_KEY not found in environment variables")
+# Error si Gemini falla a mitad de una respuesta en streaming
+ERROR_GENERATION = "Lo siento, hubo un error al procesar tu solicitud con la IA."
 
-def get_db_connection():
-    """Obtener conexión a la base de datos"""
-    conn = sqlite3.connect(Config.DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Caché de respuestas: la clave incluye la generación del índice, así que
+# publicar un índice nuevo invalida de hecho todas las entradas anteriores
+answer_cache = TTLCache('answer_cache', maxsize=Config.ANSWER_CACHE_SIZE,
+                        ttl=Config.ANSWER_CACHE_TTL)
 
-def load_episode_metadata():
-    """Cargar metadatos de todos los episodios desde videos.json"""
-    try:
-        json_path = os.path.join(Config.DATA_FOLDER, 'videos.json')
-        if not os.path.exists(json_path):
-            return ""
-            
-        with open(json_path, 'r', encoding='utf-8') as f:
-            videos = json.load(f)
-            
-        # Formatear lista compacta para el contexto
-        lines = ["LISTADO COMPLETO DE EPISODIOS (Úsalo para listar, ordenar o contar):"]
-        for v in videos:
-            lines.append(f"- ID: {v.get('id')} | Título: {v.get('title')} | Publicado: {v.get('published', 'N/A')}")
-        return "\n".join(lines)
-    except Exception as e:
-        print(f"Error cargando metadatos de episodios: {e}")
-        return ""
+# Preguntas idénticas simultáneas (misma clave que la caché) comparten una
+# única búsqueda y una única llamada a Gemini
+chat_flight = SingleFlight('chat_flight')
 
-def search_transcripts(query, limit=5):
+# Proveedor del LLM: Gemini, falso (benchmarks) o grabación/reproducción
+provider = create_provider()
+
+# Todas las llamadas al LLM pasan por la pasarela: plazo, reintentos,
+# hedging y circuit breaker
+gateway = LLMGateway('gemini')
+token_budget = TokenBudget('gemini', Config.LLM_TOKENS_PER_MINUTE)
+
+def get_db_connection():
+    """Obtener conexión (del pool del hilo) a la base de datos"""
+    return get_connection('main')
+
+def build_prompt(query, context):
     """
-    Buscar en las transcripciones usando FTS5
+    Construir el prompt para Gemini dentro del presupuesto de tokens
     
     Args:
-        query (str): Consulta del usuario
-        limit (int): Número máximo de resultados
+        query (str): Pregunta del usuario
+        context (list): Lista de resultados de la búsqueda
         
     Returns:
-        list: Lista de diccionarios con los resultados
+        str: Prompt con el catálogo (completo o relevante) y los fragmentos
     """
+    prompt, _ = assemble_prompt(query, context)
+    return prompt
+
+def load_passage_texts(context):
+    """Texto completo de los pasajes encontrados, por passage_id"""
+    ids = [res['passage_id'] for res in context if res.get('passage_id')]
+    if not ids:
+        return {}
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Buscar en la tabla virtual FTS5
-        # Usamos snippet() para obtener un fragmento relevante con el término de búsqueda
-        cursor.execute('''
-            SELECT 
-                title,
-                url,
-                published,
-                snippet(transcripts_search, 2, '<b>', '</b>', '...', 64) as fragment,
-                rank
-            FROM transcripts_search 
-            WHERE transcripts_search MATCH ? 
-            ORDER BY rank 
-            LIMIT ?
-        ''', (query, limit))
-        
-        results = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return results
+        conn = get_search_connection()
+        placeholders = ','.join('?' * len(ids))
+        rows = conn.execute(
+            f'SELECT id, content FROM transcript_passages WHERE id IN ({placeholders})', ids
+        ).fetchall()
+        return {row['id']: row['content'] for row in rows}
     except Exception as e:
-        print(f"Error en búsqueda FTS5: {e}")
-        return []
+        print(f"Error cargando pasajes: {e}")
+        return {}
+
+def fallback_answer(query, context, reason):
+    """
+    Respuesta extractiva local (sin Gemini)
+    
+    Args:
+        reason (str): 'fast', 'no_client', 'breaker_open', 'budget' o 'error'
+    """
+    metrics.incr(f'chat.fallback.{reason}')
+    return extractive_answer(query, context, load_passage_texts(context),
+                             reason='fast' if reason == 'fast' else None)
+
+def prepare_llm_call(query, context, fast=False):
+    """
+    Decidir si se llama a Gemini y construir el prompt
+    
+    Returns:
+        tuple: (motivo para no llamar o None, prompt o None)
+    """
+    if fast:
+        return 'fast', None
+    if not provider.available():
+        return 'no_client', None
+    if gateway.breaker.is_open():
+        return 'breaker_open', None
+    prompt = build_prompt(query, context)
+    if not token_budget.try_spend(estimate_tokens(prompt)):
+        return 'budget', None
+    return None, prompt
+
+def call_llm(prompt):
+    return gateway.call(lambda: provider.generate(prompt))
+
+def stream_llm(prompt):
+    return gateway.stream(lambda: provider.open_stream(prompt))
+
+def compose_answer(query, context, fast=False):
+    """
+    Generar la respuesta con Gemini o, si no es posible, de forma extractiva
+    
+    Returns:
+        tuple: (respuesta, modo) con modo 'llm' o 'extractive'
+    """
+    reason, prompt = prepare_llm_call(query, context, fast)
+    if reason is None:
+        try:
+            return call_llm(prompt), 'llm'
+        except Exception as e:
+            print(f"Error generando respuesta con Gemini: {e}")
+            reason = 'error'
+    return fallback_answer(query, context, reason), 'extractive'
 
 def generate_answer(query, context):
     """
     Generar respuesta usando Gemini
     
+    Si Gemini no está configurado, falla o está fuera de presupuesto, la
+    respuesta se construye con las frases más relevantes de los pasajes.
+    
     Args:
         query (str): Pregunta del usuario
         context (list): Lista de resultados de la búsqueda
@@ -91,50 +138,288 @@ def generate_answer(query, context):
     Returns:
         str: Respuesta generada
     """
-    if not client:
-        return "Error: Cliente de Gemini no configurado (API Key faltante)."
+    answer, _ = compose_answer(query, context)
+    return answer
 
-    try:
-        # Cargar contexto global de episodios
-        global_episodes = load_episode_metadata()
-
-        # Construir el prompt con el contexto
-        context_text = "\n\n".join([
-            f"Fragmento relevante ({res['title']}): ...{res['fragment']}..." 
-            for res in context
-        ])
-        
-        prompt = f"""
-        Actúa como un asistente experto en ciberseguridad para "Un Podcast Seguro".
-        
-        TIENES A TU DISPOSICIÓN DOS FUENTES DE INFORMACIÓN:
-        1. CONTEXTO GLOBAL: La lista completa de todos los episodios existentes hasta la fecha.
-        2. FRAGMENTOS DE TRANSCRIPCIONES: Partes específicas del contenido donde se encuentra la respuesta detallada.
-
-        INSTRUCCIONES:
-        - Si el usuario pide LISTAR episodios, invitados, o temas generales, USA EL CONTEXTO GLOBAL.
-        - Si el usuario pregunta sobre un tema específico (qué dijo tal persona, cómo funciona X), USA LOS FRAGMENTOS DE TRANSCRIPCIONES.
-        - Si la respuesta no está en ninguna fuente, di que no tienes esa información.
-        - Ordena cronológicamente si se pide (fíjate en el número de episodio #XX si existe).
-
-        === CONTEXTO GLOBAL (LISTA DE TODOS LOS EPISODIOS) ===
-        {global_episodes}
-        ======================================================
+def answer_query(query, fast=False):
+    """
+    Buscar contexto y generar respuesta, pasando antes por la caché
+    
+    La clave es la consulta normalizada (sin mayúsculas, tildes, signos ni
+    stopwords) más la generación del índice de búsqueda. Si otra petición
+    con la misma clave ya está en curso, se espera a su resultado. Las
+    preguntas de catálogo (listar, contar...) se responden sin Gemini.
+    
+    Args:
+        query (str): Pregunta del usuario
+        fast (bool): Responder solo de forma extractiva (mode=fast)
         
-        === FRAGMENTOS DE TRANSCRIPCIONES RELEVANTES ===
-        {context_text}
-        ================================================
+    Returns:
+        tuple: (respuesta, fuentes, cacheada)
+    """
+    # Preguntas de catálogo: respuesta local, sin búsqueda ni Gemini
+    routed = route_query(query)
+    if routed is not None:
+        _, answer, sources = routed
+        return answer, sources, False
 
-        Pregunta: {query}
-        
-        Respuesta:
-        """
+    key = (normalize_query(query), get_index_generation())
+    cached = answer_cache.get(key)
+    if cached is not None:
+        answer, context = cached
+        return answer, context, True
+
+    if fast:
+        context = search_transcripts(query)
+        return fallback_answer(query, context, 'fast'), context, False
+
+    def compute():
+        started = time.monotonic()
+        context = search_transcripts(query)
+        answer, mode = compose_answer(query, context)
+        store_answer(key, answer, context, started, mode)
+        return answer, context
+
+    answer, context = chat_flight.do(key, compute)
+    return answer, context, False
+
+def store_answer(key, answer, context, started, mode):
+    """Registrar la latencia y guardar en caché las respuestas de Gemini"""
+    elapsed = time.monotonic() - started
+    metrics.observe(f'chat.answer.{mode}', elapsed)
+    # Las extractivas no se cachean: la próxima vez se vuelve a intentar Gemini
+    if answer and mode == 'llm':
+        answer_cache.set(key, (answer, context), cost=elapsed)
+
+def replay_answer(answer, context, **done):
+    """Eventos de streaming para una respuesta ya completa"""
+    yield 'sources', context
+    yield 'token', answer
+    yield 'done', {'cached': False, **done}
+
+def answer_query_stream(query, fast=False):
+    """
+    Versión en streaming de answer_query
+    
+    Primero emite las fuentes (en cuanto termina la búsqueda) y después los
+    fragmentos de la respuesta según los produce el modelo. Una respuesta
+    cacheada, extractiva o la de otra petición idéntica en curso se emite
+    de una vez.
+    
+    Args:
+        query (str): Pregunta del usuario
+        fast (bool): Responder solo de forma extractiva (mode=fast)
         
-        response = client.models.generate_content(
-            model='gemini-flash-latest',
-            contents=prompt
-        )
-        return response.text
+    Yields:
+        tuple: (evento, datos) con evento en 'sources', 'token', 'done', 'error'
+    """
+    routed = route_query(query)
+    if routed is not None:
+        intent, answer, sources = routed
+        yield from replay_answer(answer, sources, intent=intent)
+        return
+
+    key = (normalize_query(query), get_index_generation())
+    cached = answer_cache.get(key)
+    if cached is not None:
+        yield from replay_answer(*cached, cached=True)
+        return
+
+    if fast:
+        context = search_transcripts(query)
+        yield from replay_answer(fallback_answer(query, context, 'fast'), context,
+                                 mode='extractive')
+        return
+
+    future, leader = chat_flight.begin(key)
+    if not leader:
+        try:
+            answer, context = future.result()
+        except Exception:
+            metrics.incr('chat_flight.leader_failures')
+        else:
+            yield from replay_answer(answer, context, coalesced=True)
+            return
+
+    started = time.monotonic()
+    parts = []
+    context = []
+    mode = 'llm'
+    error = None
+    try:
+        context = search_transcripts(query)
+        yield 'sources', context
+
+        reason, prompt = prepare_llm_call(query, context)
+        if reason is None:
+            try:
+                for chunk in stream_llm(prompt):
+                    if not parts:
+                        metrics.observe('chat.first_token', time.monotonic() - started)
+                    parts.append(chunk)
+                    yield 'token', chunk
+            except Exception as e:
+                if parts:
+                    raise
+                # Aún no se ha enviado texto: se puede responder en extractivo
+                print(f"Error generando respuesta con Gemini: {e}")
+                reason = 'error'
+
+        if reason is not None:
+            mode = 'extractive'
+            parts = [fallback_answer(query, context, reason)]
+            yield 'token', parts[0]
+
+        store_answer(key, "".join(parts), context, started, mode)
+    except Exception as e:
+        print(f"Error generando respuesta con Gemini: {e}")
+        error = e
+        yield 'error', ERROR_GENERATION
+        return
+    except BaseException as e:
+        # El cliente se fue a mitad: las seguidoras calculan por su cuenta
+        error = e
+        raise
+    finally:
+        if leader:
+            chat_flight.finish(key, result=("".join(parts), context), error=error)
+
+    yield 'done', {'cached': False, 'mode': mode}
+
+
+# ==================== VERSIÓN ASÍNCRONA ====================
+# Usada por la ruta ASGI nativa (backend/asgi.py): la llamada a Gemini es una
+# corrutina, así que un chat en curso no ocupa un hilo durante segundos.
+# SQLite no tiene API asíncrona; sus consultas (milisegundos) van a un hilo,
+# igual que el router de intenciones y el prompt, que leen el catálogo.
+
+async def call_llm_async(prompt):
+    return await gateway.call_async(lambda: provider.generate_async(prompt))
+
+def stream_llm_async(prompt):
+    return gateway.stream_async(lambda: provider.open_stream_async(prompt))
+
+async def compose_answer_async(query, context, fast=False):
+    """Igual que compose_answer, con el cliente asíncrono de Gemini"""
+    reason, prompt = await asyncio.to_thread(prepare_llm_call, query, context, fast)
+    if reason is None:
+        try:
+            return await call_llm_async(prompt), 'llm'
+        except Exception as e:
+            print(f"Error generando respuesta con Gemini: {e}")
+            reason = 'error'
+    answer = await asyncio.to_thread(fallback_answer, query, context, reason)
+    return answer, 'extractive'
+
+async def generate_answer_async(query, context):
+    """Igual que generate_answer, con el cliente asíncrono de Gemini"""
+    answer, _ = await compose_answer_async(query, context)
+    return answer
+
+async def answer_query_async(query, fast=False):
+    """Igual que answer_query, sin bloquear el bucle de eventos"""
+    routed = await asyncio.to_thread(route_query, query)
+    if routed is not None:
+        _, answer, sources = routed
+        return answer, sources, False
+
+    generation = await asyncio.to_thread(get_index_generation)
+    key = (normalize_query(query), generation)
+    cached = answer_cache.get(key)
+    if cached is not None:
+        answer, context = cached
+        return answer, context, True
+
+    if fast:
+        context = await asyncio.to_thread(search_transcripts, query)
+        answer = await asyncio.to_thread(fallback_answer, query, context, 'fast')
+        return answer, context, False
+
+    async def compute():
+        started = time.monotonic()
+        context = await asyncio.to_thread(search_transcripts, query)
+        answer, mode = await compose_answer_async(query, context)
+        store_answer(key, answer, context, started, mode)
+        return answer, context
+
+    answer, context = await chat_flight.do_async(key, compute)
+    return answer, context, False
+
+async def answer_query_stream_async(query, fast=False):
+    """Igual que answer_query_stream, sin bloquear el bucle de eventos"""
+    routed = await asyncio.to_thread(route_query, query)
+    if routed is not None:
+        intent, answer, sources = routed
+        for event in replay_answer(answer, sources, intent=intent):
+            yield event
+        return
+
+    generation = await asyncio.to_thread(get_index_generation)
+    key = (normalize_query(query), generation)
+    cached = answer_cache.get(key)
+    if cached is not None:
+        for event in replay_answer(*cached, cached=True):
+            yield event
+        return
+
+    if fast:
+        context = await asyncio.to_thread(search_transcripts, query)
+        answer = await asyncio.to_thread(fallback_answer, query, context, 'fast')
+        for event in replay_answer(answer, context, mode='extractive'):
+            yield event
+        return
+
+    future, leader = chat_flight.begin(key)
+    if not leader:
+        try:
+            answer, context = await wait_async(future)
+        except Exception:
+            metrics.incr('chat_flight.leader_failures')
+        else:
+            for event in replay_answer(answer, context, coalesced=True):
+                yield event
+            return
+
+    started = time.monotonic()
+    parts = []
+    context = []
+    mode = 'llm'
+    error = None
+    try:
+        context = await asyncio.to_thread(search_transcripts, query)
+        yield 'sources', context
+
+        reason, prompt = await asyncio.to_thread(prepare_llm_call, query, context)
+        if reason is None:
+            try:
+                async for chunk in stream_llm_async(prompt):
+                    if not parts:
+                        metrics.observe('chat.first_token', time.monotonic() - started)
+                    parts.append(chunk)
+                    yield 'token', chunk
+            except Exception as e:
+                if parts:
+                    raise
+                print(f"Error generando respuesta con Gemini: {e}")
+                reason = 'error'
+
+        if reason is not None:
+            mode = 'extractive'
+            parts = [await asyncio.to_thread(fallback_answer, query, context, reason)]
+            yield 'token', parts[0]
+
+        store_answer(key, "".join(parts), context, started, mode)
     except Exception as e:
         print(f"Error generando respuesta con Gemini: {e}")
-        return "Lo siento, hubo un error al procesar tu solicitud con la IA."
+        error = e
+        yield 'error', ERROR_GENERATION
+        return
+    except BaseException as e:
+        # El cliente se fue a mitad: las seguidoras calculan por su cuenta
+        error = e
+        raise
+    finally:
+        if leader:
+            chat_flight.finish(key, result=("".join(parts), context), error=error)
+
+    yield 'done', {'cached': False, 'mode': mode}
@@ -0,0 +1,231 @@
+"""
+Aplicación ASGI
+Sirve el chat de forma nativa (asíncrona) y delega el resto en Flask
+
+Las peticiones a Flask pasan por WsgiToAsgi, que ocupa un hilo del pool
+durante toda la petición. Para el chat eso supone segundos esperando a
+Gemini, así que /api/chat y /api/chat/stream se atienden aquí como
+corrutinas: cientos de chats simultáneos no consumen cientos de hilos.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+from http.cookies import SimpleCookie
+from backend.ai import answer_query_async, answer_query_stream_async
+from backend.utils import sse_event
+from backend.constants import SECURITY_HEADERS, MAX_CHAT_BODY_SIZE
+from backend import metrics
+
+
+def create_asgi_app(flask_app, fallback):
+    """
+    Crea la aplicación ASGI del sitio
+
+    Args:
+        flask_app: Aplicación Flask (para validar la sesión y el token CSRF)
+        fallback: Aplicación ASGI para el resto de rutas (Flask vía WsgiToAsgi)
+
+    Returns:
+        Aplicación ASGI
+    """
+    routes = {
+        ('POST', '/api/chat'): chat,
+        ('POST', '/api/chat/stream'): chat_stream,
+    }
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'http':
+            handler = routes.get((scope['method'], scope['path']))
+            if handler is not None:
+                await handle(flask_app, handler, scope, receive, send)
+                return
+        await fallback(scope, receive, send)
+
+    return app
+
+
+async def handle(flask_app, handler, scope, receive, send):
+    """Valida CSRF, lee el cuerpo JSON y llama a la vista asíncrona"""
+    headers = {key.decode('latin-1').lower(): value.decode('latin-1')
+               for key, value in scope['headers']}
+
+    if not csrf_valid(flask_app, headers):
+        await send_json(send, {'error': 'CSRF token missing or incorrect'}, 403)
+        return
+
+    # Más de MAX_CHAT_BODY_SIZE: 413 por Content-Length, sin leer el cuerpo,
+    # o en cuanto se pasa del límite al leerlo
+    body = None
+    if content_length_ok(headers, MAX_CHAT_BODY_SIZE):
+        body = await read_body(receive, MAX_CHAT_BODY_SIZE)
+    if body is None:
+        metrics.incr('asgi.body_too_large')
+        await send_json(send, {'error': 'Request body too large'}, 413)
+        return
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    query = data.get('message')
+
+    if not query:
+        await send_json(send, {'error': 'No message provided'}, 400)
+        return
+
+    metrics.incr('asgi.chat_requests')
+    metrics.incr('asgi.chat_in_flight')
+    try:
+        await handler(query, receive, send, fast=wants_fast_mode(scope, data))
+    finally:
+        metrics.incr('asgi.chat_in_flight', -1)
+
+
+def csrf_valid(flask_app, headers):
+    """
+    Misma comprobación que csrf_protect: X-CSRFToken debe coincidir con el
+    token guardado en la cookie de sesión firmada de Flask
+    """
+    cookie = SimpleCookie()
+    cookie.load(headers.get('cookie', ''))
+    morsel = cookie.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return False
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if serializer is None:
+        return False
+    try:
+        session = serializer.loads(
+            morsel.value,
+            max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+        )
+    except Exception:
+        return False
+
+    token = session.get('csrf_token')
+    return bool(token) and headers.get('x-csrftoken') == token
+
+
+def wants_fast_mode(scope, data):
+    """mode=fast en el cuerpo JSON o en la URL (igual que la vista Flask)"""
+    mode = data.get('mode')
+    if not mode:
+        args = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        mode = (args.get('mode') or [None])[0]
+    return mode == 'fast'
+
+
+def content_length_ok(headers, limit):
+    """Content-Length declarado dentro del límite (o ausente)"""
+    try:
+        return int(headers.get('content-length', 0)) <= limit
+    except ValueError:
+        return False
+
+
+async def read_body(receive, limit):
+    """
+    Lee el cuerpo completo de la petición
+
+    Returns:
+        bytes, o None si supera `limit` (se deja de leer en cuanto lo pasa)
+    """
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if len(body) > limit:
+            return None
+        if not message.get('more_body'):
+            break
+    return body
+
+
+def response_headers(*headers):
+    """
+    Cabeceras de la respuesta más las de seguridad
+
+    Estas rutas no pasan por Flask, así que after_request no las añade.
+    """
+    return list(headers) + [
+        (name.lower().encode('latin-1'), value.encode('latin-1'))
+        for name, value in SECURITY_HEADERS.items()
+    ]
+
+
+async def send_json(send, data, status=200):
+    """Envía una respuesta JSON completa"""
+    payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': response_headers(
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode()),
+        ),
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def chat(query, receive, send, fast=False):
+    """Chat con IA usando RAG (misma respuesta que la vista Flask)"""
+    try:
+        answer, context, cached = await answer_query_async(query, fast=fast)
+        await send_json(send, {
+            'answer': answer,
+            'sources': context,
+            'cached': cached
+        })
+    except Exception as e:
+        print(f"Error in chat endpoint: {e}")
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def chat_stream(query, receive, send, fast=False):
+    """Chat con IA en streaming (text/event-stream); se corta si el cliente se va"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': response_headers(
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ),
+    })
+
+    disconnected = asyncio.create_task(wait_disconnect(receive))
+    events = answer_query_stream_async(query, fast=fast)
+    try:
+        async for event, payload in events:
+            if disconnected.done():
+                metrics.incr('asgi.chat_disconnects')
+                break
+            await send({
+                'type': 'http.response.body',
+                'body': sse_event(event, payload).encode('utf-8'),
+                'more_body': True,
+            })
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {e}")
+        await send({
+            'type': 'http.response.body',
+            'body': sse_event('error', str(e)).encode('utf-8'),
+            'more_body': True,
+        })
+    finally:
+        await events.aclose()
+        disconnected.cancel()
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def wait_disconnect(receive):
+    """Termina cuando el cliente cierra la conexión"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
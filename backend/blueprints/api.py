@@ -8,11 +8,16 @@ import sys
 import subprocess
 import threading
 import re
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from backend.config import Config
-from backend.utils import load_json_file, save_json_file
+from backend.utils import load_json_file, save_json_file, sse_event, api_login_required
 import requests
-from backend.ai import search_transcripts, generate_answer
+from backend.ai import answer_query, answer_query_stream, answer_cache, chat_flight, gateway, provider
+from backend.search import search_page, ranking_cache, CursorError
+from backend.suggest import suggest
+from backend.sync_state import ensure_schema as ensure_sync_state_schema, attempts_summary, lease_status
+from backend.connections import get_connection, connection_stats
+from backend import metrics, catalog, prompting
 
 api_bp = Blueprint('api', __name__)
 
@@ -104,8 +109,67 @@ def api_awards():
         return jsonify({'error': str(e)}), 500
 
 
+# ==================== BÚSQUEDA ====================
+
+@api_bp.route('/search', methods=['GET'])
+def api_search():
+    """
+    Búsqueda en las transcripciones, sin IA
+    
+    Parámetros: q (pregunta), limit, cursor (next_cursor de la página
+    anterior) y group=episode para agrupar los pasajes por episodio.
+    Cada pasaje trae 'fragment' en texto plano y 'highlights', las
+    posiciones [inicio, fin] de las palabras que casan con la pregunta.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    try:
+        return jsonify(search_page(
+            query,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            group=request.args.get('group') == 'episode'
+        ))
+    except CursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in search endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@api_bp.route('/suggest', methods=['GET'])
+def api_suggest():
+    """
+    Autocompletado del buscador: la última palabra de q completada con las
+    más frecuentes del corpus y episodios cuyo título casa con q
+    """
+    query = request.args.get('q') or ''
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    try:
+        return jsonify(suggest(query[:200], limit=limit))
+    except Exception as e:
+        print(f"Error in suggest endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== AI CHAT ====================
 
+def wants_fast_mode(data):
+    """mode=fast en el cuerpo JSON o en la URL: respuesta extractiva, sin Gemini"""
+    mode = data.get('mode') or request.args.get('mode')
+    return mode == 'fast'
+
+
 @api_bp.route('/chat', methods=['POST'])
 def api_chat():
     """Chat con IA usando RAG"""
@@ -116,21 +180,54 @@ def api_chat():
         if not query:
             return jsonify({'error': 'No message provided'}), 400
             
-        # 1. Buscar contexto relevante
-        context = search_transcripts(query)
-        
-        # 2. Generar respuesta
-        answer = generate_answer(query, context)
+        # Buscar contexto y generar respuesta (o servirla desde la caché)
+        answer, context, cached = answer_query(query, fast=wants_fast_mode(data))
         
         return jsonify({
             'answer': answer,
-            'sources': context
+            'sources': context,
+            'cached': cached
         })
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Chat con IA usando RAG, respondiendo en streaming (text/event-stream)
+    
+    Eventos: 'sources' (lista de fuentes), 'token' (trozo de respuesta),
+    'done' ({'cached': bool, ...}) o 'error' (mensaje). Con mode=fast la
+    respuesta es extractiva, sin pasar por Gemini.
+    """
+    data = request.get_json(silent=True) or {}
+    query = data.get('message')
+    fast = wants_fast_mode(data)
+    
+    if not query:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    def generate():
+        try:
+            for event, payload in answer_query_stream(query, fast=fast):
+                yield sse_event(event, payload)
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {e}")
+            yield sse_event('error', str(e))
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Evitar que nginx acumule la respuesta antes de enviarla
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 # ==================== JSON DATA ====================
 
 @api_bp.route('/recommendations', methods=['GET'])
@@ -259,12 +356,27 @@ def api_youtube_videos():
         return jsonify([])
 
 
+def load_sync_state():
+    """Registro de intentos de descarga y lease del worker de sincronización"""
+    try:
+        conn = get_connection()
+        ensure_sync_state_schema(conn)
+        return {
+            'download_attempts': attempts_summary(conn),
+            'sync_worker': lease_status(conn, 'sync')
+        }
+    except Exception as e:
+        print(f"Error leyendo estado de sincronización: {e}")
+        return {'download_attempts': None, 'sync_worker': None}
+
+
 @api_bp.route('/sync_status')
 def api_sync_status():
     """Obtener estado de sincronización"""
     if os.path.exists(Config.SYNC_LOG_PATH):
         try:
             data = load_json_file(Config.SYNC_LOG_PATH)
+            data.update(load_sync_state())
             return jsonify(data)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -273,5 +385,25 @@ def api_sync_status():
             'last_sync': None,
             'total_videos': 0,
             'new_videos_found': 0,
-            'transcripts_downloaded': 0
+            'transcripts_downloaded': 0,
+            **load_sync_state()
         })
+
+
+@api_bp.route('/metrics')
+@api_login_required
+def api_metrics():
+    """Métricas del proceso: conexiones SQLite, cachés, tiempos (solo usuarios autenticados)"""
+    data = metrics.snapshot()
+    data['sqlite'] = connection_stats()
+    data['answer_cache'] = answer_cache.stats()
+    data['chat_flight'] = chat_flight.stats()
+    data['search_ranking'] = ranking_cache.stats()
+    data['llm'] = {'provider': provider.name, **gateway.stats()}
+    data['catalog'] = catalog.stats()
+    data['router'] = {
+        name.split('.', 1)[1]: value
+        for name, value in data['counters'].items() if name.startswith('router.')
+    }
+    data['prompt'] = prompting.stats()
+    return jsonify(data)
@@ -2,11 +2,10 @@
 Blueprint de Autenticación
 Maneja login, logout y perfil de usuario
 """
-import sqlite3
 import os
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
-from backend.config import Config
+from backend.connections import get_connection
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -18,11 +17,10 @@ def vista_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        conn = sqlite3.connect(Config.DATABASE)
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM usuarios WHERE username=?', (username,))
         user = cursor.fetchone()
-        conn.close()
 
         if user and check_password_hash(user[2], password): 
             session['usuario'] = username
@@ -49,7 +47,7 @@ def vista_perfil():
         nuevo_usuario = request.form.get('nuevo_usuario')
         nueva_contrasena = request.form.get('nueva_contrasena')
 
-        conn = sqlite3.connect(Config.DATABASE)
+        conn = get_connection()
         cursor = conn.cursor()
 
         if nuevo_usuario:
@@ -63,7 +61,6 @@ def vista_perfil():
                          (hash_nueva, session['usuario']))
 
         conn.commit()
-        conn.close()
         flash('Datos actualizados correctamente', 'success')
         return redirect(url_for('auth.vista_perfil'))
 
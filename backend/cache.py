@@ -0,0 +1,75 @@
+"""
+Caché en memoria
+LRU acotada por tamaño y con caducidad (TTL), con métricas de aciertos
+"""
+import threading
+import time
+from collections import OrderedDict
+from backend import metrics
+
+
+class TTLCache:
+    """
+    Caché LRU con TTL, segura entre hilos
+
+    Cada entrada guarda también cuánto costó calcularla, de modo que los
+    aciertos suman la latencia ahorrada en las métricas.
+    """
+
+    def __init__(self, name, maxsize=512, ttl=3600):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve el valor cacheado o None (cuenta acierto/fallo)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+
+        if entry is None:
+            metrics.incr(f'{self.name}.misses')
+            return None
+
+        value, _, cost = entry
+        metrics.incr(f'{self.name}.hits')
+        metrics.incr(f'{self.name}.saved_ms', int(cost * 1000))
+        return value
+
+    def set(self, key, value, cost=0.0):
+        """Guarda `value`; `cost` son los segundos que costó calcularlo"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl, cost)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                metrics.incr(f'{self.name}.evictions')
+
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Tamaño, aciertos, fallos, tasa de acierto y latencia ahorrada"""
+        hits = metrics.get_counter(f'{self.name}.hits')
+        misses = metrics.get_counter(f'{self.name}.misses')
+        with self._lock:
+            size = len(self._data)
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'saved_ms': metrics.get_counter(f'{self.name}.saved_ms'),
+            'evictions': metrics.get_counter(f'{self.name}.evictions'),
+        }
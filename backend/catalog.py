@@ -0,0 +1,181 @@
+"""
+Catálogo de episodios e invitados en memoria
+Bloque "LISTADO COMPLETO DE EPISODIOS" precalculado para el prompt y datos
+para responder preguntas de catálogo sin llamar al modelo
+
+Se reconstruye solo cuando cambian videos.json o guests.json (mtime/tamaño,
+comprobado como mucho cada CHECK_INTERVAL segundos) o cuando una
+sincronización en este mismo proceso avisa con invalidate().
+"""
+import os
+import re
+import json
+import threading
+import time
+from backend.config import Config
+from backend.text_es import estimate_tokens, content_terms
+from backend import metrics
+
+# Frecuencia máxima con la que se miran los ficheros
+CHECK_INTERVAL = 5.0
+
+# "#52. Ariadna Diaz. Prepárate la entrevista..." -> número e invitado
+TITLE_RE = re.compile(r'^\s*#(\d+)\.\s*([^.]+?)\.\s')
+
+_lock = threading.Lock()
+_state = {
+    'token': None,      # (mtime_ns, size) de videos.json y guests.json al construir
+    'checked_at': float('-inf'),
+    'block': "",
+    'entries': [],
+    'guests': [],
+    'episodes': 0,
+    'tokens': 0,
+    'built_at': None,
+}
+
+
+def videos_json_path():
+    return os.path.join(Config.DATA_FOLDER, 'videos.json')
+
+
+def _file_token(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _files_token():
+    return (_file_token(videos_json_path()), _file_token(Config.GUESTS_JSON))
+
+
+def catalog_line(video):
+    """Línea de un episodio en el catálogo del prompt"""
+    return f"- ID: {video.get('id')} | Título: {video.get('title')} | Publicado: {video.get('published', 'N/A')}"
+
+
+def build_catalog_entries(videos):
+    """Episodios con su línea ya formateada, las palabras del título y el invitado"""
+    entries = []
+    for v in videos:
+        title = v.get('title') or ''
+        match = TITLE_RE.match(title)
+        entries.append({
+            'id': v.get('id'),
+            'title': title,
+            'url': v.get('link') or (f"https://www.youtube.com/watch?v={v.get('id')}" if v.get('id') else ''),
+            'published': v.get('published'),
+            'number': int(match.group(1)) if match else None,
+            'guest': match.group(2).strip() if match else None,
+            'line': catalog_line(v),
+            'terms': frozenset(content_terms(title)),
+        })
+    return entries
+
+
+def build_guest_index(entries, guests):
+    """
+    Invitados conocidos: los de guests.json y los que aparecen en los títulos
+
+    Returns:
+        list: [{'name', 'terms'}] sin duplicados (mismas palabras del nombre)
+    """
+    names = [g.get('name') for g in guests if isinstance(g, dict) and g.get('name')]
+    names += [entry['guest'] for entry in entries if entry['guest']]
+
+    index = []
+    seen = set()
+    for name in names:
+        terms = frozenset(content_terms(name))
+        if len(terms) < 2 or terms in seen:
+            continue
+        seen.add(terms)
+        index.append({'name': name, 'terms': terms})
+    return index
+
+
+def build_catalog_block(entries):
+    """Formatear la lista compacta de episodios para el contexto"""
+    lines = ["LISTADO COMPLETO DE EPISODIOS (Úsalo para listar, ordenar o contar):"]
+    lines.extend(entry['line'] for entry in entries)
+    return "\n".join(lines)
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _rebuild(token):
+    try:
+        entries = build_catalog_entries(_load_json(videos_json_path(), []))
+        guests = build_guest_index(entries, _load_json(Config.GUESTS_JSON, []))
+        block = build_catalog_block(entries) if entries else ""
+    except Exception as e:
+        print(f"Error cargando metadatos de episodios: {e}")
+        # Mantener el catálogo anterior; se reintenta en la próxima comprobación
+        return
+
+    _state.update(token=token, block=block, entries=entries, guests=guests,
+                  episodes=len(entries), tokens=estimate_tokens(block),
+                  built_at=time.time())
+    metrics.incr('catalog.rebuilds')
+
+
+def _refresh():
+    """Reconstruir si los ficheros han cambiado (como mucho cada CHECK_INTERVAL)"""
+    if time.monotonic() - _state['checked_at'] < CHECK_INTERVAL:
+        return
+
+    with _lock:
+        now = time.monotonic()
+        if now - _state['checked_at'] >= CHECK_INTERVAL:
+            token = _files_token()
+            if token != _state['token'] or _state['built_at'] is None:
+                _rebuild(token)
+            _state['checked_at'] = now
+
+
+def get_catalog_block():
+    """
+    Bloque del catálogo listo para el prompt
+
+    En el caso normal solo devuelve la cadena ya construida.
+    """
+    _refresh()
+    return _state['block']
+
+
+def get_catalog_entries():
+    """Episodios del catálogo (más recientes primero, como en videos.json)"""
+    _refresh()
+    return _state['entries']
+
+
+def get_guests():
+    """Invitados conocidos, con las palabras de su nombre"""
+    _refresh()
+    return _state['guests']
+
+
+def invalidate():
+    """Forzar la reconstrucción en la próxima petición (p. ej. tras sincronizar)"""
+    with _lock:
+        _state['checked_at'] = float('-inf')
+        _state['built_at'] = None
+
+
+def stats():
+    """Episodios, tokens estimados y fecha de construcción del bloque"""
+    return {
+        'episodes': _state['episodes'],
+        'guests': len(_state['guests']),
+        'chars': len(_state['block']),
+        'tokens': _state['tokens'],
+        'built_at': _state['built_at'],
+        'rebuilds': metrics.get_counter('catalog.rebuilds'),
+    }
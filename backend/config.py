@@ -18,6 +18,42 @@ class Config:
     
     # AI Configuration
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-flash-latest')
+    # Solo para pruebas: servidor local compatible (scripts/fake_gemini_server.py)
+    GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL')
+    
+    # Proveedor del LLM: gemini, fake, record o replay (backend/llm_providers.py)
+    LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+    LLM_FAKE_LATENCY = float(os.getenv('LLM_FAKE_LATENCY', '0.5'))
+    LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv('LLM_FAKE_TOKENS_PER_SECOND', '50'))
+    LLM_FAKE_ANSWER_TOKENS = int(os.getenv('LLM_FAKE_ANSWER_TOKENS', '120'))
+    LLM_RECORDINGS = os.getenv('LLM_RECORDINGS', os.path.join(BASE_DIR, 'database', 'llm_recordings.jsonl'))
+    
+    # Pasarela del LLM: plazo (s), reintentos, backoff (s), hedging y breaker
+    LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '30'))
+    LLM_STREAM_IDLE_TIMEOUT = float(os.getenv('LLM_STREAM_IDLE_TIMEOUT', '15'))
+    LLM_RETRIES = int(os.getenv('LLM_RETRIES', '2'))
+    LLM_BACKOFF = float(os.getenv('LLM_BACKOFF', '0.5'))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '4'))
+    # Hedging (opcional): duplica las llamadas lentas, y cada duplicado es
+    # otra petición de pago a Gemini
+    LLM_HEDGE = os.getenv('LLM_HEDGE', '0') == '1'
+    LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+    LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+    # Tokens de entrada por minuto hacia Gemini (0 = sin límite)
+    LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '0'))
+    
+    # Caché de respuestas del chat (entradas, segundos)
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '512'))
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', str(6 * 3600)))
+    
+    # Caché de rankings de /api/search (entradas, segundos)
+    SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '600'))
+    
+    # Presupuesto del prompt (tokens totales, tokens máximos por fragmento)
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '4000'))
+    PROMPT_FRAGMENT_TOKENS = int(os.getenv('PROMPT_FRAGMENT_TOKENS', '200'))
     
     # Sesión
     SESSION_COOKIE_HTTPONLY = True
@@ -53,6 +89,10 @@ class Config:
     
     # Base de datos
     DATABASE = os.path.join(BASE_DIR, 'database', 'usuarios.db')
+    # Índice de transcripciones (se reemplaza entero en cada sincronización)
+    SEARCH_DATABASE = os.path.join(BASE_DIR, 'database', 'search.db')
+    # Búsqueda híbrida: vectores locales (requiere NumPy) fusionados con BM25
+    VECTOR_SEARCH = os.getenv('VECTOR_SEARCH', '1') == '1'
     
     # Sincronización
     SYNC_LOG_PATH = os.path.join(BASE_DIR, 'sync_log.json')
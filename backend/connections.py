@@ -0,0 +1,120 @@
+"""
+Conexiones SQLite
+Factoría central: PRAGMAs ajustados, pool por hilo y solo lectura para búsqueda
+"""
+import os
+import sqlite3
+import threading
+from backend.config import Config
+from backend import metrics
+
+# Ajustes aplicados a cada conexión nueva
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 256 * 1024 * 1024        # 256 MB
+CACHE_SIZE_KIB = 16 * 1024           # 16 MB (cache_size negativo = KiB)
+
+# Bases de datos con nombre que sirve el pool
+_DATABASES = {
+    'main': lambda: (Config.DATABASE, False),
+    'search': lambda: (Config.SEARCH_DATABASE, True),
+}
+
+_local = threading.local()
+
+
+def connect(path, readonly=False):
+    """
+    Abre una conexión nueva con los PRAGMAs del proyecto
+
+    Args:
+        path: Ruta del fichero SQLite
+        readonly: Abrir con mode=ro (no crea el fichero si no existe)
+
+    Returns:
+        sqlite3.Connection con row_factory = sqlite3.Row
+    """
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    if not readonly:
+        conn.execute('PRAGMA synchronous = NORMAL')
+
+    metrics.incr('sqlite.connections_opened')
+    return conn
+
+
+def _file_token(path):
+    """Identidad del fichero: cambia cuando la sincronización publica otro índice"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def get_connection(name='main'):
+    """
+    Conexión del pool del hilo actual ('main' = usuarios.db, 'search' = search.db)
+
+    La conexión se reutiliza entre peticiones servidas por el mismo hilo.
+    La de búsqueda se reabre sola cuando search.db se reemplaza, así que
+    cada consulta ve la última generación publicada. No hay que cerrarla:
+    el teardown de la petición deshace transacciones pendientes.
+    """
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = _local.pool = {}
+
+    path, readonly = _DATABASES[name]()
+    token = _file_token(path) if readonly else None
+
+    entry = pool.get(name)
+    if entry is not None:
+        conn, conn_path, conn_token = entry
+        if conn_path == path and conn_token == token:
+            metrics.incr('sqlite.connections_reused')
+            return conn
+        conn.close()
+        metrics.incr('sqlite.connections_recycled')
+
+    conn = connect(path, readonly=readonly)
+    pool[name] = (conn, path, token)
+    return conn
+
+
+def release_connections(exception=None):
+    """Teardown de petición: deshace lo que una vista haya dejado sin confirmar"""
+    pool = getattr(_local, 'pool', None) or {}
+    for conn, _, _ in pool.values():
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            pass
+
+
+def close_connections():
+    """Cierra las conexiones del pool del hilo actual"""
+    pool = getattr(_local, 'pool', None) or {}
+    for conn, _, _ in pool.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    pool.clear()
+
+
+def connection_stats():
+    """Contadores de conexiones abiertas, reutilizadas y recicladas"""
+    return {
+        'opened': metrics.get_counter('sqlite.connections_opened'),
+        'reused': metrics.get_counter('sqlite.connections_reused'),
+        'recycled': metrics.get_counter('sqlite.connections_recycled'),
+    }
@@ -11,6 +11,7 @@ ALLOWED_DOCUMENT_EXTENSIONS = {'pdf', 'txt', 'md'}
 # Tamaños máximos de archivo (en bytes)
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5 MB
 MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50 MB
+MAX_CHAT_BODY_SIZE = 16 * 1024  # 16 KB (cuerpo JSON de /api/chat)
 
 # Configuración de caché
 CACHE_STATIC_MAX_AGE = 31536000  # 1 año
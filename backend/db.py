@@ -1,16 +1,17 @@
 """
 Utilidades de base de datos
 """
-import sqlite3
 import os
 import secrets
 from flask import session, jsonify, request
 from backend.config import Config
+from backend.connections import connect
+from backend.search_index import drop_legacy_tables
 
 
 def init_db():
     """Inicializar la base de datos"""
-    conn = sqlite3.connect(Config.DATABASE)
+    conn = connect(Config.DATABASE)
     cursor = conn.cursor()
     
     # Tabla de usuarios
@@ -25,17 +26,9 @@ def init_db():
     # Configurar modo WAL para mejor concurrencia
     cursor.execute('PRAGMA journal_mode=WAL;')
     
-    # Tabla de búsqueda de transcripciones
-    cursor.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_search USING fts5(
-            filename,
-            title,
-            content,
-            url,
-            published,
-            tokenize='porter'
-        );
-    ''')
+    # El índice de transcripciones vive en search.db: retirar el antiguo
+    if os.path.exists(Config.SEARCH_DATABASE):
+        drop_legacy_tables(conn)
     
     conn.commit()
     conn.close()
@@ -0,0 +1,149 @@
+"""
+Respuestas extractivas
+Respuesta local construida con las frases más relevantes de los pasajes
+encontrados, para cuando Gemini no está disponible o se pide mode=fast
+"""
+import math
+import re
+from backend.text_es import content_terms, tokenize
+
+# Frases por respuesta, por pasaje y longitud máxima (en palabras)
+MAX_SENTENCES = 3
+MAX_PER_PASSAGE = 2
+MAX_SENTENCE_WORDS = 40
+
+# Los términos de 5+ letras casan por prefijo ("ataques" ~ "ataque")
+PREFIX_LEN = 5
+
+HEADERS = {
+    'fast': "Respuesta rápida a partir de las transcripciones:",
+    None: ("Ahora mismo no puedo elaborar la respuesta con la IA, pero esto es "
+           "lo que se dice en el podcast:"),
+}
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+_TAG_RE = re.compile(r'</?b>')
+
+
+def split_sentences(text):
+    """
+    Frases de un pasaje
+
+    Los subtítulos automáticos suelen venir sin puntuación: las frases
+    demasiado largas se parten en trozos de MAX_SENTENCE_WORDS palabras.
+    """
+    sentences = []
+    for part in _SENTENCE_RE.split(text):
+        words = part.split()
+        for i in range(0, len(words), MAX_SENTENCE_WORDS):
+            chunk = ' '.join(words[i:i + MAX_SENTENCE_WORDS])
+            if chunk:
+                sentences.append(chunk)
+    return sentences
+
+
+def _matches(term, tokens):
+    if term in tokens:
+        return True
+    if len(term) >= PREFIX_LEN:
+        prefix = term[:PREFIX_LEN]
+        return any(token.startswith(prefix) for token in tokens)
+    return False
+
+
+def score_sentences(query, candidates):
+    """
+    Puntuar frases por los términos de la pregunta que contienen
+
+    Cada término pesa según su rareza entre las frases candidatas (idf) y
+    las frases de los primeros resultados de la búsqueda pesan algo más.
+
+    Args:
+        query (str): Pregunta del usuario
+        candidates (list): [(posición del pasaje, frase)]
+
+    Returns:
+        list: [(puntuación, posición, frase)] de mayor a menor puntuación
+    """
+    terms = set(content_terms(query))
+    tokenized = [(rank, sentence, set(tokenize(sentence))) for rank, sentence in candidates]
+    total = len(tokenized)
+
+    idf = {}
+    for term in terms:
+        df = sum(1 for _, _, tokens in tokenized if _matches(term, tokens))
+        idf[term] = math.log(1 + total / (1 + df))
+
+    scored = []
+    for rank, sentence, tokens in tokenized:
+        score = sum(weight for term, weight in idf.items() if _matches(term, tokens))
+        if score <= 0:
+            continue
+        if len(tokens) < 5:
+            score *= 0.5
+        score /= 1 + 0.15 * rank
+        scored.append((score, rank, sentence))
+
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored
+
+
+def passage_text(result, texts):
+    """Texto completo del pasaje si se tiene, si no el fragmento de snippet()"""
+    text = texts.get(result.get('passage_id')) if texts else None
+    if not text:
+        text = _TAG_RE.sub('', result.get('fragment') or '').replace('...', ' ')
+    return text
+
+
+def source_label(result):
+    if result.get('timestamp'):
+        return f"{result['title']} (minuto {result['timestamp']})"
+    return result['title']
+
+
+def extractive_answer(query, context, texts=None, reason=None):
+    """
+    Construir una respuesta con las mejores frases de los pasajes
+
+    Args:
+        query (str): Pregunta del usuario
+        context (list): Resultados de search_transcripts
+        texts (dict): Texto completo de cada pasaje por passage_id (opcional)
+        reason (str): 'fast' si el usuario pidió respuesta rápida
+
+    Returns:
+        str: Respuesta en texto plano
+    """
+    if not context:
+        return "No he encontrado fragmentos de las transcripciones que respondan a esa pregunta."
+
+    candidates = [
+        (rank, sentence)
+        for rank, result in enumerate(context)
+        for sentence in split_sentences(passage_text(result, texts))
+    ]
+
+    picked = []
+    per_passage = {}
+    seen = set()
+    for _, rank, sentence in score_sentences(query, candidates):
+        fingerprint = frozenset(tokenize(sentence))
+        if per_passage.get(rank, 0) >= MAX_PER_PASSAGE or fingerprint in seen:
+            continue
+        per_passage[rank] = per_passage.get(rank, 0) + 1
+        seen.add(fingerprint)
+        picked.append((rank, sentence))
+        if len(picked) >= MAX_SENTENCES:
+            break
+
+    if not picked:
+        # La búsqueda ya encontró estos pasajes: usar el mejor fragmento
+        picked = [(0, ' '.join(passage_text(context[0], None).split()))]
+
+    lines = [HEADERS.get(reason, HEADERS[None]), ""]
+    for rank, sentence in picked:
+        lines.append(f"• «{sentence}» — {source_label(context[rank])}")
+    lines.append("")
+    lines.append("En las fuentes tienes el enlace a cada momento del episodio.")
+    return "\n".join(lines)
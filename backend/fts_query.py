@@ -0,0 +1,143 @@
+"""
+Compilador de consultas FTS5
+Convierte la pregunta del usuario en una expresión MATCH siempre válida:
+la pregunta se tokeniza, se quitan las stopwords, cada término se reduce a
+su raíz con el mismo stemmer que el índice (text_es.stem) y va entre
+comillas, así que `?`, `"`, `-`, `:` o `*` nunca llegan a FTS5 como sintaxis.
+
+    "¿Qué es el ransomware-as-a-service?"
+    -> NEAR("ransom"* "as" "servic"*, 12) OR "ransom"* OR "as" OR "servic"*
+
+Las raíces de PREFIX_LEN letras o más se buscan por prefijo, que el índice
+resuelve con su prefix index en lugar de recorrer el vocabulario.
+
+Como FTS5 indexa el texto ya reducido a raíces, snippet() devolvería raíces:
+el fragmento resaltado se construye aquí sobre el texto original.
+"""
+import re
+from backend.text_es import content_terms, tokenize, stem
+
+# Longitud del prefijo de búsqueda; debe estar en search_index.PREFIX_INDEXES
+PREFIX_LEN = 6
+
+# Términos como máximo por consulta y distancia del grupo NEAR
+MAX_TERMS = 8
+NEAR_DISTANCE = 12
+
+
+def quote(term):
+    """Término como cadena FTS5 (las comillas internas se duplican)"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def compile_term(term):
+    if len(term) >= PREFIX_LEN:
+        return quote(term[:PREFIX_LEN]) + '*'
+    return quote(term)
+
+
+def query_terms(query):
+    """Raíces de la pregunta sin stopwords ni repetidas, en orden"""
+    terms = content_terms(query) or tokenize(query)
+    unique = []
+    seen = set()
+    for term in terms:
+        term = stem(term)
+        key = term[:PREFIX_LEN]
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(term)
+    return unique[:MAX_TERMS]
+
+
+def term_matcher(query):
+    """
+    Función que dice si una palabra del texto original casa con la pregunta
+    (misma regla que compile_term: raíz exacta o prefijo)
+    """
+    exact = set()
+    prefixes = set()
+    for term in query_terms(query):
+        if len(term) >= PREFIX_LEN:
+            prefixes.add(term[:PREFIX_LEN])
+        else:
+            exact.add(term)
+
+    # Las transcripciones repiten mucho las mismas palabras
+    seen = {}
+
+    def matches(word):
+        hit = seen.get(word)
+        if hit is None:
+            hit = any(root in exact or root[:PREFIX_LEN] in prefixes
+                      for root in map(stem, tokenize(word)))
+            seen[word] = hit
+        return hit
+    return matches
+
+
+def compile_match(query):
+    """
+    Expresión MATCH para la pregunta
+
+    Cualquier término basta (OR) y BM25 ordena; el grupo NEAR hace subir
+    los pasajes donde aparecen todos cerca.
+
+    Returns:
+        str: Expresión FTS5, o None si la pregunta no tiene palabras
+    """
+    terms = [compile_term(term) for term in query_terms(query)]
+    if not terms:
+        return None
+    if len(terms) == 1:
+        return terms[0]
+    return f"NEAR({' '.join(terms)}, {NEAR_DISTANCE}) OR " + ' OR '.join(terms)
+
+
+_WORD_RE = re.compile(r'\S+')
+
+
+def highlight(text, query, size=32, ellipsis='...'):
+    """
+    Fragmento de `size` palabras con más apariciones de la pregunta y la
+    posición de cada aparición dentro del fragmento
+
+    Returns:
+        tuple: (fragmento, [[inicio, fin], ...] en caracteres); si no casa
+        ninguna palabra, el principio del texto sin posiciones
+    """
+    matches = term_matcher(query)
+    words = _WORD_RE.findall(text)
+    hits = [matches(word) for word in words]
+
+    best, best_score = 0, -1
+    for begin in range(0, max(1, len(words) - size + 1)):
+        score = sum(hits[begin:begin + size])
+        if score > best_score:
+            best, best_score = begin, score
+        if begin + size >= len(words):
+            break
+
+    fragment = ellipsis if best > 0 else ''
+    spans = []
+    for i, (word, hit) in enumerate(zip(words[best:best + size], hits[best:best + size])):
+        if i:
+            fragment += ' '
+        if hit:
+            spans.append([len(fragment), len(fragment) + len(word)])
+        fragment += word
+    if best + size < len(words):
+        fragment += ellipsis
+    return fragment, spans
+
+
+def snippet(text, query, size=32, start='<b>', end='</b>', ellipsis='...'):
+    """
+    Fragmento con las apariciones de la pregunta resaltadas (como snippet()
+    de FTS5, pero sobre el texto original)
+    """
+    fragment, spans = highlight(text, query, size, ellipsis)
+    for begin, finish in reversed(spans):
+        fragment = fragment[:begin] + start + fragment[begin:finish] + end + fragment[finish:]
+    return fragment
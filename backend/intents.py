@@ -0,0 +1,132 @@
+"""
+Router de intenciones del chat
+Responde al momento las preguntas de catálogo (listar, contar, último
+episodio, episodios de un invitado) con los datos de videos.json y
+guests.json; el resto de preguntas siguen por RAG + Gemini
+"""
+from backend.catalog import get_catalog_entries, get_guests
+from backend.text_es import content_terms
+from backend import metrics
+
+# Palabras que no aportan tema en una pregunta de catálogo
+CATALOG_WORDS = frozenset("""
+episodio episodios programa programas capitulo capitulos podcast entrevista
+entrevistas publicado publicados publicada salido salio subido hecho total
+numero lista listar listame listado enumera enumerar muestra muestrame
+mostrar ensename ver todos todas ultimo ultima ultimos recientes reciente
+nuevo nuevos invitado invitada invitados estuvo participo participado
+aparece aparecido vino hizo existen cuantos cuantas cuanto
+""".split())
+
+COUNT_PREFIXES = ('cuant', 'numero', 'total')
+LIST_PREFIXES = ('list', 'enumer', 'muestr', 'ensen', 'todos', 'todas')
+LATEST_WORDS = frozenset(('ultimo', 'ultima', 'reciente', 'nuevo'))
+
+
+def match_guest(terms, guests):
+    """Invitado cuyo nombre completo aparece en la pregunta (el más largo)"""
+    best = None
+    for guest in guests:
+        if guest['terms'] <= terms and (best is None or len(guest['terms']) > len(best['terms'])):
+            best = guest
+    return best
+
+
+def classify(query):
+    """
+    Intención de catálogo de la pregunta
+
+    Solo se reconoce cuando, quitando palabras de catálogo y el nombre del
+    invitado, no queda ningún tema: "¿qué dijo X sobre Copilot?" no es de
+    catálogo aunque nombre a un invitado.
+
+    Returns:
+        tuple: (intención, invitado) o (None, None) si es de contenido
+    """
+    terms = content_terms(query)
+    term_set = set(terms)
+    guest = match_guest(term_set, get_guests())
+
+    leftover = term_set - CATALOG_WORDS - (guest['terms'] if guest else set())
+    if leftover:
+        return None, None
+
+    if any(t.startswith(COUNT_PREFIXES) for t in terms):
+        return ('count_guest' if guest else 'count'), guest
+    if guest:
+        return 'by_guest', guest
+    if term_set & LATEST_WORDS:
+        return 'latest', None
+    if any(t.startswith(LIST_PREFIXES) for t in terms) or term_set & {'episodios', 'programas', 'capitulos'}:
+        return 'list', None
+    return None, None
+
+
+def episode_source(entry):
+    """Fuente (mismo formato que los resultados de búsqueda) de un episodio"""
+    return {
+        'title': entry['title'],
+        'url': entry['url'],
+        'published': entry['published'] or None,
+        'video_id': entry['id'],
+        'start_seconds': None,
+        'timestamp': None,
+        'timestamp_url': entry['url'],
+    }
+
+
+def guest_episodes(entries, guest):
+    return [entry for entry in entries if guest['terms'] <= entry['terms']]
+
+
+def episode_lines(entries):
+    return "\n".join(f"- {entry['title']}" for entry in entries)
+
+
+def route_query(query):
+    """
+    Responder localmente si la pregunta es de catálogo
+
+    Args:
+        query (str): Pregunta del usuario
+
+    Returns:
+        tuple: (intención, respuesta, fuentes) o None si hay que usar RAG
+    """
+    intent, guest = classify(query)
+    entries = get_catalog_entries() if intent else None
+    if not entries:
+        metrics.incr('router.rag')
+        return None
+
+    if intent == 'count':
+        answer = f"Hay {len(entries)} episodios publicados de Un Podcast Seguro."
+        sources = []
+    elif intent == 'count_guest':
+        episodes = guest_episodes(entries, guest)
+        plural = "episodio" if len(episodes) == 1 else "episodios"
+        answer = f"{guest['name']} ha participado en {len(episodes)} {plural}."
+        if episodes:
+            answer += "\n" + episode_lines(episodes)
+        sources = [episode_source(entry) for entry in episodes]
+    elif intent == 'by_guest':
+        episodes = guest_episodes(entries, guest)
+        if not episodes:
+            answer = f"No he encontrado episodios con {guest['name']}."
+        else:
+            answer = f"Episodios con {guest['name']}:\n" + episode_lines(episodes)
+        sources = [episode_source(entry) for entry in episodes]
+    elif intent == 'latest':
+        latest = entries[0]
+        answer = f"El último episodio publicado es «{latest['title']}»"
+        if latest['published']:
+            answer += f" ({latest['published']})"
+        answer += "."
+        sources = [episode_source(latest)]
+    else:
+        answer = (f"Estos son los {len(entries)} episodios de Un Podcast Seguro, "
+                  f"del más reciente al más antiguo:\n" + episode_lines(entries))
+        sources = []
+
+    metrics.incr(f'router.{intent}')
+    return intent, answer, sources
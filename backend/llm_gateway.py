@@ -0,0 +1,562 @@
+"""
+Pasarela hacia el LLM
+Plazos por llamada, reintentos acotados con backoff y jitter, petición
+duplicada (hedging) cuando la primera supera el p95 observado y circuit
+breaker que falla rápido mientras el proveedor no responde bien
+
+La pasarela no conoce el SDK: recibe funciones que hacen la llamada real,
+así que se puede probar con funciones falsas o contra un servidor local
+(scripts/fake_gemini_server.py).
+"""
+import asyncio
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
+from backend.config import Config
+from backend import metrics
+
+# Códigos HTTP que merece la pena reintentar
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Latencias recientes para el p95 y muestras mínimas antes de duplicar
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+_END = object()
+
+
+def run_in_thread(fn, name):
+    """
+    Ejecuta fn() en un hilo propio y devuelve su Future
+
+    Sin pool compartido: una llamada colgada (la corta el timeout HTTP del
+    cliente) no quita sitio a las demás, y el tiempo en cola no cuenta
+    contra el plazo ni abre el breaker.
+    """
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+
+class StreamPump:
+    """
+    Lee un stream bloqueante en un hilo propio y pasa los trozos por una cola
+
+    El consumidor espera cada trozo con plazo (get) sin ocupar más hilos;
+    close() avisa al hilo de que deje de leer tras el trozo en curso.
+    """
+
+    def __init__(self, fn, name):
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        threading.Thread(target=self._run, args=(fn,), name=name, daemon=True).start()
+
+    def _run(self, fn):
+        try:
+            for chunk in fn():
+                if self._closed.is_set():
+                    return
+                self._queue.put((chunk, None))
+            self._queue.put((_END, None))
+        except BaseException as e:
+            self._queue.put((None, e))
+
+    def get(self, timeout):
+        """Siguiente trozo (_END al terminar); FutureTimeout si no llega a tiempo"""
+        if timeout <= 0:
+            raise FutureTimeout()
+        try:
+            chunk, error = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            raise FutureTimeout() from None
+        if error is not None:
+            raise error
+        return chunk
+
+    def close(self):
+        self._closed.set()
+
+
+class LLMError(Exception):
+    """La llamada al LLM falló tras agotar los reintentos"""
+
+
+class LLMTimeout(LLMError):
+    """Se agotó el plazo de la llamada"""
+
+
+class CircuitOpenError(LLMError):
+    """El circuit breaker está abierto: no se llama al proveedor"""
+
+
+def is_retryable(error):
+    """¿Es un fallo transitorio (plazo, red, 429/5xx)?"""
+    if isinstance(error, (LLMTimeout, TimeoutError, FutureTimeout, asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code in RETRYABLE_STATUS:
+        return True
+    # Errores de transporte de httpx (usado por el SDK de Gemini)
+    return type(error).__module__.startswith('httpx')
+
+
+class CircuitBreaker:
+    """
+    Breaker de tres estados
+
+    closed: se llama normalmente. Tras `failure_threshold` fallos seguidos
+    pasa a open: todas las llamadas fallan al momento. Pasados
+    `reset_timeout` segundos, half_open deja pasar una única llamada de
+    prueba que lo cierra o lo vuelve a abrir.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe = 0
+
+    def acquire(self):
+        """
+        ¿Puede salir una llamada ahora?
+
+        Returns:
+            tuple: (permitida, id de la llamada de prueba o None); quien
+            recibe un id debe devolverlo con release() al terminar
+        """
+        with self._lock:
+            if self._state == 'closed':
+                return True, None
+            if self._state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False, None
+                self._state = 'half_open'
+                self._probing = False
+            if self._probing:
+                return False, None
+            self._probing = True
+            self._probe += 1
+            return True, self._probe
+
+    def allow(self):
+        """¿Puede salir una llamada ahora? (ver acquire)"""
+        return self.acquire()[0]
+
+    def release(self, probe):
+        """
+        Fin de la llamada de prueba `probe`, haya dado veredicto o no
+
+        Si se canceló (CancelledError, GeneratorExit...) sin llegar a
+        record_success/record_failure, otra llamada puede volver a probar.
+        """
+        if probe is None:
+            return
+        with self._lock:
+            if self._probe == probe:
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    metrics.incr(f'{self.name}.breaker_opened')
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+
+    def is_open(self):
+        """Abierto y aún dentro del tiempo de espera"""
+        with self._lock:
+            return (self._state == 'open'
+                    and time.monotonic() - self._opened_at < self.reset_timeout)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+
+class LatencyTracker:
+    """Ventana de latencias recientes (segundos) para calcular percentiles"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=1):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+class TokenBudget:
+    """
+    Tokens de entrada permitidos por minuto (ventana deslizante)
+
+    Con `per_minute` a 0 no hay límite.
+    """
+
+    def __init__(self, name, per_minute):
+        self.name = name
+        self.per_minute = per_minute
+        self._spent = deque()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def try_spend(self, tokens):
+        """Reserva `tokens` si caben en el último minuto; False si no"""
+        if not self.per_minute:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            while self._spent and self._spent[0][0] <= now - 60:
+                self._total -= self._spent.popleft()[1]
+            if self._total + tokens > self.per_minute:
+                metrics.incr(f'{self.name}.budget_exceeded')
+                return False
+            self._spent.append((now, tokens))
+            self._total += tokens
+            return True
+
+
+class LLMGateway:
+    """
+    Llamadas al LLM con plazo, reintentos, hedging y circuit breaker
+
+    Cada método recibe la función que hace la llamada real:
+    - call(fn): fn() devuelve la respuesta
+    - call_async(fn): fn() es una corrutina que devuelve la respuesta
+    - stream(fn): fn() devuelve un iterador de trozos
+    - stream_async(fn): fn() es una corrutina que devuelve un iterador asíncrono
+
+    El plazo cubre todos los intentos. En streaming el plazo se aplica
+    hasta el primer trozo y después `idle_timeout` entre trozos; solo se
+    reintenta si aún no se ha emitido nada.
+    """
+
+    def __init__(self, name='llm', deadline=None, retries=None, backoff=None,
+                 backoff_max=None, hedge=None, idle_timeout=None, breaker=None):
+        self.name = name
+        self.deadline = deadline or Config.LLM_DEADLINE
+        self.retries = Config.LLM_RETRIES if retries is None else retries
+        self.backoff = Config.LLM_BACKOFF if backoff is None else backoff
+        self.backoff_max = backoff_max or Config.LLM_BACKOFF_MAX
+        self.hedge = Config.LLM_HEDGE if hedge is None else hedge
+        self.idle_timeout = idle_timeout or Config.LLM_STREAM_IDLE_TIMEOUT
+        self.breaker = breaker or CircuitBreaker(
+            name, Config.LLM_BREAKER_FAILURES, Config.LLM_BREAKER_RESET
+        )
+        self.latency = LatencyTracker()
+
+    # ---------- política común ----------
+
+    def _check_breaker(self):
+        """Id de la llamada de prueba (o None); CircuitOpenError si no puede salir"""
+        allowed, probe = self.breaker.acquire()
+        if not allowed:
+            metrics.incr(f'{self.name}.rejected')
+            raise CircuitOpenError(f"{self.name}: circuit breaker abierto")
+        return probe
+
+    def _backoff_delay(self, attempt):
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _hedge_delay(self):
+        """Espera antes de duplicar la petición (p95 observado) o None"""
+        if not self.hedge:
+            return None
+        return self.latency.percentile(95, min_samples=HEDGE_MIN_SAMPLES)
+
+    def _retry_plan(self, error, attempt, end):
+        """
+        Decide qué hacer tras un intento fallido
+
+        Returns:
+            float: segundos a esperar antes de reintentar
+
+        Raises:
+            El error original (no transitorio) o LLMError (reintentos agotados)
+        """
+        if not is_retryable(error):
+            # El proveedor respondió (p. ej. 400): no es un problema de salud
+            self.breaker.record_success()
+            raise error
+
+        delay = self._backoff_delay(attempt)
+        if attempt >= self.retries or time.monotonic() + delay >= end:
+            self.breaker.record_failure()
+            metrics.incr(f'{self.name}.failures')
+            if isinstance(error, LLMError):
+                raise error
+            raise LLMError(f"{self.name}: {error}") from error
+
+        metrics.incr(f'{self.name}.retries')
+        return delay
+
+    def _succeeded(self, started):
+        elapsed = time.monotonic() - started
+        self.breaker.record_success()
+        self.latency.observe(elapsed)
+        metrics.observe(f'{self.name}.latency', elapsed)
+
+    def _first_chunk(self, started):
+        # El tiempo al primer trozo no se mezcla con las latencias del p95
+        self.breaker.record_success()
+        metrics.observe(f'{self.name}.first_chunk', time.monotonic() - started)
+
+    # ---------- llamadas completas ----------
+
+    def call(self, fn, deadline=None):
+        """Ejecuta fn() con la política de la pasarela (bloqueante)"""
+        probe = self._check_breaker()
+        try:
+            return self._call(fn, deadline)
+        finally:
+            self.breaker.release(probe)
+
+    def _call(self, fn, deadline):
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = self._attempt(fn, end - started)
+            except Exception as e:
+                time.sleep(self._retry_plan(e, attempt, end))
+                attempt += 1
+                continue
+            self._succeeded(started)
+            return result
+
+    def _attempt(self, fn, timeout):
+        """Un intento, con petición duplicada si tarda más que el p95"""
+        started = time.monotonic()
+        first = run_in_thread(fn, f'{self.name}-call')
+        pending = {first}
+
+        hedge_after = self._hedge_delay()
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                metrics.incr(f'{self.name}.hedged')
+                pending.add(run_in_thread(fn, f'{self.name}-hedge'))
+
+        error = None
+        while pending:
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is not first:
+                        metrics.incr(f'{self.name}.hedge_wins')
+                    return future.result()
+                error = error or future.exception()
+
+        if error is not None and not pending:
+            raise error
+        metrics.incr(f'{self.name}.timeouts')
+        raise LLMTimeout(f"{self.name}: sin respuesta en {timeout:.1f} s")
+
+    async def call_async(self, fn, deadline=None):
+        """Ejecuta await fn() con la política de la pasarela"""
+        probe = self._check_breaker()
+        try:
+            return await self._call_async(fn, deadline)
+        finally:
+            self.breaker.release(probe)
+
+    async def _call_async(self, fn, deadline):
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await self._attempt_async(fn, end - started)
+            except Exception as e:
+                await asyncio.sleep(self._retry_plan(e, attempt, end))
+                attempt += 1
+                continue
+            self._succeeded(started)
+            return result
+
+    async def _attempt_async(self, fn, timeout):
+        started = time.monotonic()
+        first = asyncio.ensure_future(fn())
+        pending = {first}
+        try:
+            hedge_after = self._hedge_delay()
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                if not done:
+                    metrics.incr(f'{self.name}.hedged')
+                    pending.add(asyncio.ensure_future(fn()))
+
+            error = None
+            while pending:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            metrics.incr(f'{self.name}.hedge_wins')
+                        return task.result()
+                    error = error or task.exception()
+
+            if error is not None and not pending:
+                raise error
+            metrics.incr(f'{self.name}.timeouts')
+            raise LLMTimeout(f"{self.name}: sin respuesta en {timeout:.1f} s")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # ---------- streaming ----------
+
+    def stream(self, fn, deadline=None):
+        """Itera los trozos de fn() con plazo al primero e inactividad después"""
+        probe = self._check_breaker()
+        try:
+            yield from self._stream(fn, deadline)
+        finally:
+            self.breaker.release(probe)
+
+    def _stream(self, fn, deadline):
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            # Un hilo por stream abre la petición y lee todos los trozos
+            pump = StreamPump(fn, f'{self.name}-stream')
+            try:
+                first = pump.get(end - time.monotonic())
+            except Exception as e:
+                pump.close()
+                if isinstance(e, FutureTimeout):
+                    metrics.incr(f'{self.name}.timeouts')
+                    e = LLMTimeout(f"{self.name}: sin primer trozo a tiempo")
+                time.sleep(self._retry_plan(e, attempt, end))
+                attempt += 1
+                continue
+            break
+
+        self._first_chunk(started)
+        chunk = first
+        try:
+            while chunk is not _END:
+                yield chunk
+                chunk = pump.get(self.idle_timeout)
+        except Exception as e:
+            # A mitad de respuesta no se reintenta: ya se ha enviado texto
+            self.breaker.record_failure()
+            metrics.incr(f'{self.name}.failures')
+            if isinstance(e, (FutureTimeout, asyncio.TimeoutError)):
+                metrics.incr(f'{self.name}.timeouts')
+                raise LLMTimeout(f"{self.name}: sin trozos en {self.idle_timeout:.1f} s") from e
+            raise LLMError(f"{self.name}: stream interrumpido: {e}") from e
+        finally:
+            pump.close()
+
+    async def stream_async(self, fn, deadline=None):
+        """Como stream(), con fn una corrutina que devuelve un iterador asíncrono"""
+        probe = self._check_breaker()
+        chunks = self._stream_async(fn, deadline)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+            self.breaker.release(probe)
+
+    async def _stream_async(self, fn, deadline):
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                iterator = (await asyncio.wait_for(fn(), max(end - started, 0))).__aiter__()
+                first = await self._anext(iterator, end - time.monotonic())
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.incr(f'{self.name}.timeouts')
+                    e = LLMTimeout(f"{self.name}: sin primer trozo a tiempo")
+                await asyncio.sleep(self._retry_plan(e, attempt, end))
+                attempt += 1
+                continue
+            break
+
+        self._first_chunk(started)
+        chunk = first
+        try:
+            while chunk is not _END:
+                yield chunk
+                chunk = await self._anext(iterator, self.idle_timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            metrics.incr(f'{self.name}.failures')
+            if isinstance(e, (FutureTimeout, asyncio.TimeoutError)):
+                metrics.incr(f'{self.name}.timeouts')
+                raise LLMTimeout(f"{self.name}: sin trozos en {self.idle_timeout:.1f} s") from e
+            raise LLMError(f"{self.name}: stream interrumpido: {e}") from e
+
+    async def _anext(self, iterator, timeout):
+        if timeout <= 0:
+            raise LLMTimeout(f"{self.name}: plazo agotado")
+        try:
+            return await asyncio.wait_for(iterator.__anext__(), timeout)
+        except StopAsyncIteration:
+            return _END
+
+    def stats(self):
+        """Estado del breaker, p95 y contadores de la pasarela"""
+        p95 = self.latency.percentile(95)
+        return {
+            'breaker': self.breaker.state,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            **{
+                key: metrics.get_counter(f'{self.name}.{key}')
+                for key in ('retries', 'timeouts', 'failures', 'rejected',
+                            'hedged', 'hedge_wins', 'breaker_opened',
+                            'budget_exceeded')
+            }
+        }
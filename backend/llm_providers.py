@@ -0,0 +1,283 @@
+"""
+Proveedores del LLM
+El chat no habla con el SDK de Gemini directamente sino con un proveedor,
+elegido con LLM_PROVIDER:
+
+- gemini: Google Gemini (google-genai)
+- fake: respuestas deterministas con latencia y velocidad configurables,
+  para medir el camino RAG completo sin red
+- record: llama a Gemini y guarda cada respuesta en LLM_RECORDINGS
+- replay: responde con lo grabado, sin red
+
+Todos ofrecen las mismas cuatro llamadas "crudas" (sin plazos ni
+reintentos; eso lo pone backend/llm_gateway.py):
+- generate(prompt) -> str
+- open_stream(prompt) -> iterador de trozos de texto
+- generate_async(prompt) -> corrutina que devuelve str
+- open_stream_async(prompt) -> corrutina que devuelve un iterador asíncrono
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from backend.config import Config
+from backend.text_es import tokenize, estimate_tokens
+from backend.llm_gateway import LLMError
+from backend import metrics
+
+
+class ReplayMissError(LLMError):
+    """El prompt no está en la grabación"""
+
+
+class GeminiProvider:
+    """Google Gemini a través de google-genai"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model=None, base_url=None):
+        self.model = model or Config.GEMINI_MODEL
+        self.client = None
+        api_key = api_key or Config.GEMINI_API_KEY
+        if not api_key:
+            print("Warning: GEMINI_API_KEY not found in environment variables")
+            return
+        try:
+            from google import genai
+            from google.genai import types
+            # Timeout HTTP real (en ms): la pasarela deja de esperar al
+            # agotar el plazo, pero es esto lo que corta la conexión colgada
+            http_options = types.HttpOptions(
+                base_url=base_url or Config.GEMINI_BASE_URL or None,
+                timeout=int(Config.LLM_DEADLINE * 1000)
+            )
+            self.client = genai.Client(api_key=api_key, http_options=http_options)
+        except Exception as e:
+            print(f"Error configuring Gemini client: {e}")
+
+    def available(self):
+        return self.client is not None
+
+    def generate(self, prompt):
+        response = self.client.models.generate_content(model=self.model, contents=prompt)
+        return response.text
+
+    def open_stream(self, prompt):
+        stream = self.client.models.generate_content_stream(model=self.model, contents=prompt)
+        return (chunk.text for chunk in stream if chunk.text)
+
+    async def generate_async(self, prompt):
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+        return response.text
+
+    async def open_stream_async(self, prompt):
+        stream = await self.client.aio.models.generate_content_stream(model=self.model, contents=prompt)
+
+        async def texts():
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        return texts()
+
+
+class FakeProvider:
+    """
+    LLM falso y determinista
+
+    La respuesta depende solo del prompt (mismas palabras, mismo orden):
+    `answer_tokens` palabras tomadas del propio prompt. Tarda `latency`
+    segundos hasta el primer trozo y después emite `tokens_per_second`
+    palabras por segundo; la llamada completa tarda lo mismo que el stream.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=None, tokens_per_second=None, answer_tokens=None):
+        self.latency = Config.LLM_FAKE_LATENCY if latency is None else latency
+        self.tokens_per_second = tokens_per_second or Config.LLM_FAKE_TOKENS_PER_SECOND
+        self.answer_tokens = answer_tokens or Config.LLM_FAKE_ANSWER_TOKENS
+
+    def available(self):
+        return True
+
+    def words(self, prompt):
+        """Palabras de la respuesta para este prompt"""
+        seed = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:8], 'big')
+        rng = random.Random(seed)
+        vocabulary = sorted(set(tokenize(prompt))) or ['respuesta']
+        words = [rng.choice(vocabulary) for _ in range(self.answer_tokens)]
+        words[0] = f"[fake {estimate_tokens(prompt)} tokens]"
+        return words
+
+    def _chunks(self, prompt):
+        words = self.words(prompt)
+        return [word + (' ' if i < len(words) - 1 else '') for i, word in enumerate(words)]
+
+    def _duration(self, prompt):
+        return self.latency + self.answer_tokens / self.tokens_per_second
+
+    def generate(self, prompt):
+        time.sleep(self._duration(prompt))
+        return ''.join(self._chunks(prompt))
+
+    def open_stream(self, prompt):
+        chunks = self._chunks(prompt)
+        delay = 1 / self.tokens_per_second
+
+        def texts():
+            time.sleep(self.latency)
+            for i, chunk in enumerate(chunks):
+                if i:
+                    time.sleep(delay)
+                yield chunk
+        return texts()
+
+    async def generate_async(self, prompt):
+        await asyncio.sleep(self._duration(prompt))
+        return ''.join(self._chunks(prompt))
+
+    async def open_stream_async(self, prompt):
+        chunks = self._chunks(prompt)
+        delay = 1 / self.tokens_per_second
+
+        async def texts():
+            await asyncio.sleep(self.latency)
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(delay)
+                yield chunk
+        return texts()
+
+
+class RecordReplayProvider:
+    """
+    Grabación y reproducción de respuestas (JSON Lines)
+
+    Cada línea es {"key", "model", "chunks", "elapsed"}; la clave es el
+    SHA-256 del modelo y el prompt. En modo 'record' se llama al proveedor
+    interno y se añade la respuesta al fichero; en 'replay' se devuelven
+    los trozos grabados sin esperas, y un prompt no grabado lanza
+    ReplayMissError (el chat responde entonces en modo extractivo).
+    """
+
+    def __init__(self, path=None, mode='replay', inner=None):
+        self.path = path or Config.LLM_RECORDINGS
+        self.mode = mode
+        self.name = mode
+        self.inner = inner
+        self.model = getattr(inner, 'model', None) or Config.GEMINI_MODEL
+        self._lock = threading.Lock()
+        self._recordings = self._load()
+
+    def _load(self):
+        recordings = {}
+        if not os.path.exists(self.path):
+            return recordings
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    recordings[record['key']] = record['chunks']
+                except (ValueError, KeyError):
+                    continue
+        return recordings
+
+    def key(self, prompt):
+        return hashlib.sha256(f"{self.model}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def available(self):
+        if self.mode == 'replay':
+            return True
+        return self.inner is not None and self.inner.available()
+
+    def _save(self, key, chunks, elapsed):
+        record = {'key': key, 'model': self.model, 'chunks': chunks, 'elapsed': round(elapsed, 3)}
+        with self._lock:
+            self._recordings[key] = chunks
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        metrics.incr('llm_replay.recorded')
+
+    def _replay(self, prompt):
+        chunks = self._recordings.get(self.key(prompt))
+        if chunks is None:
+            metrics.incr('llm_replay.misses')
+            raise ReplayMissError(f"replay: prompt no grabado en {self.path}")
+        metrics.incr('llm_replay.hits')
+        return chunks
+
+    def generate(self, prompt):
+        if self.mode == 'replay':
+            return ''.join(self._replay(prompt))
+        started = time.monotonic()
+        text = self.inner.generate(prompt)
+        self._save(self.key(prompt), [text], time.monotonic() - started)
+        return text
+
+    def open_stream(self, prompt):
+        if self.mode == 'replay':
+            return iter(self._replay(prompt))
+        started = time.monotonic()
+        stream = self.inner.open_stream(prompt)
+
+        def texts():
+            chunks = []
+            for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+            # Solo se graban las respuestas completas
+            self._save(self.key(prompt), chunks, time.monotonic() - started)
+        return texts()
+
+    async def generate_async(self, prompt):
+        if self.mode == 'replay':
+            return ''.join(self._replay(prompt))
+        started = time.monotonic()
+        text = await self.inner.generate_async(prompt)
+        self._save(self.key(prompt), [text], time.monotonic() - started)
+        return text
+
+    async def open_stream_async(self, prompt):
+        if self.mode == 'replay':
+            chunks = self._replay(prompt)
+
+            async def replayed():
+                for chunk in chunks:
+                    yield chunk
+            return replayed()
+
+        started = time.monotonic()
+        stream = await self.inner.open_stream_async(prompt)
+
+        async def texts():
+            chunks = []
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+            self._save(self.key(prompt), chunks, time.monotonic() - started)
+        return texts()
+
+
+def create_provider(kind=None):
+    """
+    Proveedor configurado en LLM_PROVIDER (gemini, fake, record o replay)
+    """
+    kind = (kind or Config.LLM_PROVIDER).lower()
+    if kind == 'fake':
+        return FakeProvider()
+    if kind == 'replay':
+        return RecordReplayProvider(mode='replay')
+    if kind == 'record':
+        return RecordReplayProvider(mode='record', inner=GeminiProvider())
+    if kind != 'gemini':
+        print(f"Warning: LLM_PROVIDER desconocido ({kind}), se usa gemini")
+    return GeminiProvider()
@@ -0,0 +1,57 @@
+"""
+Métricas en memoria
+Contadores y tiempos por proceso, expuestos en /api/metrics
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+
+
+def incr(name, value=1):
+    """Suma `value` al contador `name`"""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, seconds):
+    """Registra una duración (en segundos) bajo `name`"""
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = _timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+
+
+def get_counter(name):
+    """Valor actual de un contador"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def ratio(numerator, denominator):
+    """Cociente de dos contadores (0.0 si el denominador es 0)"""
+    with _lock:
+        total = _counters.get(denominator, 0)
+        return _counters.get(numerator, 0) / total if total else 0.0
+
+
+def snapshot():
+    """Copia de todos los contadores y tiempos (medias en milisegundos)"""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'timings': {
+                name: {
+                    'count': stats['count'],
+                    'avg_ms': round(stats['total'] / stats['count'] * 1000, 3),
+                    'max_ms': round(stats['max'] * 1000, 3),
+                    'total_ms': round(stats['total'] * 1000, 3),
+                }
+                for name, stats in _timings.items()
+            }
+        }
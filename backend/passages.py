@@ -0,0 +1,168 @@
+"""
+Pasajes de transcripciones
+Convierte subtítulos SRT/VTT en pasajes solapados con su marca de tiempo
+"""
+import re
+
+# Ventana de cada pasaje y solapamiento entre pasajes consecutivos (segundos)
+PASSAGE_WINDOW_SECONDS = 60
+PASSAGE_OVERLAP_SECONDS = 15
+
+# Para transcripciones antiguas sin tiempos (solo .txt): ~60 s de habla
+PLAIN_PASSAGE_WORDS = 150
+PLAIN_OVERLAP_WORDS = 40
+
+_TIMESTAMP_RE = re.compile(
+    r'(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})\s*-->'
+)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _cue_start_seconds(line: str):
+    """Devuelve el inicio en segundos de una línea 'inicio --> fin' o None"""
+    match = _TIMESTAMP_RE.search(line)
+    if not match:
+        return None
+    hours, minutes, seconds, millis = match.groups()
+    return (
+        int(hours or 0) * 3600
+        + int(minutes) * 60
+        + int(seconds)
+        + int(millis.ljust(3, '0')) / 1000
+    )
+
+
+def parse_subtitle_cues(raw_text: str):
+    """
+    Extrae los cues de un fichero SRT o WebVTT
+
+    Aplica la misma limpieza que el texto plano (sin etiquetas, sin
+    cabeceras y sin líneas repetidas consecutivas, típicas de los
+    subtítulos automáticos de YouTube).
+
+    Args:
+        raw_text: Contenido del fichero de subtítulos
+
+    Returns:
+        Lista de tuplas (inicio_en_segundos, texto)
+    """
+    cues = []
+    current_start = None
+    last_line = ""
+
+    for line in raw_text.splitlines():
+        line = line.strip()
+        if '-->' in line:
+            current_start = _cue_start_seconds(line)
+            continue
+        if (not line or
+                line.startswith('WEBVTT') or
+                line.startswith('Kind:') or
+                line.startswith('Language:') or
+                line.isdigit() or
+                current_start is None):
+            continue
+
+        line = _TAG_RE.sub('', line).strip()
+        if not line or line == last_line:
+            continue
+
+        cues.append((current_start, line))
+        last_line = line
+
+    return cues
+
+
+def build_passages(cues, window=PASSAGE_WINDOW_SECONDS, overlap=PASSAGE_OVERLAP_SECONDS):
+    """
+    Agrupa cues en ventanas de `window` segundos solapadas `overlap` segundos
+
+    Args:
+        cues: Lista de tuplas (inicio_en_segundos, texto) ordenada por tiempo
+        window: Duración de cada pasaje
+        overlap: Solapamiento entre pasajes consecutivos
+
+    Returns:
+        Lista de diccionarios {'start_seconds', 'content'}
+    """
+    if not cues:
+        return []
+
+    step = max(window - overlap, 1)
+    passages = []
+    first = 0
+    window_start = cues[0][0]
+
+    while first < len(cues):
+        window_end = window_start + window
+        last = first
+        while last < len(cues) and cues[last][0] < window_end:
+            last += 1
+
+        if last > first:
+            passages.append({
+                'start_seconds': int(cues[first][0]),
+                'content': " ".join(text for _, text in cues[first:last])
+            })
+            if last == len(cues):
+                break
+
+        window_start += step
+        while first < len(cues) and cues[first][0] < window_start:
+            first += 1
+        # Saltar huecos largos sin habla
+        if first < len(cues) and cues[first][0] >= window_start + step:
+            window_start = cues[first][0]
+
+    return passages
+
+
+def chunk_plain_text(text: str, size=PLAIN_PASSAGE_WORDS, overlap=PLAIN_OVERLAP_WORDS):
+    """
+    Divide un texto sin tiempos en pasajes solapados por número de palabras
+
+    Se usa para transcripciones antiguas de las que solo queda el .txt;
+    sus pasajes no tienen marca de tiempo.
+
+    Returns:
+        Lista de diccionarios {'start_seconds': None, 'content'}
+    """
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(size - overlap, 1)
+    passages = []
+    for offset in range(0, len(words), step):
+        passages.append({
+            'start_seconds': None,
+            'content': " ".join(words[offset:offset + size])
+        })
+        if offset + size >= len(words):
+            break
+    return passages
+
+
+def cues_to_text(cues):
+    """Texto plano equivalente a una lista de cues"""
+    return " ".join(text for _, text in cues)
+
+
+def format_timestamp(seconds):
+    """Formatea segundos como M:SS o H:MM:SS ('' si no hay tiempo)"""
+    if seconds is None:
+        return ''
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def timestamp_url(url: str, seconds):
+    """Enlace de YouTube que salta al segundo indicado"""
+    if not url or seconds is None:
+        return url
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}t={int(seconds)}s"
@@ -0,0 +1,243 @@
+"""
+Construcción del prompt del chat
+Ensambla instrucciones, catálogo y fragmentos dentro de un presupuesto de tokens
+
+El catálogo completo solo se incluye cuando la pregunta es de listar, contar
+u ordenar episodios; para el resto basta con los episodios relacionados con
+la pregunta y con los fragmentos encontrados.
+"""
+from backend.config import Config
+from backend.catalog import get_catalog_block, get_catalog_entries
+from backend.text_es import tokenize, content_terms, estimate_tokens, CHARS_PER_TOKEN
+from backend import metrics
+
+# Palabras (por prefijo) que piden el catálogo entero
+CATALOG_INTENT_PREFIXES = (
+    'list', 'enumer', 'cuant', 'orden', 'cronolog', 'todos', 'todas', 'catalog',
+)
+
+# Episodios del catálogo reducido y parte del presupuesto para fragmentos
+CATALOG_SUBSET_MAX = 15
+FRAGMENT_SHARE = 0.7
+
+PROMPT_TEMPLATE = """
+        Actúa como un asistente experto en ciberseguridad para "Un Podcast Seguro".
+
+        TIENES A TU DISPOSICIÓN DOS FUENTES DE INFORMACIÓN:
+        1. CONTEXTO GLOBAL: {catalog_description}
+        2. FRAGMENTOS DE TRANSCRIPCIONES: Partes específicas del contenido donde se encuentra la respuesta detallada.
+
+        INSTRUCCIONES:
+        - Si el usuario pide LISTAR episodios, invitados, o temas generales, USA EL CONTEXTO GLOBAL.
+        - Si el usuario pregunta sobre un tema específico (qué dijo tal persona, cómo funciona X), USA LOS FRAGMENTOS DE TRANSCRIPCIONES.
+        - Cuando cites un fragmento, indica el minuto que aparece junto a su título.
+        - Si la respuesta no está en ninguna fuente, di que no tienes esa información.
+        - Ordena cronológicamente si se pide (fíjate en el número de episodio #XX si existe).
+
+        === CONTEXTO GLOBAL ({catalog_title}) ===
+        {catalog}
+        ======================================================
+
+        === FRAGMENTOS DE TRANSCRIPCIONES RELEVANTES ===
+        {fragments}
+        ================================================
+
+        Pregunta: {query}
+
+        Respuesta:
+        """
+
+SECTIONS = ('instructions', 'catalog', 'fragments', 'query')
+
+
+def wants_full_catalog(query):
+    """¿Pide la pregunta listar, contar u ordenar episodios?"""
+    return any(token.startswith(CATALOG_INTENT_PREFIXES) for token in tokenize(query))
+
+
+def describe_source(result):
+    """Título del episodio y minuto del pasaje (si se conoce)"""
+    if result.get('timestamp'):
+        return f"{result['title']} | minuto {result['timestamp']}"
+    return result['title']
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Recortar `text` a unos `max_tokens`, sin partir palabras (sin añadir '...')"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(' ')
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip()
+
+
+def select_fragments(context, budget, max_fragment_tokens):
+    """
+    Fragmentos deduplicados y recortados que caben en `budget` tokens
+
+    Returns:
+        tuple: (texto, tokens, usados, descartados)
+    """
+    lines = []
+    used_tokens = 0
+    seen = set()
+    dropped = 0
+
+    for res in context:
+        key = (res.get('video_id') or res.get('url'), res.get('start_seconds'))
+        fingerprint = ' '.join(tokenize(res.get('fragment') or ''))
+        if key in seen or fingerprint in seen:
+            dropped += 1
+            continue
+        seen.update((key, fingerprint))
+
+        fragment = truncate_to_tokens(res.get('fragment') or '', max_fragment_tokens)
+        line = f"Fragmento relevante ({describe_source(res)}): ...{fragment}..."
+        tokens = estimate_tokens(line) + 1
+        if used_tokens + tokens > budget:
+            dropped += 1
+            continue
+        lines.append(line)
+        used_tokens += tokens
+
+    return "\n\n".join(lines), used_tokens, len(lines), dropped
+
+
+def rank_catalog(entries, query, context):
+    """
+    Episodios ordenados por relación con la pregunta
+
+    Cuentan las palabras del título que aparecen en la pregunta y, sobre
+    todo, que el episodio tenga fragmentos entre los resultados. A igualdad,
+    los más recientes primero.
+    """
+    terms = set(content_terms(query))
+    context_ids = {res.get('video_id') for res in context}
+    scored = []
+    for position, entry in enumerate(entries):
+        score = 2 * len(terms & entry['terms'])
+        if entry['id'] in context_ids:
+            score += 3
+        scored.append((-score, position, entry))
+    scored.sort(key=lambda item: item[:2])
+    return [entry for _, _, entry in scored]
+
+
+def fit_lines(header, lines, budget):
+    """Cabecera más tantas líneas como quepan en `budget` tokens"""
+    kept = [header]
+    used = estimate_tokens(header)
+    for line in lines:
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(kept), len(kept) - 1
+
+
+def assemble_prompt(query, context, budget=None):
+    """
+    Construir el prompt dentro de un presupuesto de tokens
+
+    Args:
+        query (str): Pregunta del usuario
+        context (list): Resultados de la búsqueda (ordenados por relevancia)
+        budget (int): Tokens máximos (por defecto Config.PROMPT_TOKEN_BUDGET)
+
+    Returns:
+        tuple: (prompt, informe con los tokens de cada sección)
+    """
+    budget = budget or Config.PROMPT_TOKEN_BUDGET
+    entries = get_catalog_entries()
+    full_catalog = wants_full_catalog(query)
+
+    fixed = estimate_tokens(PROMPT_TEMPLATE) + estimate_tokens(query) + 30
+    available = max(budget - fixed, 0)
+
+    if full_catalog:
+        # Listar/contar: primero el catálogo (del más reciente al más antiguo)
+        block = get_catalog_block()
+        if estimate_tokens(block) <= available:
+            catalog, shown = block, len(entries)
+        else:
+            catalog, shown = fit_lines(
+                "LISTADO DE EPISODIOS (los más recientes; Úsalo para listar, ordenar o contar):",
+                [entry['line'] for entry in entries], available
+            )
+        fragments, fragment_tokens, used, dropped = select_fragments(
+            context, available - estimate_tokens(catalog), Config.PROMPT_FRAGMENT_TOKENS
+        )
+    else:
+        fragments, fragment_tokens, used, dropped = select_fragments(
+            context, int(available * FRAGMENT_SHARE), Config.PROMPT_FRAGMENT_TOKENS
+        )
+        ranked = rank_catalog(entries, query, context)[:CATALOG_SUBSET_MAX]
+        catalog, shown = fit_lines(
+            "EPISODIOS RELACIONADOS CON LA PREGUNTA:",
+            [entry['line'] for entry in ranked], available - fragment_tokens
+        )
+
+    if shown == len(entries):
+        catalog_title = "LISTA DE TODOS LOS EPISODIOS"
+        catalog_description = "La lista completa de todos los episodios existentes hasta la fecha."
+    else:
+        catalog_title = f"{shown} DE {len(entries)} EPISODIOS"
+        catalog_description = (f"Una selección de {shown} de los {len(entries)} episodios "
+                               "existentes (los más relacionados con la pregunta).")
+
+    prompt = PROMPT_TEMPLATE.format(
+        catalog_description=catalog_description,
+        catalog_title=catalog_title,
+        catalog=catalog,
+        fragments=fragments,
+        query=query
+    )
+
+    total = estimate_tokens(prompt)
+    sections = {
+        'catalog': estimate_tokens(catalog),
+        'fragments': fragment_tokens,
+        'query': estimate_tokens(query),
+    }
+    sections['instructions'] = max(total - sum(sections.values()), 0)
+
+    report = {
+        'budget': budget,
+        'total': total,
+        'sections': sections,
+        'full_catalog': full_catalog,
+        'catalog_episodes': shown,
+        'catalog_total': len(entries),
+        'fragments_used': used,
+        'fragments_dropped': dropped,
+    }
+    record(report)
+    return prompt, report
+
+
+def record(report):
+    """Acumular los tokens de cada sección en las métricas"""
+    metrics.incr('prompt.builds')
+    metrics.incr('prompt.tokens', report['total'])
+    for name, tokens in report['sections'].items():
+        metrics.incr(f'prompt.tokens.{name}', tokens)
+    if report['total'] > report['budget']:
+        metrics.incr('prompt.over_budget')
+
+
+def stats():
+    """Prompts construidos y tokens medios por sección"""
+    return {
+        'builds': metrics.get_counter('prompt.builds'),
+        'budget': Config.PROMPT_TOKEN_BUDGET,
+        'avg_tokens': round(metrics.ratio('prompt.tokens', 'prompt.builds'), 1),
+        'avg_section_tokens': {
+            name: round(metrics.ratio(f'prompt.tokens.{name}', 'prompt.builds'), 1)
+            for name in SECTIONS
+        },
+        'over_budget': metrics.get_counter('prompt.over_budget'),
+    }
@@ -0,0 +1,354 @@
+"""
+Búsqueda en las transcripciones (sin LLM)
+Ranking híbrido de pasajes: BM25 de FTS5 fusionado con el índice vectorial.
+Lo usan el chat (contexto para el prompt, backend/ai.py) y /api/search,
+que devuelve directamente los pasajes paginados y resaltados.
+
+Paginación de /api/search: el ranking completo de una pregunta (ids de
+hasta MAX_RESULTS pasajes) se calcula una vez y se guarda en caché por
+(pregunta normalizada, generación del índice); cada página es un corte de
+esa lista y solo se leen y resaltan los pasajes de la página. El cursor
+lleva la posición y la generación: si entretanto se publica otro índice,
+el cursor caduca en lugar de devolver páginas de rankings distintos.
+"""
+import base64
+import json
+import sqlite3
+import time
+from backend.config import Config
+from backend.connections import get_connection
+from backend.passages import format_timestamp, timestamp_url
+from backend.search_index import get_generation
+from backend.cache import TTLCache
+from backend.text_es import normalize_query
+from backend.fts_query import compile_match, highlight, snippet
+from backend import vector_index, metrics
+
+# Fusión de rankings (Reciprocal Rank Fusion): 1 / (RRF_K + posición)
+RRF_K = 60
+
+PASSAGE_COLUMNS = '''
+    p.title,
+    p.url,
+    p.published,
+    p.video_id,
+    p.id as passage_id,
+    p.start_seconds
+'''
+
+# /api/search: resultados por página, pasajes rankeados como máximo y
+# pasajes por episodio al agrupar
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+MAX_RESULTS = 100
+GROUP_PASSAGES = 3
+
+# search_transcripts: candidatos por resultado pedido y tope. El límite por
+# episodio descarta candidatos, así que si faltan se busca con más
+CANDIDATES_PER_RESULT = 4
+MAX_CANDIDATES = 200
+
+# Rankings de /api/search; la generación va en la clave
+ranking_cache = TTLCache('search_ranking', maxsize=Config.SEARCH_CACHE_SIZE,
+                         ttl=Config.SEARCH_CACHE_TTL)
+
+
+class CursorError(ValueError):
+    """Cursor de paginación ilegible o de otra generación del índice"""
+
+
+def get_search_connection():
+    """
+    Obtener conexión de solo lectura al índice de búsqueda (search.db)
+
+    El pool la reabre cuando la sincronización publica otra generación,
+    así que un swap del índice se ve en la siguiente consulta.
+    """
+    return get_connection('search')
+
+def get_index_generation():
+    """Generación publicada de search.db (0 si aún no existe)"""
+    try:
+        return get_generation(get_search_connection())
+    except Exception:
+        return 0
+
+def search_bm25(conn, query, limit):
+    """
+    Pasajes por BM25 (FTS5), con su texto completo en 'content'
+
+    La pregunta no se pasa tal cual a MATCH: compile_match la convierte en
+    una expresión válida (términos entre comillas, OR/NEAR, prefijos).
+    """
+    match = compile_match(query)
+    if match is None:
+        return []
+    started = time.monotonic()
+    try:
+        cursor = conn.execute(f'''
+            SELECT {PASSAGE_COLUMNS},
+                p.content,
+                passages_search.rank as rank
+            FROM passages_search
+            JOIN transcript_passages p ON p.id = passages_search.rowid
+            WHERE passages_search MATCH ?
+            ORDER BY passages_search.rank
+            LIMIT ?
+        ''', (match, limit))
+        results = [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error en búsqueda FTS5: {e}")
+        metrics.incr('search.fts_errors')
+        return []
+    metrics.observe('search.bm25', time.monotonic() - started)
+    return results
+
+def load_passages(conn, passage_ids):
+    """Pasajes por id (mismas columnas que search_bm25)"""
+    if not passage_ids:
+        return {}
+    placeholders = ','.join('?' * len(passage_ids))
+    rows = conn.execute(f'''
+        SELECT {PASSAGE_COLUMNS}, p.content
+        FROM transcript_passages p WHERE p.id IN ({placeholders})
+    ''', list(passage_ids)).fetchall()
+    passages = {}
+    for row in rows:
+        result = dict(row)
+        result['rank'] = None
+        passages[result['passage_id']] = result
+    return passages
+
+def fuse_rankings(rankings, k=RRF_K):
+    """
+    Reciprocal Rank Fusion de varias listas de passage_id
+
+    Returns:
+        list: passage_id ordenados por puntuación fusionada
+    """
+    scores = {}
+    for ranking in rankings:
+        for position, passage_id in enumerate(ranking):
+            scores[passage_id] = scores.get(passage_id, 0.0) + 1.0 / (k + position + 1)
+    return sorted(scores, key=lambda passage_id: -scores[passage_id])
+
+def rank_passages(conn, query, candidates):
+    """
+    Ranking híbrido de la pregunta (BM25 + vectores)
+
+    Returns:
+        tuple: (passage_id ordenados, {passage_id: pasaje con 'content'})
+    """
+    bm25 = search_bm25(conn, query, candidates)
+    by_id = {result['passage_id']: result for result in bm25}
+
+    ranking = [result['passage_id'] for result in bm25]
+    if Config.VECTOR_SEARCH:
+        try:
+            vector_hits = vector_index.search(conn, Config.SEARCH_DATABASE, query, candidates)
+        except Exception as e:
+            print(f"Error en búsqueda vectorial: {e}")
+            vector_hits = []
+        if vector_hits:
+            ranking = fuse_rankings([ranking, [passage_id for passage_id, _ in vector_hits]])
+            missing = [passage_id for passage_id in ranking if passage_id not in by_id]
+            by_id.update(load_passages(conn, missing))
+    return [passage_id for passage_id in ranking if passage_id in by_id], by_id
+
+def episode_key(result):
+    return result['video_id'] or result['url']
+
+def cap_per_episode(ranking, by_id, limit, max_per_episode):
+    """Los primeros `limit` pasajes del ranking con `max_per_episode` por episodio"""
+    results = []
+    per_episode = {}
+    for passage_id in ranking:
+        result = by_id[passage_id]
+        key = episode_key(result)
+        if per_episode.get(key, 0) >= max_per_episode:
+            continue
+        per_episode[key] = per_episode.get(key, 0) + 1
+        results.append(result)
+        if len(results) >= limit:
+            break
+    return results
+
+def search_transcripts(query, limit=5, max_per_episode=2):
+    """
+    Buscar en los pasajes de las transcripciones (FTS5 + vectores)
+
+    Se fusionan el ranking BM25 de FTS5 y el de similitud del índice
+    vectorial (si está disponible). El fragmento de cada pasaje es la
+    ventana con más términos de la pregunta, resaltados con <b>.
+
+    Args:
+        query (str): Consulta del usuario
+        limit (int): Número máximo de resultados
+        max_per_episode (int): Máximo de pasajes de un mismo episodio
+
+    Returns:
+        list: Lista de diccionarios con los resultados
+    """
+    try:
+        conn = get_search_connection()
+
+        # Cada fila es un pasaje de ~60 s, así que BM25 y el fragmento
+        # trabajan sobre textos cortos y start_seconds da el minuto exacto.
+        # Si un episodio acapara los candidatos, se amplía la búsqueda
+        candidates = limit * CANDIDATES_PER_RESULT
+        while True:
+            ranking, by_id = rank_passages(conn, query, candidates)
+            results = cap_per_episode(ranking, by_id, limit, max_per_episode)
+            if len(results) >= limit or len(ranking) < candidates or candidates >= MAX_CANDIDATES:
+                break
+            candidates = min(candidates * CANDIDATES_PER_RESULT, MAX_CANDIDATES)
+            metrics.incr('search.widened')
+
+        # Solo se resaltan los pasajes que se devuelven
+        for result in results:
+            result['fragment'] = snippet(result.pop('content'), query)
+            result['timestamp'] = format_timestamp(result['start_seconds'])
+            result['timestamp_url'] = timestamp_url(result['url'], result['start_seconds'])
+
+        return results
+    except Exception as e:
+        print(f"Error en búsqueda: {e}")
+        return []
+
+# ==================== /api/search ====================
+
+def encode_cursor(offset, generation):
+    raw = json.dumps({'o': offset, 'g': generation}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, generation):
+    """
+    Posición guardada en el cursor
+
+    Raises:
+        CursorError: si el cursor no se puede leer o es de otra generación
+    """
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        offset = int(data['o'])
+        cursor_generation = int(data['g'])
+    except (ValueError, TypeError, KeyError):
+        raise CursorError('Cursor no válido')
+    if offset < 0:
+        raise CursorError('Cursor no válido')
+    if cursor_generation != generation:
+        raise CursorError('El índice se ha actualizado; repite la búsqueda')
+    return offset
+
+def ranked_ids(conn, query, generation):
+    """
+    Ranking de la pregunta para paginar: [(passage_id, episodio)]
+
+    Se guarda en caché por (pregunta normalizada, generación), así que
+    las páginas siguientes no vuelven a buscar.
+    """
+    key = (normalize_query(query), generation)
+    ranked = ranking_cache.get(key)
+    if ranked is not None:
+        return ranked
+    started = time.monotonic()
+    ranking, by_id = rank_passages(conn, query, MAX_RESULTS)
+    ranked = [(passage_id, episode_key(by_id[passage_id])) for passage_id in ranking[:MAX_RESULTS]]
+    ranking_cache.set(key, ranked, cost=time.monotonic() - started)
+    return ranked
+
+def passage_hit(result, query, position):
+    """Pasaje de la respuesta de /api/search, con las posiciones resaltadas"""
+    fragment, highlights = highlight(result['content'], query)
+    return {
+        'passage_id': result['passage_id'],
+        'position': position,
+        'start_seconds': result['start_seconds'],
+        'timestamp': format_timestamp(result['start_seconds']),
+        'timestamp_url': timestamp_url(result['url'], result['start_seconds']),
+        'fragment': fragment,
+        'highlights': highlights,
+    }
+
+def episode_info(result):
+    return {
+        'video_id': result['video_id'],
+        'title': result['title'],
+        'url': result['url'],
+        'published': result['published'],
+    }
+
+def search_page(query, cursor=None, limit=PAGE_SIZE, group=False):
+    """
+    Una página de resultados de búsqueda, sin LLM
+
+    Args:
+        query (str): Consulta del usuario
+        cursor (str): Cursor devuelto por la página anterior (None: primera)
+        limit (int): Resultados por página (pasajes, o episodios si group)
+        group (bool): Agrupar por episodio (hasta GROUP_PASSAGES pasajes
+            cada uno, en el orden del mejor pasaje de cada episodio)
+
+    Returns:
+        dict: results (o episodes si group), next_cursor, total y generation
+
+    Raises:
+        CursorError: si el cursor no vale para el índice publicado
+    """
+    started = time.monotonic()
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    try:
+        conn = get_search_connection()
+        # Del mismo conn: volver al pool podría reciclarlo si se publicó otro índice
+        generation = get_generation(conn)
+    except sqlite3.OperationalError as e:
+        # Aún no hay índice (antes de la primera sincronización)
+        print(f"Error en búsqueda: {e}")
+        return {
+            'query': query,
+            'generation': 0,
+            'total': 0,
+            'episodes' if group else 'results': [],
+            'next_cursor': None,
+        }
+    offset = decode_cursor(cursor, generation)
+
+    ranked = ranked_ids(conn, query, generation)
+    if group:
+        groups = {}
+        for position, (passage_id, key) in enumerate(ranked):
+            passages = groups.setdefault(key, [])
+            if len(passages) < GROUP_PASSAGES:
+                passages.append((passage_id, position))
+        items = list(groups.values())
+    else:
+        items = [[(passage_id, position)] for position, (passage_id, _) in enumerate(ranked)]
+
+    page = items[offset:offset + limit]
+    rows = load_passages(conn, [passage_id for passages in page for passage_id, _ in passages])
+
+    entries = []
+    for passages in page:
+        hits = [(rows[passage_id], position) for passage_id, position in passages if passage_id in rows]
+        if not hits:
+            continue
+        if group:
+            entry = episode_info(hits[0][0])
+            entry['passages'] = [passage_hit(result, query, position + 1) for result, position in hits]
+        else:
+            result, position = hits[0]
+            entry = {**episode_info(result), **passage_hit(result, query, position + 1)}
+        entries.append(entry)
+
+    next_offset = offset + limit
+    metrics.observe('search.api', time.monotonic() - started)
+    return {
+        'query': query,
+        'generation': generation,
+        'total': len(items),
+        'episodes' if group else 'results': entries,
+        'next_cursor': encode_cursor(next_offset, generation) if next_offset < len(items) else None,
+    }
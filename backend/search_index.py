@@ -0,0 +1,468 @@
+"""
+Índice de búsqueda de transcripciones
+Esquema de pasajes + FTS5 compartido por la app y el script de sincronización
+
+El índice vive en su propia base de datos (database/search.db). La
+sincronización construye la siguiente generación en search.db.next y la
+publica con un rename atómico: las consultas en curso terminan sobre la
+generación anterior y las nuevas abren ya la nueva, sin reiniciar la app.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+from collections import Counter
+from backend import vector_index
+from backend.text_es import stem_text, strip_accents, STOPWORDS
+
+# Subir cuando cambie cómo se construyen los pasajes: fuerza un reindexado
+INDEX_VERSION = 1
+
+# Subir cuando cambie la definición de passages_search: se recrea la tabla
+# FTS5 y se reconstruye desde transcript_passages (sin volver a descargar)
+FTS_VERSION = 4
+
+# Prefix indexes de FTS5: 6 letras para los términos por prefijo del
+# compilador de consultas (backend/fts_query.py). El autocompletado no usa
+# FTS5, sino el vocabulario de suggest_terms
+PREFIX_INDEXES = '6'
+
+# Vocabulario del autocompletado (/api/suggest); al cambiar cómo se
+# construye, SUGGEST_VERSION obliga a recalcularlo en la siguiente sync
+SUGGEST_VERSION = 1
+SUGGEST_MAX_TERMS = 50000
+SUGGEST_MIN_FREQ = 2
+SUGGEST_MIN_LEN = 3
+
+# Esquema: una fila por pasaje (~60 s) con su inicio en segundos.
+# search_title y search_content son el título y el texto reducidos a raíces
+# en español (text_es.stem_text): es lo que indexa FTS5, y las consultas
+# pasan por el mismo stemmer. title y content se conservan para mostrar.
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS transcript_passages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        video_id TEXT,
+        title TEXT,
+        url TEXT,
+        published TEXT,
+        start_seconds INTEGER,
+        content TEXT NOT NULL,
+        search_title TEXT,
+        search_content TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_transcript_passages_filename
+        ON transcript_passages(filename);
+
+    -- Qué hay indexado de cada vídeo, para reindexar solo lo que cambia
+    CREATE TABLE IF NOT EXISTS index_manifest (
+        video_id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        index_version INTEGER NOT NULL,
+        indexed_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- Palabras del corpus para el autocompletado: term sin tildes (clave
+    -- de búsqueda por prefijo), word tal como aparece y su frecuencia
+    CREATE TABLE IF NOT EXISTS suggest_terms (
+        term TEXT PRIMARY KEY,
+        word TEXT NOT NULL,
+        freq INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    -- Generación publicada (se incrementa en cada swap)
+    CREATE TABLE IF NOT EXISTS index_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+'''
+
+# passages_search es una tabla FTS5 de contenido externo sobre las columnas
+# search_* de transcript_passages; los triggers la mantienen sincronizada.
+# unicode61 con remove_diacritics 2 pliega también las tildes que queden.
+FTS_SQL = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS passages_search USING fts5(
+        search_title,
+        search_content,
+        content='transcript_passages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='{PREFIX_INDEXES}'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS transcript_passages_ai
+    AFTER INSERT ON transcript_passages BEGIN
+        INSERT INTO passages_search(rowid, search_title, search_content)
+        VALUES (new.id, new.search_title, new.search_content);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS transcript_passages_ad
+    AFTER DELETE ON transcript_passages BEGIN
+        INSERT INTO passages_search(passages_search, rowid, search_title, search_content)
+        VALUES ('delete', old.id, old.search_title, old.search_content);
+    END;
+'''
+
+# Columnas añadidas después de la primera versión del esquema
+ADDED_COLUMNS = (('search_title', 'TEXT'), ('search_content', 'TEXT'))
+
+# Tablas del índice que vivían en usuarios.db antes de search.db
+LEGACY_TABLES = ('transcripts_search', 'passages_search', 'transcript_passages', 'index_manifest')
+
+
+def ensure_schema(conn):
+    """Crea (si no existen) las tablas del índice y migra las antiguas"""
+    conn.executescript(SCHEMA_SQL)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(transcript_passages)')}
+    for name, kind in ADDED_COLUMNS:
+        if name not in columns:
+            conn.execute(f'ALTER TABLE transcript_passages ADD COLUMN {name} {kind}')
+    if not migrate_fts(conn):
+        conn.executescript(FTS_SQL)
+
+
+def get_meta(conn, key):
+    """Valor de index_meta o None"""
+    try:
+        row = conn.execute('SELECT value FROM index_meta WHERE key = ?', (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def fts_outdated(conn):
+    """¿La tabla FTS5 es de una FTS_VERSION anterior?"""
+    return get_meta(conn, 'fts_version') != str(FTS_VERSION)
+
+
+def suggest_outdated(conn):
+    """¿Falta el vocabulario del autocompletado o es de otra SUGGEST_VERSION?"""
+    return get_meta(conn, 'suggest_version') != str(SUGGEST_VERSION)
+
+
+_SUGGEST_WORD_RE = re.compile(r'\w+')
+
+
+def build_suggest_terms(conn, batch=1000):
+    """
+    Recalcula suggest_terms con las palabras de todos los pasajes
+
+    Las raíces del índice FTS5 (y por tanto fts5vocab) no sirven para
+    sugerir: se cuentan las palabras originales, agrupadas sin tildes, y se
+    muestra la forma más frecuente de cada una. Se descartan stopwords,
+    números, palabras cortas y las que aparecen una sola vez.
+
+    Returns:
+        int: Términos guardados
+    """
+    words = Counter()
+    cursor = conn.execute('SELECT title, content FROM transcript_passages')
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            break
+        for title, content in rows:
+            words.update(_SUGGEST_WORD_RE.findall(f"{title or ''} {content}".lower()))
+
+    terms = {}
+    for word, freq in words.items():
+        if len(word) < SUGGEST_MIN_LEN or not word.isalpha():
+            continue
+        term = strip_accents(word)
+        if term in STOPWORDS:
+            continue
+        total, best, best_freq = terms.get(term, (0, word, 0))
+        if freq > best_freq:
+            best, best_freq = word, freq
+        terms[term] = (total + freq, best, best_freq)
+
+    ranked = sorted(
+        ((term, word, total) for term, (total, word, _) in terms.items() if total >= SUGGEST_MIN_FREQ),
+        key=lambda row: -row[2]
+    )[:SUGGEST_MAX_TERMS]
+    with conn:
+        conn.execute('DELETE FROM suggest_terms')
+        conn.executemany('INSERT INTO suggest_terms (term, word, freq) VALUES (?, ?, ?)', ranked)
+        conn.execute(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('suggest_version', ?)",
+            (str(SUGGEST_VERSION),)
+        )
+    return len(ranked)
+
+
+def fill_search_columns(conn, batch=1000):
+    """Calcula search_title/search_content de todos los pasajes (migración)"""
+    cursor = conn.execute('SELECT id, title, content FROM transcript_passages')
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            break
+        conn.executemany(
+            'UPDATE transcript_passages SET search_title = ?, search_content = ? WHERE id = ?',
+            [(stem_text(title or ''), stem_text(content), passage_id)
+             for passage_id, title, content in rows]
+        )
+
+
+def migrate_fts(conn):
+    """
+    Recrea passages_search si su definición es de otra FTS_VERSION
+
+    Es una tabla de contenido externo: se recalculan las columnas search_*
+    con el stemmer actual y se reconstruye desde transcript_passages
+    ('rebuild'); los pasajes no cambian y no hay que volver a descargar.
+
+    Returns:
+        True si se ha migrado
+    """
+    if not fts_outdated(conn):
+        return False
+    for name in ('transcript_passages_ai', 'transcript_passages_ad'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.execute('DROP TABLE IF EXISTS passages_search')
+    with conn:
+        fill_search_columns(conn)
+    conn.executescript(FTS_SQL)
+    with conn:
+        conn.execute("INSERT INTO passages_search(passages_search) VALUES ('rebuild')")
+        conn.execute(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('fts_version', ?)",
+            (str(FTS_VERSION),)
+        )
+    return True
+
+
+def drop_legacy_tables(conn):
+    """Elimina de usuarios.db las tablas del índice antiguo"""
+    for table in LEGACY_TABLES:
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+# ==================== GENERACIONES ====================
+
+def next_generation_path(path):
+    """Fichero donde se construye la siguiente generación del índice"""
+    return f"{path}.next"
+
+
+def prepare_next_generation(path):
+    """
+    Prepara search.db.next como copia de la generación publicada
+
+    Si ya existe (creada antes en el mismo trabajo, o trabajo reanudado)
+    se reutiliza tal cual; una construcción abandonada se descarta con
+    discard_next_generation.
+
+    Returns:
+        Ruta del fichero de la siguiente generación
+    """
+    next_path = next_generation_path(path)
+    if not os.path.exists(next_path):
+        os.makedirs(os.path.dirname(next_path), exist_ok=True)
+        target = sqlite3.connect(next_path)
+        try:
+            if os.path.exists(path):
+                source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                try:
+                    source.backup(target)
+                finally:
+                    source.close()
+            # Sin WAL: el fichero es autocontenido y se puede renombrar
+            target.execute('PRAGMA journal_mode=DELETE')
+            ensure_schema(target)
+        finally:
+            target.close()
+
+    return next_path
+
+
+def get_generation(conn):
+    """Número de generación del índice abierto en `conn` (0 si no hay)"""
+    try:
+        row = conn.execute("SELECT value FROM index_meta WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def publish_next_generation(path):
+    """
+    Optimiza search.db.next y lo publica como search.db con un rename atómico
+
+    Returns:
+        Número de la generación publicada
+    """
+    next_path = next_generation_path(path)
+    conn = sqlite3.connect(next_path)
+    try:
+        generation = get_generation(conn) + 1
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('generation', ?)",
+                (str(generation),)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('built_at', CURRENT_TIMESTAMP)"
+            )
+            # Fusiona los segmentos de FTS5 antes de publicar
+            conn.execute("INSERT INTO passages_search(passages_search) VALUES ('optimize')")
+        # Vocabulario del autocompletado
+        try:
+            build_suggest_terms(conn)
+        except Exception as e:
+            print(f"Error calculando el vocabulario de sugerencias: {e}")
+        # Vectores de esta generación (si NumPy está instalado)
+        try:
+            vector_index.build_vector_index(conn, path, generation)
+        except Exception as e:
+            print(f"Error calculando vectores: {e}")
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    os.replace(next_path, path)
+    # La generación anterior se conserva para las consultas en curso
+    vector_index.remove_stale_vectors(path, keep={generation, generation - 1})
+    return generation
+
+
+def discard_next_generation(path):
+    """Descarta la generación en construcción (no hubo cambios que publicar)"""
+    next_path = next_generation_path(path)
+    if os.path.exists(next_path):
+        os.remove(next_path)
+
+
+def delete_transcript(conn, filename):
+    """Elimina del índice todos los pasajes de una transcripción"""
+    conn.execute('DELETE FROM transcript_passages WHERE filename = ?', (filename,))
+
+
+def index_transcript(conn, filename, video, passages):
+    """
+    Reemplaza los pasajes indexados de una transcripción
+
+    Args:
+        conn: Conexión SQLite (el commit lo hace quien llama)
+        filename: Nombre del .txt de la transcripción
+        video: Diccionario del vídeo (id, title, link, published)
+        passages: Lista de {'start_seconds', 'content'}
+
+    Returns:
+        Número de pasajes insertados
+    """
+    delete_transcript(conn, filename)
+    search_title = stem_text(video.get('title') or '')
+    conn.executemany('''
+        INSERT INTO transcript_passages
+            (filename, video_id, title, url, published, start_seconds, content,
+             search_title, search_content)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (
+            filename,
+            video.get('id'),
+            video.get('title'),
+            video.get('link'),
+            video.get('published', ''),
+            passage['start_seconds'],
+            passage['content'],
+            search_title,
+            stem_text(passage['content']),
+        )
+        for passage in passages
+    ])
+    return len(passages)
+
+
+# ==================== MANIFEST ====================
+
+def file_fingerprint(paths):
+    """
+    Huella barata (solo stat) de los ficheros de una transcripción
+
+    Returns:
+        Tupla (mtime_ns máximo, tamaño total); los ficheros ausentes no cuentan
+    """
+    mtime_ns = 0
+    size = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        mtime_ns = max(mtime_ns, st.st_mtime_ns)
+        size += st.st_size
+    return mtime_ns, size
+
+
+def content_hash(paths):
+    """SHA-256 del contenido de los ficheros de una transcripción"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(block)
+        except FileNotFoundError:
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def load_manifest(conn):
+    """Devuelve el manifest como diccionario video_id -> fila"""
+    cursor = conn.execute('''
+        SELECT video_id, filename, file_path, content_hash, mtime_ns, size, index_version
+        FROM index_manifest
+    ''')
+    columns = [col[0] for col in cursor.description]
+    return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def save_manifest_entry(conn, video_id, filename, file_path, digest, mtime_ns, size):
+    """Inserta o actualiza la entrada del manifest de un vídeo"""
+    conn.execute('''
+        INSERT INTO index_manifest
+            (video_id, filename, file_path, content_hash, mtime_ns, size, index_version, indexed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(video_id) DO UPDATE SET
+            filename = excluded.filename,
+            file_path = excluded.file_path,
+            content_hash = excluded.content_hash,
+            mtime_ns = excluded.mtime_ns,
+            size = excluded.size,
+            index_version = excluded.index_version,
+            indexed_at = excluded.indexed_at
+    ''', (video_id, filename, file_path, digest, mtime_ns, size, INDEX_VERSION))
+
+
+def delete_manifest_entry(conn, video_id):
+    """Elimina la entrada del manifest de un vídeo"""
+    conn.execute('DELETE FROM index_manifest WHERE video_id = ?', (video_id,))
+
+
+def get_manifest_entry(conn, video_id):
+    """Devuelve la entrada del manifest de un vídeo o None"""
+    cursor = conn.execute('''
+        SELECT video_id, filename, file_path, content_hash, mtime_ns, size, index_version
+        FROM index_manifest WHERE video_id = ?
+    ''', (video_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([col[0] for col in cursor.description], row))
+
+
+def delete_orphan_passages(conn):
+    """Elimina pasajes de ficheros que ya no figuran en el manifest"""
+    cursor = conn.execute('''
+        DELETE FROM transcript_passages
+        WHERE filename NOT IN (SELECT filename FROM index_manifest)
+    ''')
+    return cursor.rowcount
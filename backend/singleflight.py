@@ -0,0 +1,118 @@
+"""
+Single-flight
+Agrupa llamadas idénticas simultáneas para que compartan un único cálculo
+
+La primera petición con una clave (el líder) hace el trabajo; las que llegan
+mientras tanto (seguidoras) esperan su resultado. Sirve igual para hilos
+(vistas Flask) que para corrutinas (ruta ASGI): ambos comparten el mismo
+concurrent.futures.Future.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from backend import metrics
+
+
+def wait_async(future):
+    """
+    Espera desde una corrutina el Future compartido de un vuelo
+
+    shield: si se cancela la seguidora (el cliente se desconecta),
+    wrap_future cancelaría el Future compartido y con él a todas las demás
+    seguidoras; así solo se cancela la espera de esta.
+    """
+    return asyncio.shield(asyncio.wrap_future(future))
+
+
+class SingleFlight:
+    """Registro de cálculos en curso por clave"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """
+        Entra en el vuelo de `key`
+
+        Returns:
+            tuple: (future, es_lider). El líder debe llamar a finish() siempre.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                metrics.incr(f'{self.name}.followers')
+                return future, False
+            future = self._calls[key] = Future()
+        metrics.incr(f'{self.name}.leaders')
+        return future, True
+
+    def finish(self, key, result=None, error=None):
+        """El líder publica su resultado (o error) y libera la clave"""
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None and not isinstance(error, Exception):
+            # Cancelación o salida del líder: las seguidoras lo reintentan
+            error = RuntimeError(f"{self.name}: el líder no terminó")
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """
+        Ejecuta fn() una sola vez por clave entre los hilos concurrentes
+
+        Si el líder falla, cada seguidora lo reintenta por su cuenta.
+        """
+        future, leader = self.begin(key)
+        if not leader:
+            try:
+                return future.result()
+            except Exception:
+                metrics.incr(f'{self.name}.leader_failures')
+                return fn()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result=result)
+        return result
+
+    async def do_async(self, key, fn):
+        """Como do(), con fn una función asíncrona"""
+        future, leader = self.begin(key)
+        if not leader:
+            try:
+                return await wait_async(future)
+            except Exception:
+                metrics.incr(f'{self.name}.leader_failures')
+                return await fn()
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result=result)
+        return result
+
+    def stats(self):
+        """Líderes, seguidoras y proporción de peticiones agrupadas"""
+        leaders = metrics.get_counter(f'{self.name}.leaders')
+        followers = metrics.get_counter(f'{self.name}.followers')
+        with self._lock:
+            in_flight = len(self._calls)
+        total = leaders + followers
+        return {
+            'in_flight': in_flight,
+            'leaders': leaders,
+            'followers': followers,
+            'coalesced_ratio': round(followers / total, 4) if total else 0.0,
+            'leader_failures': metrics.get_counter(f'{self.name}.leader_failures'),
+        }
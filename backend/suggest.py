@@ -0,0 +1,186 @@
+"""
+Autocompletado del buscador (/api/suggest)
+Completa la última palabra que se está escribiendo con las palabras más
+frecuentes del corpus y propone episodios cuyo título casa con lo escrito.
+
+El vocabulario (suggest_terms) se calcula al publicar cada generación del
+índice (search_index.build_suggest_terms). Aquí se carga en memoria una
+vez por generación: una lista ordenada de términos sin tildes donde cada
+prefijo es un rango (bisect), y para los prefijos de hasta SHORT_PREFIX
+letras, cuyos rangos son enormes, el top ya calculado. Publicar otra
+generación hace que la siguiente petición recargue.
+"""
+import bisect
+import heapq
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from backend.search import get_search_connection
+from backend.search_index import get_generation
+from backend.text_es import strip_accents, tokenize, content_terms
+from backend import metrics
+
+# Letras mínimas para sugerir, prefijos con top precalculado y tamaños
+MIN_PREFIX = 2
+SHORT_PREFIX = 2
+SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+EPISODES = 3
+
+_LAST_WORD_RE = re.compile(r'(\w+)$')
+
+# Vocabulario de una generación del índice:
+#   terms/words/freqs: términos sin tildes (ordenados), palabra y frecuencia
+#   short_top: prefijo corto -> índices de los términos más frecuentes
+#   episodes: episodios, más recientes primero
+#   titles: (palabras de los títulos ordenadas, episodios de cada palabra)
+Vocabulary = namedtuple('Vocabulary', 'generation terms words freqs short_top episodes titles')
+
+_lock = threading.Lock()
+_loaded = None
+
+
+def load_vocabulary(conn):
+    """
+    Vocabulario de la generación abierta en `conn`, cargado una sola vez
+
+    Returns:
+        Vocabulary
+    """
+    global _loaded
+    generation = get_generation(conn)
+    vocabulary = _loaded
+    if vocabulary is not None and vocabulary.generation == generation:
+        return vocabulary
+    with _lock:
+        if _loaded is None or _loaded.generation != generation:
+            started = time.monotonic()
+            _loaded = build_vocabulary(conn, generation)
+            metrics.incr('suggest.loads')
+            metrics.observe('suggest.load', time.monotonic() - started)
+        return _loaded
+
+
+def build_vocabulary(conn, generation):
+    try:
+        rows = conn.execute('SELECT term, word, freq FROM suggest_terms ORDER BY term').fetchall()
+    except sqlite3.OperationalError as e:
+        # Índice anterior al autocompletado: la próxima sync lo calcula
+        print(f"Error cargando el vocabulario de sugerencias: {e}")
+        rows = []
+    terms = [row[0] for row in rows]
+    words = [row[1] for row in rows]
+    freqs = [row[2] for row in rows]
+
+    buckets = {}
+    for index, term in enumerate(terms):
+        for length in range(MIN_PREFIX, SHORT_PREFIX + 1):
+            if len(term) >= length:
+                buckets.setdefault(term[:length], []).append(index)
+    short_top = {
+        prefix: heapq.nlargest(MAX_SUGGESTIONS, indices, key=freqs.__getitem__)
+        for prefix, indices in buckets.items()
+    }
+
+    episodes = []
+    try:
+        for video_id, title, url, published in conn.execute('''
+            SELECT video_id, MAX(title), MAX(url), MAX(published)
+            FROM transcript_passages
+            WHERE title IS NOT NULL
+            GROUP BY video_id
+            ORDER BY MAX(published) DESC
+        '''):
+            episodes.append({
+                'video_id': video_id,
+                'title': title,
+                'url': url,
+                'published': published,
+            })
+    except sqlite3.OperationalError as e:
+        print(f"Error cargando los episodios de sugerencias: {e}")
+
+    # Índice invertido de los títulos: palabra -> episodios, ordenado por
+    # palabra para resolver prefijos con bisect
+    title_index = {}
+    for position, episode in enumerate(episodes):
+        for word in tokenize(episode['title']):
+            title_index.setdefault(word, set()).add(position)
+    title_words = sorted(title_index)
+    titles = (title_words, [title_index[word] for word in title_words])
+    return Vocabulary(generation, terms, words, freqs, short_top, episodes, titles)
+
+
+def prefix_range(words, prefix):
+    """Posiciones [inicio, fin) de las palabras de una lista ordenada que empiezan por `prefix`"""
+    start = bisect.bisect_left(words, prefix)
+    return start, bisect.bisect_left(words, prefix + '\uffff', start)
+
+
+def complete_word(vocabulary, prefix, limit):
+    """Índices de los términos más frecuentes que empiezan por `prefix`"""
+    if len(prefix) <= SHORT_PREFIX:
+        return vocabulary.short_top.get(prefix, [])[:limit]
+    start, end = prefix_range(vocabulary.terms, prefix)
+    return heapq.nlargest(limit, range(start, end), key=vocabulary.freqs.__getitem__)
+
+
+def matching_episodes(vocabulary, tokens, limit):
+    """Episodios (más recientes primero) con todas las palabras por prefijo"""
+    title_words, postings = vocabulary.titles
+    matches = None
+    for token in tokens:
+        start, end = prefix_range(title_words, token)
+        found = set().union(*postings[start:end])
+        matches = found if matches is None else matches & found
+        if not matches:
+            return []
+    return [vocabulary.episodes[position] for position in sorted(matches)[:limit]]
+
+
+def suggest(query, limit=SUGGESTIONS):
+    """
+    Sugerencias para lo que el usuario lleva escrito
+
+    Args:
+        query (str): Texto del buscador, tal cual
+        limit (int): Número máximo de palabras sugeridas
+
+    Returns:
+        dict: suggestions ([{'text', 'word', 'freq'}], donde text es la
+        consulta con la última palabra completada), episodes y generation
+    """
+    started = time.monotonic()
+    limit = max(1, min(int(limit), MAX_SUGGESTIONS))
+    try:
+        # Generación y vocabulario del mismo conn (ver search.search_page)
+        vocabulary = load_vocabulary(get_search_connection())
+    except sqlite3.OperationalError as e:
+        # Aún no hay índice (antes de la primera sincronización)
+        print(f"Error en sugerencias: {e}")
+        return {'query': query, 'generation': 0, 'suggestions': [], 'episodes': []}
+
+    suggestions = []
+    episodes = []
+    match = _LAST_WORD_RE.search(query)
+    prefix = strip_accents(match.group(1).lower()) if match else ''
+    if len(prefix) >= MIN_PREFIX:
+        head = query[:match.start()]
+        words, freqs = vocabulary.words, vocabulary.freqs
+        suggestions = [
+            {'text': head + words[index], 'word': words[index], 'freq': freqs[index]}
+            for index in complete_word(vocabulary, prefix, limit)
+        ]
+        terms = content_terms(query)
+        if terms:
+            episodes = matching_episodes(vocabulary, terms, EPISODES)
+
+    metrics.observe('search.suggest', time.monotonic() - started)
+    return {
+        'query': query,
+        'generation': vocabulary.generation,
+        'suggestions': suggestions,
+        'episodes': episodes,
+    }
@@ -0,0 +1,311 @@
+"""
+Estado persistente de la sincronización
+Registro de intentos de descarga por vídeo con reintentos exponenciales y
+trabajos de sincronización reanudables con checkpoints por etapa y
+elección de líder mediante un lease para que solo un proceso sincronice
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+# Primer reintento tras un ciclo de sincronización; se duplica hasta el tope
+RETRY_BASE_SECONDS = 6 * 3600
+RETRY_MAX_SECONDS = 30 * 24 * 3600
+
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS download_attempts (
+        video_id TEXT PRIMARY KEY,
+        title TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        last_attempt_at INTEGER,
+        next_retry_at INTEGER
+    );
+
+    CREATE TABLE IF NOT EXISTS sync_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        data TEXT NOT NULL DEFAULT '{}',
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS sync_job_items (
+        job_id INTEGER NOT NULL,
+        video_id TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        error TEXT,
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (job_id, video_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS sync_leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at INTEGER NOT NULL,
+        last_run_at INTEGER
+    );
+'''
+
+
+def ensure_schema(conn):
+    """Crea (si no existen) las tablas de estado de la sincronización"""
+    conn.executescript(SCHEMA_SQL)
+
+
+def retry_delay(attempts):
+    """Espera antes del siguiente intento tras `attempts` fallos seguidos"""
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def load_attempts(conn):
+    """Devuelve el registro de intentos como diccionario video_id -> fila"""
+    cursor = conn.execute('''
+        SELECT video_id, title, attempts, last_error, last_attempt_at, next_retry_at
+        FROM download_attempts
+    ''')
+    columns = [col[0] for col in cursor.description]
+    return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def is_eligible(entry, now=None):
+    """True si el vídeo no tiene fallos previos o ya cumplió su espera"""
+    if entry is None or entry['next_retry_at'] is None:
+        return True
+    return (now or time.time()) >= entry['next_retry_at']
+
+
+def record_failure(conn, video_id, title, error, now=None):
+    """Anota un intento fallido y programa el siguiente"""
+    now = int(now or time.time())
+    row = conn.execute(
+        'SELECT attempts FROM download_attempts WHERE video_id = ?', (video_id,)
+    ).fetchone()
+    attempts = (row[0] if row else 0) + 1
+    conn.execute('''
+        INSERT INTO download_attempts
+            (video_id, title, attempts, last_error, last_attempt_at, next_retry_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(video_id) DO UPDATE SET
+            title = excluded.title,
+            attempts = excluded.attempts,
+            last_error = excluded.last_error,
+            last_attempt_at = excluded.last_attempt_at,
+            next_retry_at = excluded.next_retry_at
+    ''', (video_id, title, attempts, error, now, now + retry_delay(attempts)))
+    return attempts
+
+
+def record_success(conn, video_id):
+    """Olvida los fallos de un vídeo cuya transcripción ya se descargó"""
+    conn.execute('DELETE FROM download_attempts WHERE video_id = ?', (video_id,))
+
+
+def _iso(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def attempts_summary(conn, limit=100):
+    """
+    Resumen del registro de intentos para /api/sync_status
+
+    Returns:
+        dict con totales y las `limit` entradas con reintento más próximo
+    """
+    now = time.time()
+    entries = sorted(load_attempts(conn).values(), key=lambda e: e['next_retry_at'] or 0)
+    return {
+        'total': len(entries),
+        'waiting': sum(1 for e in entries if not is_eligible(e, now)),
+        'entries': [
+            {
+                'video_id': e['video_id'],
+                'title': e['title'],
+                'attempts': e['attempts'],
+                'last_error': e['last_error'],
+                'last_attempt_at': _iso(e['last_attempt_at']),
+                'next_retry_at': _iso(e['next_retry_at']),
+            }
+            for e in entries[:limit]
+        ]
+    }
+
+
+# ==================== TRABAJOS DE SINCRONIZACIÓN ====================
+
+# Etapas de un trabajo, en orden; 'publish' es la única que toca lo visible
+JOB_STAGES = ('enumerate', 'download', 'clean', 'index', 'publish')
+
+# Un trabajo interrumpido hace más de esto se abandona en vez de reanudarse
+JOB_RESUME_MAX_AGE = 24 * 3600
+
+
+def _load_job(row):
+    job_id, status, stage, data, created_at, updated_at = row
+    return {
+        'id': job_id,
+        'status': status,
+        'stage': stage,
+        'data': json.loads(data),
+        'created_at': created_at,
+        'updated_at': updated_at,
+    }
+
+
+def start_or_resume_job(conn, now=None):
+    """
+    Devuelve el trabajo en curso más reciente o crea uno nuevo
+
+    Los trabajos en curso demasiado antiguos se marcan como abandonados.
+
+    Returns:
+        Tupla (job, resumed)
+    """
+    now = int(now or time.time())
+    row = conn.execute('''
+        SELECT id, status, stage, data, created_at, updated_at
+        FROM sync_jobs WHERE status = 'running'
+        ORDER BY id DESC LIMIT 1
+    ''').fetchone()
+
+    with conn:
+        if row is not None:
+            job = _load_job(row)
+            if now - job['updated_at'] <= JOB_RESUME_MAX_AGE:
+                return job, True
+            conn.execute(
+                "UPDATE sync_jobs SET status = 'abandoned', updated_at = ? WHERE id = ?",
+                (now, job['id'])
+            )
+
+        cursor = conn.execute('''
+            INSERT INTO sync_jobs (status, stage, data, created_at, updated_at)
+            VALUES ('running', ?, '{}', ?, ?)
+        ''', (JOB_STAGES[0], now, now))
+
+    return {
+        'id': cursor.lastrowid,
+        'status': 'running',
+        'stage': JOB_STAGES[0],
+        'data': {},
+        'created_at': now,
+        'updated_at': now,
+    }, False
+
+
+def advance_job(conn, job, stage, **data):
+    """Guarda el progreso del trabajo y lo pasa a la etapa `stage`"""
+    job['stage'] = stage
+    job['data'].update(data)
+    job['updated_at'] = int(time.time())
+    with conn:
+        conn.execute(
+            'UPDATE sync_jobs SET stage = ?, data = ?, updated_at = ? WHERE id = ?',
+            (stage, json.dumps(job['data'], ensure_ascii=False), job['updated_at'], job['id'])
+        )
+
+
+def finish_job(conn, job, status='completed'):
+    """Cierra el trabajo"""
+    job['status'] = status
+    with conn:
+        conn.execute(
+            'UPDATE sync_jobs SET status = ?, updated_at = ? WHERE id = ?',
+            (status, int(time.time()), job['id'])
+        )
+
+
+def checkpoint_item(conn, job, video_id, stage, error=None):
+    """Anota la última etapa completada (o 'failed') de un vídeo del trabajo"""
+    with conn:
+        conn.execute('''
+            INSERT INTO sync_job_items (job_id, video_id, stage, error, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(job_id, video_id) DO UPDATE SET
+                stage = excluded.stage,
+                error = excluded.error,
+                updated_at = excluded.updated_at
+        ''', (job['id'], video_id, stage, error, int(time.time())))
+
+
+def load_job_items(conn, job):
+    """Devuelve los checkpoints del trabajo como diccionario video_id -> etapa"""
+    cursor = conn.execute(
+        'SELECT video_id, stage FROM sync_job_items WHERE job_id = ?', (job['id'],)
+    )
+    return dict(cursor.fetchall())
+
+
+# ==================== LEASE DE LÍDER ====================
+
+def claim_scheduled_run(conn, name, holder, lease_seconds, interval_seconds, now=None):
+    """
+    Intenta ser el líder y reclamar la ejecución del intervalo actual
+
+    El lease (renovado en cada llamada del líder) decide qué proceso
+    sincroniza; last_run_at garantiza una sola ejecución por intervalo
+    aunque el lease cambie de manos.
+
+    Args:
+        conn: Conexión SQLite sin transacción abierta
+        name: Nombre del lease (p. ej. 'sync')
+        holder: Identificador único del proceso
+        lease_seconds: Validez del lease
+        interval_seconds: Separación mínima entre ejecuciones
+
+    Returns:
+        True si quien llama debe ejecutar la sincronización ahora
+    """
+    now = int(now or time.time())
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            'SELECT holder, expires_at, last_run_at FROM sync_leases WHERE name = ?', (name,)
+        ).fetchone()
+
+        if row is not None and row[0] != holder and row[1] > now:
+            conn.rollback()
+            return False
+
+        last_run_at = row[2] if row is not None else None
+        due = last_run_at is None or now - last_run_at >= interval_seconds
+        conn.execute('''
+            INSERT INTO sync_leases (name, holder, expires_at, last_run_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                holder = excluded.holder,
+                expires_at = excluded.expires_at,
+                last_run_at = excluded.last_run_at
+        ''', (name, holder, now + lease_seconds, now if due else last_run_at))
+        conn.commit()
+        return due
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def release_lease(conn, name, holder):
+    """Libera el lease si lo tiene `holder` (al apagar el proceso)"""
+    with conn:
+        conn.execute(
+            'UPDATE sync_leases SET expires_at = 0 WHERE name = ? AND holder = ?',
+            (name, holder)
+        )
+
+
+def lease_status(conn, name):
+    """Estado del lease para /api/sync_status (None si nunca se reclamó)"""
+    row = conn.execute(
+        'SELECT holder, expires_at, last_run_at FROM sync_leases WHERE name = ?', (name,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        'holder': row[0],
+        'active': row[1] > time.time(),
+        'expires_at': _iso(row[1]) if row[1] else None,
+        'last_run_at': _iso(row[2]),
+    }
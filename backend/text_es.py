@@ -0,0 +1,102 @@
+"""
+Utilidades de texto en español
+Normalización de consultas: minúsculas, sin tildes, sin signos ni stopwords,
+y un stemmer ligero de español para el índice de búsqueda
+"""
+import math
+import re
+import unicodedata
+
+# Palabras vacías frecuentes en las preguntas al buscador
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual
+cuales cuando de del desde donde durante e el ella ellas ellos en entre era
+eres es esa esas ese eso esos esta estan estas este esto estos fue fueron ha
+han hay la las le les lo los mas me mi mis mucho muy nada ni no nos o os otra
+otro para pero poco por porque que quien quienes se sea segun ser si sido sin
+sobre son su sus tambien te tiene tienen tu tus un una unas uno unos y ya yo
+puedes podrias dime dame quiero saber hablan habla hablo hablaron sabes
+""".split())
+
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+# Sufijos derivativos y de flexión (sin tildes), del más largo al más corto.
+# Se quita el primero que encaje dejando una raíz de al menos MIN_STEM letras.
+STEM_SUFFIXES = (
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'iciones',
+    'idades', 'ciones', 'adoras', 'adores', 'mente', 'acion', 'icion',
+    'idad', 'cion', 'ismos', 'istas', 'ables', 'ibles', 'adora', 'ador',
+    'ismo', 'ista', 'able', 'ible', 'ando', 'iendo', 'ados', 'adas', 'idos',
+    'idas', 'ado', 'ada', 'ido', 'ida', 'ieron', 'aron', 'aban', 'amos',
+    'emos', 'imos',
+)
+MIN_STEM = 3
+
+# Media de caracteres por token en texto español (estimación sin tokenizador)
+CHARS_PER_TOKEN = 4
+
+
+def strip_accents(text):
+    """Quita tildes y diacríticos (la ñ pasa a n)"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """Palabras en minúsculas y sin tildes"""
+    text = strip_accents(text.lower())
+    text = _NON_WORD_RE.sub(' ', text)
+    return [token for token in _SPACES_RE.split(text) if token]
+
+
+def content_terms(text):
+    """Palabras de la consulta que no son stopwords"""
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+def stem(token):
+    """
+    Raíz de una palabra ya en minúsculas y sin tildes
+
+    Stemmer ligero: un sufijo derivativo o verbal, o si no el plural, la
+    vocal de género y la terminación de infinitivo o de tercera persona.
+    Conflaciona "vulnerabilidad" y "vulnerabilidades", "ataque" y
+    "ataques", "informacion" e "informar".
+    """
+    if len(token) <= MIN_STEM or not token.isalpha():
+        return token
+    for suffix in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)]
+    if token.endswith('s') and len(token) - 1 >= MIN_STEM:
+        token = token[:-1]
+    if token[-1] in 'aeo' and len(token) - 1 >= MIN_STEM:
+        token = token[:-1]
+    if token.endswith(('ar', 'er', 'ir', 'an', 'en')) and len(token) - 2 >= MIN_STEM:
+        token = token[:-2]
+    return token
+
+
+def stem_text(text):
+    """Texto con cada palabra reducida a su raíz (lo que indexa FTS5)"""
+    return ' '.join(stem(token) for token in tokenize(text))
+
+
+def normalize_query(text):
+    """
+    Forma canónica de una consulta, usada como clave de caché
+
+    "¿Qué episodios hay sobre Ransomware?" y "que episodios hay sobre
+    ransomware" dan la misma clave.
+    """
+    terms = content_terms(text)
+    if not terms:
+        # Consulta hecha solo de stopwords: conservar las palabras tal cual
+        terms = tokenize(text)
+    return ' '.join(terms)
+
+
+def estimate_tokens(text):
+    """Número aproximado de tokens que ocupa `text` en el prompt"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
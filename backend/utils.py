@@ -119,6 +119,20 @@ def save_json_file(file_path: str, data, indent: int = 2) -> bool:
         return False
 
 
+def sse_event(event: str, data) -> str:
+    """
+    Formatea un evento Server-Sent Events con datos JSON
+    
+    Args:
+        event: Nombre del evento
+        data: Datos serializables a JSON
+        
+    Returns:
+        Texto del evento, terminado en línea en blanco
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 def sanitize_filename(filename: str) -> str:
     """
     Sanitiza un nombre de archivo eliminando caracteres no seguros
@@ -0,0 +1,283 @@
+"""
+Índice vectorial local de los pasajes (TF-IDF con hashing + LSA)
+Complementa a FTS5 con búsqueda por similitud: una pregunta formulada
+con otras palabras encuentra pasajes que BM25 no ve porque no comparten
+los términos exactos, si en el corpus esas palabras aparecen juntas.
+
+Todo es local y en CPU, con NumPy (dependencia opcional: sin NumPy el
+chat busca solo con FTS5):
+- Cada pasaje se convierte en un vector TF-IDF de HASH_DIM posiciones
+  (términos sin tildes ni stopwords más su prefijo de PREFIX_LEN letras,
+  repartidos por hashing con signo).
+- LSA: se proyecta a LSA_DIM dimensiones con los vectores propios
+  principales de XᵀX, acumulada por lotes sin tener nunca la matriz entera
+  en memoria y descompuesta por iteración de subespacios (aleatorizada,
+  con semilla fija: mismo corpus, mismos vectores).
+- La matriz final (float32, filas normalizadas) se guarda en un .npy que
+  la app abre con mmap: todos los workers comparten las mismas páginas.
+
+Los ficheros llevan el número de generación de search.db y el nombre se
+guarda en su index_meta, así que índice FTS5 y vectores siempre casan.
+"""
+import glob
+import os
+import threading
+import time
+import zlib
+from backend.text_es import content_terms
+from backend import metrics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HASH_DIM = 4096
+LSA_DIM = 256
+PREFIX_LEN = 5
+BATCH_ROWS = 2048
+SUBSPACE_ITERATIONS = 4
+OVERSAMPLE = 10
+
+_lock = threading.Lock()
+_loaded = {}    # prefijo de ficheros -> (ids, matriz, idf, proyección)
+
+
+def available():
+    """¿Está NumPy instalado?"""
+    return np is not None
+
+
+def text_features(text):
+    """Términos del texto y prefijos (conflación barata de plurales/verbos)"""
+    features = []
+    for term in content_terms(text):
+        features.append(term)
+        if len(term) > PREFIX_LEN:
+            features.append(term[:PREFIX_LEN] + '*')
+    return features
+
+
+def hash_counts(text):
+    """
+    Cuentas con signo por posición del vector
+
+    Returns:
+        dict: posición -> (signo, número de apariciones)
+    """
+    counts = {}
+    for feature in text_features(text):
+        h = zlib.crc32(feature.encode('utf-8'))
+        index = h % HASH_DIM
+        sign = 1.0 if (h >> 31) & 1 else -1.0
+        _, n = counts.get(index, (sign, 0))
+        counts[index] = (sign, n + 1)
+    return counts
+
+
+def tfidf_rows(counts_list, idf):
+    """Matriz TF-IDF (filas normalizadas) de una lista de hash_counts"""
+    X = np.zeros((len(counts_list), HASH_DIM), dtype=np.float32)
+    for row, counts in enumerate(counts_list):
+        for index, (sign, n) in counts.items():
+            X[row, index] = sign * (1.0 + np.log(n)) * idf[index]
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def normalize_rows(M):
+    norms = np.linalg.norm(M, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (M / norms).astype(np.float32)
+
+
+# ==================== CONSTRUCCIÓN ====================
+
+def top_eigenvectors(gram, dims):
+    """
+    Vectores propios principales de una matriz simétrica (iteración de
+    subespacios); mucho más rápido que eigh completo para dims << HASH_DIM
+    """
+    rng = np.random.default_rng(0)
+    basis, _ = np.linalg.qr(rng.standard_normal((len(gram), dims + OVERSAMPLE)))
+    for _ in range(SUBSPACE_ITERATIONS):
+        basis, _ = np.linalg.qr(gram @ basis)
+    eigenvalues, small = np.linalg.eigh(basis.T @ gram @ basis)
+    order = np.argsort(eigenvalues)[::-1][:dims]
+    return basis @ small[:, order]
+
+
+def files_prefix(db_path, generation):
+    return f"{db_path}.vectors-{generation}"
+
+
+def build_vector_index(conn, db_path, generation):
+    """
+    Calcula los vectores de todos los pasajes de `conn`
+
+    Escribe {db_path}.vectors-{generation}.npy (matriz), .ids.npy y
+    .model.npz (idf y proyección) y apunta index_meta a ellos.
+
+    Returns:
+        int: Pasajes vectorizados (0 si no hay NumPy o no hay pasajes)
+    """
+    # El puntero copiado de la generación anterior ya no vale
+    with conn:
+        conn.execute("DELETE FROM index_meta WHERE key = 'vectors'")
+    if np is None:
+        return 0
+
+    started = time.monotonic()
+    rows = conn.execute(
+        'SELECT id, title, content FROM transcript_passages ORDER BY id'
+    ).fetchall()
+    if not rows:
+        return 0
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    counts_list = [hash_counts(f"{row[1] or ''} {row[2]}") for row in rows]
+
+    df = np.zeros(HASH_DIM, dtype=np.float64)
+    for counts in counts_list:
+        df[list(counts)] += 1
+    idf = (np.log((1 + len(rows)) / (1 + df)) + 1).astype(np.float32)
+
+    # XᵀX por lotes; sus vectores propios principales son la base LSA
+    gram = np.zeros((HASH_DIM, HASH_DIM), dtype=np.float64)
+    for start in range(0, len(rows), BATCH_ROWS):
+        X = tfidf_rows(counts_list[start:start + BATCH_ROWS], idf)
+        gram += X.T @ X
+    dims = min(LSA_DIM, HASH_DIM)
+    projection = np.ascontiguousarray(top_eigenvectors(gram, dims), dtype=np.float32)
+
+    prefix = files_prefix(db_path, generation)
+    matrix = np.lib.format.open_memmap(f"{prefix}.npy", mode='w+', dtype=np.float32,
+                                       shape=(len(rows), dims))
+    for start in range(0, len(rows), BATCH_ROWS):
+        X = tfidf_rows(counts_list[start:start + BATCH_ROWS], idf)
+        matrix[start:start + len(X)] = normalize_rows(X @ projection)
+    matrix.flush()
+    del matrix
+    np.save(f"{prefix}.ids.npy", ids)
+    np.savez(f"{prefix}.model.npz", idf=idf, projection=projection)
+
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('vectors', ?)",
+            (os.path.basename(prefix),)
+        )
+    metrics.observe('vectors.build', time.monotonic() - started)
+    return len(rows)
+
+
+def remove_stale_vectors(db_path, keep):
+    """Borra los ficheros de vectores de generaciones que ya no se sirven"""
+    for path in glob.glob(f"{glob.escape(db_path)}.vectors-*"):
+        name = os.path.basename(path)[len(os.path.basename(db_path)) + len('.vectors-'):]
+        generation = name.split('.', 1)[0]
+        if generation.isdigit() and int(generation) not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def vectors_missing(conn):
+    """¿El índice abierto en `conn` no tiene vectores (y NumPy sí está)?"""
+    return np is not None and _vectors_name(conn) is None
+
+
+# ==================== CONSULTA ====================
+
+def _vectors_name(conn):
+    try:
+        row = conn.execute("SELECT value FROM index_meta WHERE key = 'vectors'").fetchone()
+    except Exception:
+        return None
+    return row[0] if row else None
+
+
+def load_index(conn, db_path):
+    """
+    Vectores del índice abierto en `conn`, abiertos con mmap (una vez)
+
+    Returns:
+        tuple: (ids, matriz, idf, proyección) o None si no hay vectores
+    """
+    if np is None:
+        return None
+    name = _vectors_name(conn)
+    if not name:
+        return None
+    prefix = os.path.join(os.path.dirname(db_path), name)
+
+    index = _loaded.get(prefix)
+    if index is not None:
+        return index
+    with _lock:
+        index = _loaded.get(prefix)
+        if index is None:
+            try:
+                model = np.load(f"{prefix}.model.npz")
+                index = (
+                    np.load(f"{prefix}.ids.npy"),
+                    np.load(f"{prefix}.npy", mmap_mode='r'),
+                    model['idf'],
+                    model['projection'],
+                )
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error cargando vectores {prefix}: {e}")
+                return None
+            # Solo se mantiene abierta la generación actual
+            _loaded.clear()
+            _loaded[prefix] = index
+            metrics.incr('vectors.loads')
+    return index
+
+
+def embed_queries(queries, idf, projection):
+    """Vectores LSA (normalizados) de varias consultas a la vez"""
+    X = tfidf_rows([hash_counts(query) for query in queries], idf)
+    return normalize_rows(X @ projection)
+
+
+def search_many(conn, db_path, queries, k=20, min_score=0.05):
+    """
+    Top-k por similitud coseno para un lote de consultas
+
+    Una sola multiplicación matriz × lote por bloques de filas; el top-k
+    sale de argpartition sin ordenar toda la columna.
+
+    Returns:
+        list: Por consulta, [(passage_id, puntuación)] de mayor a menor
+    """
+    index = load_index(conn, db_path)
+    if index is None or not queries:
+        return [[] for _ in queries]
+
+    started = time.monotonic()
+    ids, matrix, idf, projection = index
+    Q = embed_queries(queries, idf, projection)
+    scores = np.empty((len(matrix), len(queries)), dtype=np.float32)
+    for start in range(0, len(matrix), 65536):
+        scores[start:start + 65536] = matrix[start:start + 65536] @ Q.T
+
+    results = []
+    k = min(k, len(matrix))
+    for column, query_vector in enumerate(Q):
+        if not query_vector.any() or k == 0:
+            results.append([])
+            continue
+        column_scores = scores[:, column]
+        top = np.argpartition(-column_scores, k - 1)[:k]
+        top = top[np.argsort(-column_scores[top])]
+        results.append([(int(ids[i]), float(column_scores[i]))
+                        for i in top if column_scores[i] >= min_score])
+    metrics.observe('vectors.search', time.monotonic() - started)
+    return results
+
+
+def search(conn, db_path, query, k=20):
+    """Top-k de una sola consulta (ver search_many)"""
+    return search_many(conn, db_path, [query], k)[0]
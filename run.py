@@ -1,6 +1,6 @@
 """
 Punto de entrada principal para Un Podcast Seguro
-Servidor ASGI con Uvicorn + WhiteNoise
+Servidor ASGI con Uvicorn + WhiteNoise (chat asíncrono nativo)
 """
 import sys
 import os
@@ -17,41 +17,54 @@ if site_packages:
 import uvicorn
 from asgiref.wsgi import WsgiToAsgi
 from whitenoise import WhiteNoise
-from apscheduler.schedulers.background import BackgroundScheduler
 
 # Crear la aplicación usando el factory pattern
 from backend import create_app
+from backend.asgi import create_asgi_app
 
 app = create_app()
 
 # Wrap with WhiteNoise for static file serving
 app.wsgi_app = WhiteNoise(app.wsgi_app, root='static/', prefix='static/', max_age=31536000)
 
-# Wrap the Flask app with WsgiToAsgi to make it ASGI compatible
-asgi_app = WsgiToAsgi(app)
+# Wrap the Flask app with WsgiToAsgi to make it ASGI compatible.
+# El chat (/api/chat, /api/chat/stream) se sirve de forma nativa y asíncrona
+# para no ocupar un hilo por conversación mientras responde Gemini.
+asgi_app = create_asgi_app(app, WsgiToAsgi(app))
 
 
 # ==================== SCHEDULER ====================
+# La sincronización corre en su propio proceso: python scripts/sync_worker.py
+# Con SYNC_IN_APP=1 se ejecuta dentro de la app: cada worker de uvicorn
+# comprueba periódicamente, pero solo el líder (lease en SQLite) sincroniza
+# y como mucho una vez por intervalo en todo el despliegue.
 
 def run_sync():
-    """Ejecutar sincronización de transcripciones"""
+    """Tick de sincronización: solo sincroniza si este proceso es el líder"""
     try:
-        from scripts import sync_transcripts
-        sync_transcripts.sync_transcripts()
+        from scripts import sync_worker
+        from backend import catalog
+        if sync_worker.run_if_leader():
+            # Sincronización completada: recargar ya el catálogo del prompt
+            catalog.invalidate()
     except Exception as e:
         print(f"Error en sincronización automática: {e}")
 
 
-# Configurar scheduler para sincronización automática
-scheduler = BackgroundScheduler()
-scheduler.add_job(func=run_sync, trigger="interval", hours=6, id='sync_job')
-# scheduler.add_job(func=run_sync, trigger="date", run_date=datetime.now(), id='startup_sync')
-scheduler.start()
+if os.getenv('SYNC_IN_APP') == '1':
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from scripts import sync_worker
 
-# Registrar shutdown del scheduler
-atexit.register(lambda: scheduler.shutdown())
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(func=run_sync, trigger="interval",
+                      seconds=sync_worker.SYNC_TICK_SECONDS, id='sync_job')
+    scheduler.start()
 
-print("[INFO] Sincronización automática de transcripciones activada (cada 6 horas)")
+    # Registrar shutdown del scheduler y liberar el lease
+    atexit.register(lambda: scheduler.shutdown())
+    atexit.register(sync_worker.release)
+
+    print("[INFO] Sincronización automática en la app activada (elección de líder)")
 
 
 # ==================== MAIN ====================
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+End-to-end chat benchmark without network
+Runs the whole RAG path (router, cache, FTS5 search, prompt assembly,
+gateway, LLM provider) in-process against the local search index, using
+the deterministic fake provider or a replay file instead of Gemini.
+
+Usage:
+    python scripts/bench_chat.py --requests 500 --concurrency 50 --mode async
+    python scripts/bench_chat.py --mode stream --latency 0.8 --tokens-per-second 40
+    LLM_RECORDINGS=database/llm_recordings.jsonl python scripts/bench_chat.py --provider replay
+"""
+
+import sys
+import os
+import glob
+
+# Configure dependency paths
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+site_packages = glob.glob(os.path.join(base_dir, 'librerias/lib/python*/site-packages'))
+if site_packages:
+    sys.path.insert(0, site_packages[0])
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_QUERIES = [
+    "¿Qué es el ransomware y cómo se propaga?",
+    "Consejos para empezar en el hacking ético",
+    "¿Cómo se protege una empresa del phishing?",
+    "¿Qué certificaciones recomiendan para pentesting?",
+    "Inteligencia artificial aplicada a la ciberseguridad",
+    "¿Qué es un SOC y qué hace un analista?",
+    "Seguridad en la nube y configuraciones erróneas",
+    "¿Cómo preparar una entrevista de trabajo en ciberseguridad?",
+    "Ingeniería social y OSINT",
+    "Bug bounty: cómo empezar",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def build_queries(base, total, repeat):
+    """
+    Queries for the run. With repeat=0 every request is distinct (cache
+    misses); with repeat=1 the base list is cycled as-is.
+    """
+    queries = []
+    for i in range(total):
+        query = base[i % len(base)]
+        if (i / total) >= repeat:
+            query = f"{query} {i}"
+        queries.append(query)
+    return queries
+
+
+def run_sync(ai, queries, concurrency, stream):
+    def one(query):
+        started = time.monotonic()
+        first = None
+        if stream:
+            for event, _ in ai.answer_query_stream(query):
+                if event == 'token' and first is None:
+                    first = time.monotonic() - started
+        else:
+            ai.answer_query(query)
+        return time.monotonic() - started, first
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, queries))
+
+
+async def run_async(ai, queries, concurrency, stream):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query):
+        async with semaphore:
+            started = time.monotonic()
+            first = None
+            if stream:
+                async for event, _ in ai.answer_query_stream_async(query):
+                    if event == 'token' and first is None:
+                        first = time.monotonic() - started
+            else:
+                await ai.answer_query_async(query)
+            return time.monotonic() - started, first
+
+    return await asyncio.gather(*(one(query) for query in queries))
+
+
+def ms(value):
+    return None if value is None else round(value * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end chat benchmark')
+    parser.add_argument('--provider', default='fake', choices=['fake', 'replay'])
+    parser.add_argument('--mode', default='async', choices=['sync', 'async', 'stream', 'stream-async'])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--repeat', type=float, default=0.0,
+                        help='fraction of requests that repeat a base query (cache/coalescing hits)')
+    parser.add_argument('--latency', type=float, help='fake provider: seconds to first token')
+    parser.add_argument('--tokens-per-second', type=float, help='fake provider: output rate')
+    parser.add_argument('--answer-tokens', type=int, help='fake provider: answer length')
+    parser.add_argument('--queries', help='file with one query per line')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    options = parser.parse_args()
+
+    # The provider is chosen when backend.ai is imported
+    os.environ['LLM_PROVIDER'] = options.provider
+    if options.latency is not None:
+        os.environ['LLM_FAKE_LATENCY'] = str(options.latency)
+    if options.tokens_per_second:
+        os.environ['LLM_FAKE_TOKENS_PER_SECOND'] = str(options.tokens_per_second)
+    if options.answer_tokens:
+        os.environ['LLM_FAKE_ANSWER_TOKENS'] = str(options.answer_tokens)
+    # No hedging or budget: measure the path, not the policies
+    os.environ.setdefault('LLM_HEDGE', '0')
+    os.environ.setdefault('LLM_TOKENS_PER_MINUTE', '0')
+
+    from backend import ai, metrics
+
+    base = DEFAULT_QUERIES
+    if options.queries:
+        with open(options.queries, 'r', encoding='utf-8') as f:
+            base = [line.strip() for line in f if line.strip()]
+    queries = build_queries(base, options.requests, options.repeat)
+    stream = options.mode.startswith('stream')
+
+    started = time.monotonic()
+    if options.mode.endswith('async'):
+        results = asyncio.run(run_async(ai, queries, options.concurrency, stream))
+    else:
+        results = run_sync(ai, queries, options.concurrency, stream)
+    elapsed = time.monotonic() - started
+
+    latencies = [total for total, _ in results]
+    firsts = [first for _, first in results if first is not None]
+    counters = metrics.snapshot()['counters']
+    report = {
+        'provider': ai.provider.name,
+        'mode': options.mode,
+        'requests': len(results),
+        'concurrency': options.concurrency,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+        'latency_ms': {f'p{p}': ms(percentile(latencies, p)) for p in (50, 95, 99)},
+        'first_token_ms': {f'p{p}': ms(percentile(firsts, p)) for p in (50, 95, 99)} if stream else None,
+        'answer_cache': ai.answer_cache.stats(),
+        'chat_flight': ai.chat_flight.stats(),
+        'fallbacks': {k: v for k, v in counters.items() if k.startswith('chat.fallback.')},
+    }
+
+    if options.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    print(f"{report['requests']} peticiones ({report['mode']}, {report['provider']}, "
+          f"concurrencia {report['concurrency']}) en {report['elapsed_s']} s: "
+          f"{report['throughput_rps']} req/s")
+    print(f"latencia ms: {report['latency_ms']}")
+    if stream:
+        print(f"primer token ms: {report['first_token_ms']}")
+    print(f"caché: hit_rate={report['answer_cache']['hit_rate']} | "
+          f"coalescidas={report['chat_flight']['coalesced_ratio']} | "
+          f"respuestas extractivas={report['fallbacks'] or 0}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+FTS5 query benchmark
+Runs a corpus of natural-language questions against the search index
+twice: passing the raw text to MATCH (the old behaviour) and through the
+query compiler (backend/fts_query.py). Reports, for each, how many
+queries ran without an FTS5 error, how many returned passages, and the
+latency percentiles.
+
+Usage:
+    python scripts/bench_search.py
+    python scripts/bench_search.py --queries preguntas.txt --repeat 5 --db database/search.db
+"""
+
+import sys
+import os
+import glob
+
+# Configure dependency paths
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+site_packages = glob.glob(os.path.join(base_dir, 'librerias/lib/python*/site-packages'))
+if site_packages:
+    sys.path.insert(0, site_packages[0])
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+
+import argparse
+import json
+import sqlite3
+import time
+
+from backend.config import Config
+from backend.connections import connect
+from backend.fts_query import compile_match
+
+DEFAULT_QUERIES = [
+    "¿Qué es el ransomware?",
+    "¿Cómo empiezo en ciberseguridad?",
+    "ransomware-as-a-service",
+    "\"hacking ético\"",
+    "OSINT: ¿qué herramientas usáis?",
+    "pentesting vs red team",
+    "¿Qué opinas de la IA en el SOC?",
+    "vulnerabilidades en IoT",
+    "certificaciones: OSCP, CEH, eJPT...",
+    "¿Quién habló de bug bounty?",
+    "phishing (ingeniería social)",
+    "seguridad en la nube / AWS",
+    "¿Cuánto cobra un pentester?",
+    "malware en Android*",
+    "cómo proteger mi wifi",
+    "NEAR",
+    "¿?",
+    "forense digital - casos reales",
+    "Zero Trust: ¿moda o necesidad?",
+    "criptografía post-cuántica",
+]
+
+SQL = '''
+    SELECT p.id
+    FROM passages_search
+    JOIN transcript_passages p ON p.id = passages_search.rowid
+    WHERE passages_search MATCH ?
+    ORDER BY passages_search.rank
+    LIMIT ?
+'''
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(conn, queries, compile_query, repeat, limit):
+    """Time every query; returns the summary for one strategy"""
+    latencies = []
+    ok = 0
+    hits = 0
+    for query in queries:
+        match = compile_match(query) if compile_query else query
+        for i in range(repeat):
+            started = time.perf_counter()
+            try:
+                rows = conn.execute(SQL, (match, limit)).fetchall() if match else []
+            except sqlite3.Error:
+                rows = None
+            latencies.append(time.perf_counter() - started)
+        if rows is not None:
+            ok += 1
+            hits += 1 if rows else 0
+    total = len(queries)
+    return {
+        'queries': total,
+        'success_rate': round(ok / total, 3) if total else None,
+        'hit_rate': round(hits / total, 3) if total else None,
+        'latency_ms': {f'p{p}': round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FTS5 query compiler benchmark')
+    parser.add_argument('--db', default=Config.SEARCH_DATABASE, help='search index (search.db)')
+    parser.add_argument('--queries', help='file with one query per line')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per query (latency)')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    options = parser.parse_args()
+
+    if not os.path.exists(options.db):
+        print(f"No existe el índice {options.db}; ejecuta antes scripts/sync_transcripts.py")
+        sys.exit(1)
+
+    queries = DEFAULT_QUERIES
+    if options.queries:
+        with open(options.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    conn = connect(options.db, readonly=True)
+    try:
+        report = {
+            'raw': run(conn, queries, False, options.repeat, options.limit),
+            'compiled': run(conn, queries, True, options.repeat, options.limit),
+        }
+    finally:
+        conn.close()
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, summary in report.items():
+        print(f"{name:9} éxito={summary['success_rate']:.1%} con resultados={summary['hit_rate']:.1%} "
+              f"latencia ms={summary['latency_ms']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Typeahead benchmark
+Replays keystroke traffic against /api/suggest's backend (backend/suggest.py)
+in-process: every query of the corpus is typed one character at a time by
+concurrent users, and each keystroke asks for suggestions. Reports the
+one-off vocabulary load (once per index generation) and the per-keystroke
+latency percentiles under concurrency.
+
+Usage:
+    python scripts/bench_suggest.py
+    python scripts/bench_suggest.py --users 50 --rounds 20 --db database/search.db
+"""
+
+import sys
+import os
+import glob
+
+# Configure dependency paths
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+site_packages = glob.glob(os.path.join(base_dir, 'librerias/lib/python*/site-packages'))
+if site_packages:
+    sys.path.insert(0, site_packages[0])
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.config import Config
+
+DEFAULT_QUERIES = [
+    "ransomware en hospitales",
+    "cómo empezar en ciberseguridad",
+    "certificaciones de pentesting",
+    "ingeniería social y phishing",
+    "vulnerabilidades en IoT",
+    "inteligencia artificial en el SOC",
+    "bug bounty",
+    "seguridad en la nube",
+    "análisis forense",
+    "contraseñas y autenticación",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def keystrokes(query):
+    """Every prefix of the query, as sent while typing it"""
+    return [query[:i] for i in range(1, len(query) + 1)]
+
+
+def ms(value):
+    return None if value is None else round(value * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Typeahead (suggest) benchmark')
+    parser.add_argument('--db', default=Config.SEARCH_DATABASE, help='search index (search.db)')
+    parser.add_argument('--queries', help='file with one query per line')
+    parser.add_argument('--users', type=int, default=20, help='concurrent typists')
+    parser.add_argument('--rounds', type=int, default=10, help='times each user types the corpus')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    options = parser.parse_args()
+
+    if not os.path.exists(options.db):
+        print(f"No existe el índice {options.db}; ejecuta antes scripts/sync_transcripts.py")
+        sys.exit(1)
+    Config.SEARCH_DATABASE = options.db
+
+    from backend import suggest
+
+    queries = DEFAULT_QUERIES
+    if options.queries:
+        with open(options.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    typed = [prefix for query in queries for prefix in keystrokes(query)]
+
+    # Cold start: the first request after a publish loads the vocabulary
+    started = time.perf_counter()
+    suggest.load_vocabulary(suggest.get_search_connection())
+    load = time.perf_counter() - started
+
+    def user(_):
+        latencies = []
+        empty = 0
+        for _ in range(options.rounds):
+            for prefix in typed:
+                started = time.perf_counter()
+                result = suggest.suggest(prefix)
+                latencies.append(time.perf_counter() - started)
+                if len(prefix.strip()) >= suggest.MIN_PREFIX and not result['suggestions']:
+                    empty += 1
+        return latencies, empty
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.users) as pool:
+        results = list(pool.map(user, range(options.users)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [value for values, _ in results for value in values]
+    vocabulary = suggest.load_vocabulary(suggest.get_search_connection())
+    report = {
+        'terms': len(vocabulary.terms),
+        'episodes': len(vocabulary.episodes),
+        'load_ms': ms(load),
+        'users': options.users,
+        'keystrokes': len(latencies),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {f'p{p}': ms(percentile(latencies, p)) for p in (50, 95, 99)},
+        'empty_rate': round(sum(empty for _, empty in results) / len(latencies), 3) if latencies else None,
+    }
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"vocabulario: {report['terms']} términos, {report['episodes']} episodios, "
+          f"carga {report['load_ms']} ms")
+    print(f"{report['keystrokes']} pulsaciones ({report['users']} usuarios) en {report['elapsed_s']} s: "
+          f"{report['throughput_rps']} req/s")
+    print(f"latencia ms: {report['latency_ms']} | sin sugerencias: {report['empty_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
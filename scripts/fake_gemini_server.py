@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Fake Gemini server for exercising the LLM gateway locally
+Speaks enough of the Gemini REST API (generateContent and
+streamGenerateContent?alt=sse) for google-genai, and injects latency,
+errors and stalls so that deadlines, retries, hedging and the circuit
+breaker can be observed without calling the real service.
+
+Usage:
+    python scripts/fake_gemini_server.py --latency 0.5 --jitter 1.5 --error-rate 0.2
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8089 python run.py
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_RE = re.compile(r'^/[^/]+/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)')
+
+
+def response_body(text, final=True):
+    """Minimal GenerateContentResponse JSON"""
+    candidate = {'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}
+    if final:
+        candidate['finishReason'] = 'STOP'
+    return {'candidates': [candidate]}
+
+
+def make_handler(options):
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):
+            logging.info("%s - %s", self.address_string(), fmt % args)
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            match = PATH_RE.match(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not match:
+                self.send_json(404, {'error': {'code': 404, 'message': 'not found', 'status': 'NOT_FOUND'}})
+                return
+
+            # Fault injection: stall, fail or just be slow
+            roll = random.random()
+            if roll < options.stall_rate:
+                time.sleep(options.stall_seconds)
+            elif roll < options.stall_rate + options.error_rate:
+                code = options.error_status
+                self.send_json(code, {'error': {'code': code, 'message': 'injected failure',
+                                                'status': 'UNAVAILABLE'}})
+                return
+            time.sleep(options.latency + random.uniform(0, options.jitter))
+
+            prompt = ''.join(
+                part.get('text', '')
+                for content in request.get('contents', [])
+                for part in content.get('parts', [])
+            )
+            answer = (f"Respuesta simulada de {match.group('model')} "
+                      f"para un prompt de {len(prompt)} caracteres.")
+
+            if match.group('method') == 'generateContent':
+                self.send_json(200, response_body(answer))
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            words = answer.split(' ')
+            for i, word in enumerate(words):
+                chunk = word + (' ' if i < len(words) - 1 else '')
+                payload = json.dumps(response_body(chunk, final=i == len(words) - 1))
+                self.wfile.write(f"data: {payload}\r\n\r\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(options.chunk_delay)
+            self.close_connection = True
+
+    return FakeGeminiHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Gemini API with fault injection')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.3, help='base latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='extra random latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status for injected failures')
+    parser.add_argument('--stall-rate', type=float, default=0.0, help='fraction of requests that hang')
+    parser.add_argument('--stall-seconds', type=float, default=120.0)
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='delay between streamed chunks (s)')
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(options))
+    logging.info(f"Fake Gemini escuchando en http://{options.host}:{options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,14 +13,36 @@ base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 site_packages = glob.glob(os.path.join(base_dir, 'librerias/lib/python*/site-packages'))
 if site_packages:
     sys.path.insert(0, site_packages[0])
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
 
-import sqlite3
 import json
-import subprocess
 import re
+import sqlite3
 import fcntl
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from urllib.parse import urlparse
+
+from backend.connections import connect
+from backend.vector_index import vectors_missing
+from backend.passages import parse_subtitle_cues, build_passages, chunk_plain_text
+from backend.search_index import (
+    INDEX_VERSION, ensure_schema, index_transcript, delete_transcript,
+    prepare_next_generation, next_generation_path, publish_next_generation,
+    discard_next_generation, get_generation, fts_outdated, suggest_outdated,
+    file_fingerprint, content_hash, load_manifest, get_manifest_entry,
+    save_manifest_entry, delete_manifest_entry, delete_orphan_passages
+)
+from backend.sync_state import (
+    ensure_schema as ensure_sync_state_schema, load_attempts, is_eligible,
+    record_failure, record_success, JOB_STAGES, start_or_resume_job,
+    advance_job, finish_job, checkpoint_item, load_job_items
+)
+from scripts.downloaders import get_downloader
 
 # Configure logging
 logging.basicConfig(
@@ -34,16 +56,36 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 TRANSCRIPTS_FOLDER = os.path.join(BASE_DIR, 'database', 'transcripts')
 VIDEOS_JSON_PATH = os.path.join(BASE_DIR, 'static', 'data', 'videos.json')
 SYNC_LOG_PATH = os.path.join(BASE_DIR, 'sync_log.json')
+STAGING_FOLDER = os.path.join(BASE_DIR, 'database', 'sync_staging')
 
 DB_PATH = os.path.join(BASE_DIR, 'database', 'usuarios.db')
+# Search index: built as search.db.next during a job, swapped in on publish
+SEARCH_DB_PATH = os.path.join(BASE_DIR, 'database', 'search.db')
+
+# Download pool: concurrent yt-dlp workers and per-host politeness delay
+DOWNLOAD_WORKERS = int(os.getenv('SYNC_DOWNLOAD_WORKERS', '4'))
+HOST_DELAY_SECONDS = float(os.getenv('SYNC_HOST_DELAY', '1.0'))
+
+# Playlist probe: compare only the newest entries with videos.json and run
+# the full enumeration when they differ or the full reconcile is due
+PLAYLIST_FULL_LIMIT = 1000
+PROBE_SIZE = int(os.getenv('SYNC_PROBE_SIZE', '15'))
+FULL_RECONCILE_HOURS = float(os.getenv('SYNC_FULL_RECONCILE_HOURS', '24'))
 
 # YouTube playlist
 YOUTUBE_CHANNEL_URL = 'https://www.youtube.com/playlist?list=PLnuadL3Xteo2BlcWFfbl7-BiimziNkFkS'
 
+# Downloader backend, created on first use (SYNC_DOWNLOADER selects it)
+_downloader = None
+
 def sanitize_filename(name):
     """Remove invalid characters from filename"""
     return re.sub(r'[\\/*?:"<>|]', "", name)
 
+def cues_path_for(txt_path):
+    """Path of the timed-cues sidecar stored next to a transcript .txt"""
+    return os.path.splitext(txt_path)[0] + '.cues.json'
+
 def clean_transcript_text(raw_text):
     """Cleans WebVTT/SRT content to plain text"""
     lines = raw_text.splitlines()
@@ -77,64 +119,53 @@ def clean_transcript_text(raw_text):
         
     return " ".join(cleaned_lines)
 
-def get_youtube_videos():
-    """Fetch latest videos from YouTube channel using yt-dlp"""
-    logging.info("Obteniendo videos del canal...")
+def get_downloader_backend():
+    """Downloader shared by the whole sync (see scripts/downloaders.py)"""
+    global _downloader
+    if _downloader is None:
+        _downloader = get_downloader()
+    return _downloader
+
+def playlist_entry_to_video(entry):
+    """Convert a flat playlist entry into a videos.json item (None if filtered out)"""
+    video_id = entry.get('id')
+    title = entry.get('title')
+    url = entry.get('url') or entry.get('webpage_url')
     
-    command = [
-        sys.executable,
-        '-m', 'yt_dlp',
-        '--dump-json',
-        '--flat-playlist',
-        '--playlist-end', '1000',
-        YOUTUBE_CHANNEL_URL
-    ]
+    # Filter out Shorts and Private videos
+    if not video_id or not title:
+        return None
+    if url and '/shorts/' in url:
+        return None
+    if '[Private video]' in title:
+        return None
     
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, timeout=60)
-        
-        if result.returncode != 0:
-            logging.error(f"Error ejecutando yt-dlp: {result.stderr}")
-            return []
+    return {
+        'id': video_id,
+        'title': title,
+        'link': f"https://www.youtube.com/watch?v={video_id}",
+        'thumbnail': f"https://i.ytimg.com/vi/{video_id}/mqdefault.jpg",
+        'published': ''
+    }
 
-        videos = []
-        for line in result.stdout.strip().split('\n'):
-            if not line:
-                continue
-            try:
-                entry = json.loads(line)
-                
-                video_id = entry.get('id')
-                title = entry.get('title')
-                url = entry.get('url') or entry.get('webpage_url')
-                
-                # Filter out Shorts and Private videos
-                if url and '/shorts/' in url:
-                    continue
-                if title and '[Private video]' in title:
-                    continue
-                
-                thumbnail = f"https://i.ytimg.com/vi/{video_id}/mqdefault.jpg"
-                
-                videos.append({
-                    'id': video_id,
-                    'title': title,
-                    'link': f"https://www.youtube.com/watch?v={video_id}",
-                    'thumbnail': thumbnail,
-                    'published': ''
-                })
-            except json.JSONDecodeError:
-                continue
-        
-        logging.info(f"{len(videos)} videos encontrados")
-        return videos
-        
-    except subprocess.TimeoutExpired:
-        logging.error("Timeout al obtener videos de YouTube")
-        return []
+def get_youtube_videos(limit=PLAYLIST_FULL_LIMIT):
+    """Fetch latest videos from the YouTube playlist"""
+    logging.info("Obteniendo videos del canal...")
+    
+    try:
+        entries = get_downloader_backend().list_playlist(YOUTUBE_CHANNEL_URL, limit)
     except Exception as e:
         logging.error(f"Error al obtener videos: {e}")
         return []
+    
+    videos = []
+    for entry in entries:
+        video = playlist_entry_to_video(entry)
+        if video:
+            videos.append(video)
+    
+    logging.info(f"{len(videos)} videos encontrados")
+    return videos
 
 def load_existing_videos():
     """Load existing videos from videos.json"""
@@ -147,114 +178,584 @@ def load_existing_videos():
             return []
     return []
 
+def load_sync_log():
+    """Load the previous sync_log.json (empty dict if missing)"""
+    try:
+        with open(SYNC_LOG_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.error(f"Error cargando log de sincronización: {e}")
+        return {}
+
+def full_reconcile_due(last_full, now=None):
+    """True when the last full playlist enumeration is older than FULL_RECONCILE_HOURS"""
+    if not last_full:
+        return True
+    try:
+        elapsed = (now or datetime.now()) - datetime.fromisoformat(last_full)
+    except ValueError:
+        return True
+    return elapsed.total_seconds() >= FULL_RECONCILE_HOURS * 3600
+
+def playlist_head_changed(head, existing_videos):
+    """
+    Compare the probed newest entries with the head of videos.json
+    
+    New uploads, removals or renames inside the probed window all shift or
+    alter the (id, title) sequence.
+    """
+    if not head or len(existing_videos) < len(head):
+        return True
+    known = [(v['id'], v['title']) for v in existing_videos[:len(head)]]
+    return [(v['id'], v['title']) for v in head] != known
+
+def enumerate_videos(existing_videos, last_full):
+    """
+    Return (current_videos, full_enumeration)
+    
+    Probes the newest PROBE_SIZE entries first and only dumps the whole
+    playlist when the probe sees a change or the full reconcile is due.
+    """
+    if existing_videos and not full_reconcile_due(last_full):
+        head = get_youtube_videos(limit=PROBE_SIZE)
+        if head and not playlist_head_changed(head, existing_videos):
+            logging.info("Sondeo: la lista de reproducción no ha cambiado")
+            return existing_videos, False
+        logging.info("Sondeo: cambios detectados, enumerando la lista completa")
+    
+    return get_youtube_videos(), True
+
+def write_atomic(path, text):
+    """Write a text file via a temp file + rename so readers never see it half-written"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
 def save_videos(videos):
     """Save videos list to videos.json"""
     try:
-        os.makedirs(os.path.dirname(VIDEOS_JSON_PATH), exist_ok=True)
-        with open(VIDEOS_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(videos, f, indent=2, ensure_ascii=False)
+        write_atomic(VIDEOS_JSON_PATH, json.dumps(videos, indent=2, ensure_ascii=False))
         logging.info("videos.json actualizado")
     except Exception as e:
         logging.error(f"Error guardando videos.json: {e}")
 
+def transcript_path_for(video):
+    """Path of the plain-text transcript of a video"""
+    return os.path.join(TRANSCRIPTS_FOLDER, f"{sanitize_filename(video['title'])}.txt")
+
+def staged_subtitles_path(video):
+    """Where the download stage leaves raw subtitles for the clean stage"""
+    return os.path.join(STAGING_FOLDER, f"{video['id']}.sub")
+
 def download_transcript(video):
-    """Download transcript for a single video"""
-    video_id = video['id']
+    """Download the raw subtitles of a single video into the staging folder"""
     title = video['title']
-    safe_title = sanitize_filename(title)
-    txt_filename = f"{safe_title}.txt"
-    txt_path = os.path.join(TRANSCRIPTS_FOLDER, txt_filename)
     
     # Skip if already exists
-    if os.path.exists(txt_path):
+    if os.path.exists(transcript_path_for(video)):
         return False
         
     logging.info(f"Descargando transcripción: {title}")
     
     try:
-        # Ensure transcripts folder exists
-        os.makedirs(TRANSCRIPTS_FOLDER, exist_ok=True)
-        
-        cmd = [
-            sys.executable,
-            '-m', 'yt_dlp',
-            '--write-auto-sub',
-            '--write-sub',
-            '--sub-lang', 'es,en',
-            '--skip-download',
-            '--convert-subs', 'srt',
-            '--output', os.path.join(TRANSCRIPTS_FOLDER, safe_title),
-            f"https://www.youtube.com/watch?v={video_id}"
-        ]
-        
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120)
-        
-        # Find downloaded file
-        downloaded_file = None
-        for f in os.listdir(TRANSCRIPTS_FOLDER):
-            if f.startswith(safe_title) and (f.endswith('.srt') or f.endswith('.vtt')):
-                downloaded_file = os.path.join(TRANSCRIPTS_FOLDER, f)
-                break
-        
-        if downloaded_file:
-            with open(downloaded_file, 'r', encoding='utf-8') as f_in:
-                raw_content = f_in.read()
-            
-            clean_text = clean_transcript_text(raw_content)
-            
-            with open(txt_path, 'w', encoding='utf-8') as f_out:
-                f_out.write(clean_text)
-            
-            # Cleanup original subtitle file
-            os.remove(downloaded_file)
-            logging.info(f"✓ Transcripción guardada: {txt_filename}")
-            return True
-        else:
+        # Subtitle data comes back in memory: no yt-dlp temp file to find
+        raw_content = get_downloader_backend().fetch_subtitles(video['id'])
+        if not raw_content:
             logging.warning(f"✗ No se encontró transcripción para: {title}")
             return False
+        
+        write_atomic(staged_subtitles_path(video), raw_content)
+        return True
             
-    except subprocess.TimeoutExpired:
-        logging.error(f"Timeout descargando: {title}")
-        return False
     except Exception as e:
+        # Propagated so the attempt ledger records the reason
         logging.error(f"Error procesando {title}: {e}")
-        return False
+        raise
+
+def clean_transcript(video):
+    """Turn staged raw subtitles into the transcript .txt and its cues sidecar"""
+    staged_path = staged_subtitles_path(video)
+    txt_path = transcript_path_for(video)
+    
+    if not os.path.exists(staged_path):
+        # Already cleaned by an earlier, interrupted run
+        return os.path.exists(txt_path)
+    
+    with open(staged_path, 'r', encoding='utf-8') as f:
+        raw_content = f.read()
+    
+    # Keep cue start times so passages can be indexed with timestamps.
+    # Written before the .txt: an existing .txt means both are complete.
+    cues = parse_subtitle_cues(raw_content)
+    if cues:
+        write_atomic(cues_path_for(txt_path), json.dumps(cues, ensure_ascii=False))
+    write_atomic(txt_path, clean_transcript_text(raw_content))
+    
+    os.remove(staged_path)
+    logging.info(f"✓ Transcripción guardada: {os.path.basename(txt_path)}")
+    return True
+
+def load_passages(txt_path):
+    """Build the passages of a transcript, timed when a cues sidecar exists"""
+    cues_path = cues_path_for(txt_path)
+    if os.path.exists(cues_path):
+        try:
+            with open(cues_path, 'r', encoding='utf-8') as f:
+                cues = [(start, text) for start, text in json.load(f)]
+            passages = build_passages(cues)
+            if passages:
+                return passages
+        except Exception as e:
+            logging.error(f"Error leyendo cues {cues_path}: {e}")
+    
+    # Legacy transcripts: only the plain .txt is available
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        return chunk_plain_text(f.read())
+
+def transcript_files(video):
+    """Transcript filename and path of a video, plus the files it is indexed from"""
+    txt_filename = f"{sanitize_filename(video['title'])}.txt"
+    txt_path = os.path.join(TRANSCRIPTS_FOLDER, txt_filename)
+    return txt_filename, txt_path, [txt_path, cues_path_for(txt_path)]
+
+def index_video(conn, video, entry):
+    """
+    Bring the indexed passages of one video in line with its files on disk
+    
+    Args:
+        conn: SQLite connection (the caller owns the transaction)
+        video: Video dict (id, title, link, published)
+        entry: Its current index_manifest row, or None
+    
+    Returns:
+        'indexed', 'unchanged', or None when there is no usable transcript
+    """
+    txt_filename, txt_path, paths = transcript_files(video)
+    if not os.path.exists(txt_path):
+        return None
+    
+    mtime_ns, size = file_fingerprint(paths)
+    same_file = (entry is not None and
+                 entry['filename'] == txt_filename and
+                 entry['index_version'] == INDEX_VERSION)
+    
+    if same_file and entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+        return 'unchanged'
+    
+    digest = content_hash(paths)
+    if same_file and entry['content_hash'] == digest:
+        # Touched but identical content: only refresh the fingerprint
+        result = 'unchanged'
+    else:
+        try:
+            passages = load_passages(txt_path)
+        except Exception as e:
+            logging.error(f"Error indexing {txt_filename}: {e}")
+            return None
+        if entry is not None and entry['filename'] != txt_filename:
+            delete_transcript(conn, entry['filename'])
+        index_transcript(conn, txt_filename, video, passages)
+        result = 'indexed'
+    
+    save_manifest_entry(conn, video['id'], txt_filename, txt_path,
+                        digest, mtime_ns, size)
+    return result
 
-def update_search_index(filename, title, content, url, published=""):
-    """Update FTS5 index for a transcript"""
+def connect_index():
+    """
+    Connection to the search index generation being built (search.db.next)
+    
+    The first call of a job copies the published search.db into it, so only
+    call this when there is something to write.
+    """
+    conn = connect(prepare_next_generation(SEARCH_DB_PATH))
+    ensure_schema(conn)
+    return conn
+
+def pending_index_changes(videos):
+    """
+    Check the catalog against the manifest of the published search.db
+    without copying it: by stat() fingerprint, like index_video
+    
+    Returns:
+        (changed, unchanged): changed is True if a transcript is new or
+        differs from its manifest entry, or an indexed video has no
+        transcript anymore; unchanged counts the transcripts that match
+    """
+    if not os.path.exists(SEARCH_DB_PATH):
+        return True, 0
+    conn = connect(SEARCH_DB_PATH, readonly=True)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Ensure table exists (duplicate of app.py logic to be safe)
-        cursor.execute('''
-            CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_search USING fts5(
-                filename,
-                title,
-                content,
-                url,
-                published,
-                tokenize='porter'
-            );
-        ''')
-        
-        # Remove existing entry
-        cursor.execute('DELETE FROM transcripts_search WHERE filename = ?', (filename,))
-        
-        # Insert
-        cursor.execute('''
-            INSERT INTO transcripts_search (filename, title, content, url, published)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (filename, title, content, url, published))
+        manifest = load_manifest(conn)
+    except sqlite3.OperationalError:
+        # Index older than the manifest
+        return True, 0
+    finally:
+        conn.close()
+    
+    unchanged = 0
+    for video in videos:
+        entry = manifest.pop(video['id'], None)
+        txt_filename, txt_path, paths = transcript_files(video)
+        if not os.path.exists(txt_path):
+            if entry is not None:
+                return True, 0
+            continue
+        mtime_ns, size = file_fingerprint(paths)
+        if (entry is None or entry['filename'] != txt_filename or
+                entry['index_version'] != INDEX_VERSION or
+                entry['mtime_ns'] != mtime_ns or entry['size'] != size):
+            return True, 0
+        unchanged += 1
+    # Manifest entries left are videos no longer in the playlist
+    return bool(manifest), unchanged
+
+def current_index_generation():
+    """Generation number of the published search.db (0 if none)"""
+    if not os.path.exists(SEARCH_DB_PATH):
+        return 0
+    conn = connect(SEARCH_DB_PATH, readonly=True)
+    try:
+        return get_generation(conn)
+    finally:
+        conn.close()
+
+def current_index_outdated():
+    """
+    True if the published index must be republished even without corpus
+    changes: older FTS5 table definition, no typeahead vocabulary, or no
+    vectors (with NumPy available)
+    """
+    conn = connect(SEARCH_DB_PATH, readonly=True)
+    try:
+        return fts_outdated(conn) or suggest_outdated(conn) or vectors_missing(conn)
+    finally:
+        conn.close()
+
+def publish_search_index(index_stats):
+    """
+    Swap the rebuilt search index in, or drop it if the corpus did not change
+    
+    With no corpus changes there is usually no search.db.next; one is only
+    made here when the published index is missing or outdated.
+    
+    Returns:
+        The generation now being served
+    """
+    changed = index_stats['indexed'] or index_stats['removed']
+    if not changed and os.path.exists(SEARCH_DB_PATH) and not current_index_outdated():
+        discard_next_generation(SEARCH_DB_PATH)
+        return current_index_generation()
+    if not os.path.exists(next_generation_path(SEARCH_DB_PATH)):
+        if changed:
+            # Already swapped by an interrupted publish
+            return current_index_generation()
+        prepare_next_generation(SEARCH_DB_PATH)
+    
+    generation = publish_next_generation(SEARCH_DB_PATH)
+    logging.info(f"Índice de búsqueda publicado (generación {generation})")
+    return generation
+
+def reindex_transcripts(videos):
+    """
+    Incrementally sync the search index with the transcripts on disk
+    
+    Uses the index_manifest table: transcripts whose stat() fingerprint and
+    index version are unchanged are skipped without being read, changed or
+    new ones are re-chunked and reindexed, and videos that no longer have a
+    transcript are removed. Everything runs in a single transaction, on
+    search.db.next; when nothing changed that file is not even created.
+    
+    Returns:
+        dict with 'indexed', 'unchanged' and 'removed' counts
+    """
+    stats = {'indexed': 0, 'unchanged': 0, 'removed': 0}
+    if not os.path.exists(next_generation_path(SEARCH_DB_PATH)):
+        changed, unchanged = pending_index_changes(videos)
+        if not changed:
+            # Nothing to write: no need for a new generation
+            stats['unchanged'] = unchanged
+            return stats
+    conn = connect_index()
+    try:
+        manifest = load_manifest(conn)
+        seen_ids = set()
         
-        conn.commit()
+        with conn:
+            for video in videos:
+                result = index_video(conn, video, manifest.get(video['id']))
+                if result is None:
+                    continue
+                seen_ids.add(video['id'])
+                stats[result] += 1
+            
+            for video_id, entry in manifest.items():
+                if video_id not in seen_ids:
+                    delete_transcript(conn, entry['filename'])
+                    delete_manifest_entry(conn, video_id)
+                    stats['removed'] += 1
+            
+            # Rows left behind by syncs that predate the manifest
+            delete_orphan_passages(conn)
+    finally:
         conn.close()
-        # logging.info(f"Indexed: {filename}") 
+    
+    return stats
+
+class HostThrottle:
+    """Enforces a minimum delay between request starts against the same host"""
+    
+    def __init__(self, delay):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_slot = {}
+    
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+def download_transcripts_parallel(videos, downloader=None, workers=None, delay=None):
+    """
+    Download transcripts with a bounded worker pool
+    
+    Yields (video, downloaded, error) as soon as each download finishes, so
+    the caller can index results while the rest are still in flight. `error`
+    describes why a download produced no transcript (None on success).
+    
+    Args:
+        videos: Videos to download
+        downloader: Callable(video) -> bool, defaults to download_transcript
+        workers: Pool size, defaults to DOWNLOAD_WORKERS
+        delay: Seconds between requests to the same host, defaults to HOST_DELAY_SECONDS
+    """
+    downloader = downloader or download_transcript
+    workers = workers or DOWNLOAD_WORKERS
+    throttle = HostThrottle(HOST_DELAY_SECONDS if delay is None else delay)
+    
+    def task(video):
+        throttle.wait(video.get('link') or f"https://www.youtube.com/watch?v={video['id']}")
+        return downloader(video)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(task, video): video for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                downloaded = bool(future.result())
+                error = None if downloaded else 'Sin subtítulos disponibles'
+            except Exception as e:
+                logging.error(f"Error descargando {video.get('title')}: {e}")
+                downloaded = False
+                error = str(e) or e.__class__.__name__
+            yield video, downloaded, error
+
+def index_downloaded_video(video):
+    """Index a freshly downloaded transcript in its own short transaction"""
+    conn = connect_index()
+    try:
+        with conn:
+            return index_video(conn, video, get_manifest_entry(conn, video['id']))
     except Exception as e:
-        logging.error(f"Error updating search index for {filename}: {e}")
+        logging.error(f"Error indexando {video.get('title')}: {e}")
+        return None
+    finally:
+        conn.close()
+
+def advance_item(conn, job, video, stage):
+    """
+    Move one video through clean -> index starting after `stage`
+    
+    Every step is checkpointed, so an interrupted run picks the video up
+    exactly where it stopped.
+    """
+    if stage == 'download':
+        try:
+            cleaned = clean_transcript(video)
+        except Exception as e:
+            logging.error(f"Error limpiando {video['title']}: {e}")
+            cleaned = False
+        if not cleaned:
+            checkpoint_item(conn, job, video['id'], 'failed', 'Error limpiando subtítulos')
+            return
+        checkpoint_item(conn, job, video['id'], 'clean')
+        stage = 'clean'
+    
+    if stage == 'clean':
+        if index_downloaded_video(video) is None:
+            checkpoint_item(conn, job, video['id'], 'failed', 'Error indexando')
+            return
+        checkpoint_item(conn, job, video['id'], 'index')
+
+def run_enumerate_stage(conn, job):
+    """Stage 1: work out the current playlist (probe first) and freeze it in the job"""
+    existing_videos = load_existing_videos()
+    existing_ids = {v['id'] for v in existing_videos}
+    last_full = load_sync_log().get('last_full_enumeration')
+    
+    current_videos, full_enumeration = enumerate_videos(existing_videos, last_full)
+    if not current_videos:
+        return False
+    
+    new_videos = [v for v in current_videos if v['id'] not in existing_ids]
+    logging.info(f"Videos existentes: {len(existing_videos)}")
+    logging.info(f"Videos nuevos detectados: {len(new_videos)}")
+    
+    advance_job(
+        conn, job, 'download',
+        videos=current_videos,
+        full_enumeration=full_enumeration,
+        last_full_enumeration=datetime.now().isoformat() if full_enumeration else last_full,
+        new_videos_found=len(new_videos)
+    )
+    return True
+
+def run_download_stage(conn, job):
+    """Stage 2: download missing transcripts, cleaning and indexing each as it lands"""
+    videos = job['data']['videos']
+    items = load_job_items(conn, job)
+    
+    # Download transcripts for ALL videos that don't have a transcript yet
+    missing_transcripts = [
+        v for v in videos
+        if not os.path.exists(transcript_path_for(v)) and v['id'] not in items
+    ]
+    
+    # Videos that failed recently wait out their backoff
+    attempts = load_attempts(conn)
+    now = time.time()
+    eligible = [v for v in missing_transcripts if is_eligible(attempts.get(v['id']), now)]
+    
+    if 'missing_transcripts' not in job['data']:
+        advance_job(
+            conn, job, 'download',
+            missing_transcripts=len(missing_transcripts),
+            skipped_backoff=len(missing_transcripts) - len(eligible)
+        )
+    logging.info(f"Transcripciones faltantes: {len(missing_transcripts)}")
+    logging.info(f"Omitidas por reintento pendiente: {len(missing_transcripts) - len(eligible)}")
+    
+    for video, downloaded, error in download_transcripts_parallel(eligible):
+        with conn:
+            if downloaded:
+                record_success(conn, video['id'])
+            else:
+                record_failure(conn, video['id'], video['title'], error)
+        if not downloaded:
+            checkpoint_item(conn, job, video['id'], 'failed', error)
+            continue
+        checkpoint_item(conn, job, video['id'], 'download')
+        advance_item(conn, job, video, 'download')
+    
+    advance_job(conn, job, 'clean')
+
+def run_clean_stage(conn, job):
+    """Stage 3: finish items whose download completed but were not cleaned yet"""
+    videos = {v['id']: v for v in job['data']['videos']}
+    for video_id, stage in load_job_items(conn, job).items():
+        if stage == 'download' and video_id in videos:
+            advance_item(conn, job, videos[video_id], 'download')
+    advance_job(conn, job, 'index')
+
+def run_index_stage(conn, job):
+    """Stage 4: index leftovers, then the incremental pass over the whole catalog"""
+    videos = job['data']['videos']
+    by_id = {v['id']: v for v in videos}
+    for video_id, stage in load_job_items(conn, job).items():
+        if stage == 'clean' and video_id in by_id:
+            advance_item(conn, job, by_id[video_id], 'clean')
+    
+    # Reindex only new or changed transcripts (one transaction)
+    index_stats = reindex_transcripts(videos)
+    # Items indexed as they downloaded show up as unchanged in this pass
+    streamed = sum(1 for stage in load_job_items(conn, job).values() if stage == 'index')
+    index_stats['indexed'] += min(streamed, index_stats['unchanged'])
+    index_stats['unchanged'] -= min(streamed, index_stats['unchanged'])
+    
+    advance_job(conn, job, 'publish', index_stats=index_stats)
+
+def run_publish_stage(conn, job):
+    """Stage 5: atomically swap in videos.json and sync_log.json, then close the job"""
+    data = job['data']
+    videos = data['videos']
+    stages = list(load_job_items(conn, job).values())
+    downloaded_count = sum(1 for stage in stages if stage in ('download', 'clean', 'index'))
+    index_stats = data['index_stats']
+    
+    # Atomic swap of the search index (search.db.next -> search.db)
+    generation = publish_search_index(index_stats)
+    
+    # Update videos.json with all current videos
+    if data['full_enumeration']:
+        save_videos(videos)
+    
+    # Save sync log
+    sync_data = {
+        'last_sync': datetime.now().isoformat(),
+        'last_full_enumeration': data['last_full_enumeration'],
+        'full_enumeration': data['full_enumeration'],
+        'job_id': job['id'],
+        'total_videos': len(videos),
+        'new_videos_found': data['new_videos_found'],
+        'missing_transcripts': data['missing_transcripts'],
+        'skipped_backoff': data['skipped_backoff'],
+        'transcripts_downloaded': downloaded_count,
+        'transcripts_indexed': index_stats['indexed'],
+        'transcripts_unchanged': index_stats['unchanged'],
+        'transcripts_removed': index_stats['removed'],
+        'index_generation': generation
+    }
+    
+    try:
+        write_atomic(SYNC_LOG_PATH, json.dumps(sync_data, indent=2, ensure_ascii=False))
+    except Exception as e:
+        logging.error(f"Error guardando log de sincronización: {e}")
+    
+    finish_job(conn, job)
+    
+    logging.info(f"{'='*60}")
+    logging.info("SINCRONIZACIÓN COMPLETADA")
+    logging.info(f"  - Transcripciones descargadas: {downloaded_count}")
+    logging.info(f"  - Transcripciones reindexadas: {index_stats['indexed']}")
+    logging.info(f"  - Transcripciones sin cambios: {index_stats['unchanged']}")
+    logging.info(f"  - Transcripciones retiradas del índice: {index_stats['removed']}")
+    logging.info(f"  - Total videos en videos.json: {len(videos)}")
+    logging.info(f"{'='*60}")
+
+def clear_staging():
+    """Drop raw subtitles left behind by an abandoned job"""
+    if not os.path.isdir(STAGING_FOLDER):
+        return
+    for name in os.listdir(STAGING_FOLDER):
+        try:
+            os.remove(os.path.join(STAGING_FOLDER, name))
+        except OSError as e:
+            logging.warning(f"No se pudo borrar {name} de staging: {e}")
+
+STAGE_RUNNERS = {
+    'download': run_download_stage,
+    'clean': run_clean_stage,
+    'index': run_index_stage,
+    'publish': run_publish_stage,
+}
 
 def sync_transcripts():
-    """Main synchronization function"""
+    """
+    Main synchronization function
+    
+    Runs as a job with durable stages (enumerate, download, clean, index,
+    publish) checkpointed in SQLite. If the process dies, the next call
+    resumes the unfinished job at the stage and item where it stopped;
+    videos.json and sync_log.json only change in the final publish stage.
+    """
     lock_path = os.path.join(BASE_DIR, 'sync.lock')
     lock_file = open(lock_path, 'w')
     
@@ -263,110 +764,41 @@ def sync_transcripts():
         fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
     except IOError:
         logging.warning("Another instance is running. Exiting.")
+        lock_file.close()
         return
 
+    conn = None
     try:
+        # On a fresh checkout database/ does not exist yet
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = connect(DB_PATH)
+        ensure_sync_state_schema(conn)
+        job, resumed = start_or_resume_job(conn)
+        
         logging.info(f"{'='*60}")
-        logging.info("INICIANDO SINCRONIZACIÓN")
+        if resumed:
+            logging.info(f"REANUDANDO SINCRONIZACIÓN (trabajo {job['id']}, etapa {job['stage']})")
+        else:
+            logging.info(f"INICIANDO SINCRONIZACIÓN (trabajo {job['id']})")
+            clear_staging()
+            # A half-built generation left by an abandoned job; the next one
+            # is only created once there is something to index
+            discard_next_generation(SEARCH_DB_PATH)
         logging.info(f"{'='*60}")
         
-        # Get current videos from YouTube
-        current_videos = get_youtube_videos()
-        
-        if not current_videos:
+        if job['stage'] == 'enumerate' and not run_enumerate_stage(conn, job):
             logging.warning("No se obtuvieron videos del canal")
+            finish_job(conn, job, 'failed')
             return
         
-        # Load existing videos
-        existing_videos = load_existing_videos()
-        existing_ids = {v['id'] for v in existing_videos}
-        
-        # Find new videos
-        new_videos = [v for v in current_videos if v['id'] not in existing_ids]
-        
-        logging.info(f"Videos existentes: {len(existing_videos)}")
-        logging.info(f"Videos nuevos detectados: {len(new_videos)}")
-        
-        # Download transcripts for ALL videos that don't have a transcript yet
-        downloaded_count = 0
-        missing_transcripts = []
-        
-        # Also reuse this loop to ensure everything is indexed
-        indexed_count = 0
-        
-        for video in current_videos:
-            safe_title = sanitize_filename(video['title'])
-            txt_filename = f"{safe_title}.txt"
-            txt_path = os.path.join(TRANSCRIPTS_FOLDER, txt_filename)
-            
-            # Check if transcript exists
-            if not os.path.exists(txt_path):
-                missing_transcripts.append(video)
-            else:
-                # If it exists, ensure it's indexed
-                try:
-                    with open(txt_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    update_search_index(
-                        txt_filename, 
-                        video['title'], 
-                        content, 
-                        video['link'], 
-                        video.get('published', '')
-                    )
-                    indexed_count += 1
-                except Exception as e:
-                    logging.error(f"Error indexing existing file {txt_filename}: {e}")
-        
-        logging.info(f"Transcripciones faltantes: {len(missing_transcripts)}")
-        
-        for video in missing_transcripts:
-            if download_transcript(video):
-                downloaded_count += 1
-                # Read the newly downloaded file and index
-                safe_title = sanitize_filename(video['title'])
-                txt_filename = f"{safe_title}.txt"
-                txt_path = os.path.join(TRANSCRIPTS_FOLDER, txt_filename)
-                if os.path.exists(txt_path):
-                     with open(txt_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                     update_search_index(
-                        txt_filename, 
-                        video['title'], 
-                        content, 
-                        video['link'], 
-                        video.get('published', '')
-                    )
-                     indexed_count += 1
-        
-        # Update videos.json with all current videos
-        save_videos(current_videos)
-        
-        # Save sync log
-        sync_data = {
-            'last_sync': datetime.now().isoformat(),
-            'total_videos': len(current_videos),
-            'new_videos_found': len(new_videos),
-            'missing_transcripts': len(missing_transcripts),
-            'transcripts_downloaded': downloaded_count
-        }
-        
-        try:
-            with open(SYNC_LOG_PATH, 'w', encoding='utf-8') as f:
-                json.dump(sync_data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logging.error(f"Error guardando log de sincronización: {e}")
-        
-        logging.info(f"{'='*60}")
-        logging.info("SINCRONIZACIÓN COMPLETADA")
-        logging.info(f"  - Transcripciones descargadas: {downloaded_count}")
-        logging.info(f"  - Videos indexados en buscador: {indexed_count}")
-        logging.info(f"  - Total videos en videos.json: {len(current_videos)}")
-        logging.info(f"{'='*60}")
+        for stage in JOB_STAGES[JOB_STAGES.index(job['stage']):]:
+            STAGE_RUNNERS[stage](conn, job)
 
     except Exception as e:
         logging.error(f"Error fatal en sincronización: {e}", exc_info=True)
     finally:
+        if conn is not None:
+            conn.close()
         # Release lock
         fcntl.lockf(lock_file, fcntl.LOCK_UN)
         lock_file.close()
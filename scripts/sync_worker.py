@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Dedicated transcript sync worker
+Runs sync_transcripts() once per interval for the whole deployment, using a
+lease in SQLite so that only one process (worker or web app) is the leader
+"""
+
+import sys
+import os
+import glob
+
+# Configure dependency paths
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+site_packages = glob.glob(os.path.join(base_dir, 'librerias/lib/python*/site-packages'))
+if site_packages:
+    sys.path.insert(0, site_packages[0])
+if base_dir not in sys.path:
+    sys.path.insert(0, base_dir)
+
+import argparse
+import logging
+import signal
+import socket
+import threading
+
+from backend.connections import connect
+from backend.sync_state import (
+    ensure_schema as ensure_sync_state_schema, claim_scheduled_run, release_lease
+)
+from scripts import sync_transcripts
+
+LEASE_NAME = 'sync'
+
+# One sync per interval; the leader renews its lease on every tick
+SYNC_INTERVAL_HOURS = float(os.getenv('SYNC_INTERVAL_HOURS', '6'))
+SYNC_TICK_SECONDS = int(os.getenv('SYNC_TICK_SECONDS', '300'))
+LEASE_SECONDS = 3 * SYNC_TICK_SECONDS
+
+# Identifies this process in the lease
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _connect():
+    # On a fresh checkout database/ does not exist yet
+    os.makedirs(os.path.dirname(sync_transcripts.DB_PATH), exist_ok=True)
+    conn = connect(sync_transcripts.DB_PATH)
+    ensure_sync_state_schema(conn)
+    return conn
+
+
+def run_if_leader(interval_hours=None, holder=HOLDER_ID):
+    """
+    One scheduler tick: renew/claim the lease and sync if this interval is due
+
+    Safe to call from every web worker: followers return immediately.
+
+    Returns:
+        True if this call ran a sync
+    """
+    interval_seconds = (interval_hours or SYNC_INTERVAL_HOURS) * 3600
+    conn = _connect()
+    try:
+        due = claim_scheduled_run(conn, LEASE_NAME, holder, LEASE_SECONDS, interval_seconds)
+    finally:
+        conn.close()
+
+    if not due:
+        return False
+
+    logging.info(f"Líder {holder}: lanzando sincronización")
+    sync_transcripts.sync_transcripts()
+    return True
+
+
+def release(holder=HOLDER_ID):
+    """Give up the lease so another process can take over right away"""
+    try:
+        conn = _connect()
+        try:
+            release_lease(conn, LEASE_NAME, holder)
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error(f"Error liberando lease: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transcript sync worker')
+    parser.add_argument('--once', action='store_true',
+                        help='run a single tick and exit (e.g. from cron)')
+    parser.add_argument('--interval-hours', type=float, default=SYNC_INTERVAL_HOURS,
+                        help='minimum time between syncs')
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    logging.info(f"Sync worker {HOLDER_ID} iniciado (cada {args.interval_hours} h)")
+    try:
+        while not stop.is_set():
+            try:
+                run_if_leader(args.interval_hours)
+            except Exception as e:
+                logging.error(f"Error en sync worker: {e}", exc_info=True)
+            if args.once:
+                break
+            stop.wait(SYNC_TICK_SECONDS)
+    finally:
+        release()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,145 @@ document.addEventListener('DOMContentLoaded', function () {
     const chatForm = document.getElementById('chat-form');
     const chatInput = document.getElementById('chat-input');
     const chatMessages = document.getElementById('chat-messages');
+    const instantResults = document.getElementById('instant-results');
 
     if (!chatForm) return;
 
+    const suggestionList = document.getElementById('chat-suggestions');
+
+    // Typeahead: completions of the last word and matching episodes (/api/suggest)
+    let suggestTimer = null;
+    let suggestController = null;
+
+    if (suggestionList) {
+        chatInput.addEventListener('input', function () {
+            clearTimeout(suggestTimer);
+            const query = chatInput.value;
+            suggestTimer = setTimeout(() => fetchSuggestions(query), 80);
+        });
+    }
+
+    function fetchSuggestions(query) {
+        if (suggestController) suggestController.abort();
+        if (query.trim().length < 2) {
+            suggestionList.innerHTML = '';
+            return;
+        }
+        suggestController = new AbortController();
+
+        fetch(`/api/suggest?${new URLSearchParams({ q: query })}`, { signal: suggestController.signal })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data || chatInput.value !== query) return;
+                suggestionList.innerHTML = '';
+                const values = data.suggestions.map(suggestion => suggestion.text)
+                    .concat(data.episodes.map(episode => episode.title));
+                values.forEach(value => {
+                    const option = document.createElement('option');
+                    option.value = value;
+                    suggestionList.appendChild(option);
+                });
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') console.error('Error:', error);
+            });
+    }
+
+    // Instant results: passages from /api/search while typing, before asking the AI
+    let searchTimer = null;
+    let searchController = null;
+
+    if (instantResults) {
+        chatInput.addEventListener('input', function () {
+            clearTimeout(searchTimer);
+            const query = chatInput.value.trim();
+            if (query.length < 3) {
+                hideInstantResults();
+                return;
+            }
+            searchTimer = setTimeout(() => searchPassages(query, null), 250);
+        });
+    }
+
+    function searchPassages(query, cursor) {
+        if (searchController) searchController.abort();
+        searchController = new AbortController();
+
+        const params = new URLSearchParams({ q: query, limit: 5 });
+        if (cursor) params.set('cursor', cursor);
+
+        fetch(`/api/search?${params}`, { signal: searchController.signal })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data || chatInput.value.trim() !== query) return;
+                renderInstantResults(query, data, Boolean(cursor));
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') console.error('Error:', error);
+            });
+    }
+
+    function renderInstantResults(query, data, append) {
+        if (!append) instantResults.innerHTML = '';
+        const more = instantResults.querySelector('.instant-results-more');
+        if (more) more.remove();
+
+        if (!data.results.length && !append) {
+            hideInstantResults();
+            return;
+        }
+
+        data.results.forEach(result => {
+            const link = document.createElement('a');
+            link.className = 'instant-result';
+            link.href = result.timestamp_url || result.url;
+            link.target = '_blank';
+
+            const title = document.createElement('div');
+            title.className = 'instant-result-title';
+            title.textContent = `▶ ${result.title} ${result.timestamp ? `[${result.timestamp}]` : ''}`;
+
+            const fragment = document.createElement('div');
+            fragment.className = 'instant-result-fragment';
+            fragment.appendChild(highlightFragment(result.fragment, result.highlights));
+
+            link.append(title, fragment);
+            instantResults.appendChild(link);
+        });
+
+        if (data.next_cursor) {
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'instant-results-more';
+            button.textContent = 'Ver más';
+            button.addEventListener('click', () => searchPassages(query, data.next_cursor));
+            instantResults.appendChild(button);
+        }
+        instantResults.hidden = false;
+    }
+
+    // Plain fragment text with <mark> around the [start, end] highlight offsets
+    function highlightFragment(text, highlights) {
+        const container = document.createDocumentFragment();
+        let position = 0;
+        (highlights || []).forEach(([start, end]) => {
+            container.appendChild(document.createTextNode(text.slice(position, start)));
+            const mark = document.createElement('mark');
+            mark.textContent = text.slice(start, end);
+            container.appendChild(mark);
+            position = end;
+        });
+        container.appendChild(document.createTextNode(text.slice(position)));
+        return container;
+    }
+
+    function hideInstantResults() {
+        if (searchController) searchController.abort();
+        if (!instantResults) return;
+        instantResults.hidden = true;
+        instantResults.innerHTML = '';
+    }
+
     chatForm.addEventListener('submit', function (e) {
         e.preventDefault();
         const message = chatInput.value.trim();
@@ -13,61 +149,138 @@ document.addEventListener('DOMContentLoaded', function () {
         // Add user message
         addMessage(message, 'user');
         chatInput.value = '';
+        clearTimeout(searchTimer);
+        clearTimeout(suggestTimer);
+        hideInstantResults();
+        if (suggestionList) suggestionList.innerHTML = '';
 
         // Add typing indicator
         const loadingId = addTypingIndicator();
+        let messageDiv = null;
+        let finished = false;
 
-        // Send to API
-        fetch('/api/chat', {
+        // Send to API (streaming: sources first, then the answer token by token)
+        fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
                 'X-CSRFToken': document.querySelector('meta[name="csrf-token"]').getAttribute('content')
             },
             body: JSON.stringify({ message: message })
         })
-            .then(response => response.json())
-            .then(data => {
-                removeMessage(loadingId);
-                if (data.error) {
-                    addMessage('Lo siento, hubo un error al procesar tu solicitud.', 'ai');
-                } else {
-                    addMessage(data.answer, 'ai', data.sources);
+            .then(response => {
+                if (!response.ok || !response.body) {
+                    throw new Error(`HTTP ${response.status}`);
                 }
+
+                let answer = '';
+                let sources = [];
+
+                return readEventStream(response, (event, data) => {
+                    if (event === 'sources') {
+                        sources = data;
+                    } else if (event === 'token') {
+                        if (!messageDiv) {
+                            removeMessage(loadingId);
+                            messageDiv = addMessage('', 'ai');
+                        }
+                        answer += data;
+                        renderMessage(messageDiv, answer);
+                    } else if (event === 'done') {
+                        finished = true;
+                        if (!messageDiv) {
+                            removeMessage(loadingId);
+                            messageDiv = addMessage('', 'ai');
+                        }
+                        renderMessage(messageDiv, answer, sources);
+                    } else if (event === 'error') {
+                        finished = true;
+                        removeMessage(loadingId);
+                        if (messageDiv) messageDiv.remove();
+                        addMessage('Lo siento, hubo un error al procesar tu solicitud.', 'ai');
+                    }
+                });
+            })
+            .then(() => {
+                // The connection closed before the server said done or error
+                if (!finished) throw new Error('Stream closed before the answer finished');
             })
             .catch(error => {
                 console.error('Error:', error);
                 removeMessage(loadingId);
+                if (messageDiv) messageDiv.remove();
                 addMessage('Lo siento, hubo un error de conexión.', 'ai');
             });
     });
 
+    // Read a text/event-stream response, calling onEvent(event, data) per event
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(event, data ? JSON.parse(data) : null);
+            }
+        }
+    }
+
     function addMessage(text, sender, sources = []) {
         const messageDiv = document.createElement('div');
         messageDiv.classList.add('message', `${sender}-message`);
+        renderMessage(messageDiv, text, sources);
+
+        chatMessages.appendChild(messageDiv);
+        scrollToBottom();
+        return messageDiv;
+    }
 
-        let contentHtml = text.replace(/\n/g, '<br>');
+    // Answer and source titles are text, never markup: built with DOM nodes
+    function renderMessage(messageDiv, text, sources = []) {
+        const content = document.createElement('div');
+        content.className = 'message-content';
+        text.split('\n').forEach((line, index) => {
+            if (index > 0) content.appendChild(document.createElement('br'));
+            content.appendChild(document.createTextNode(line));
+        });
 
         if (sources && sources.length > 0) {
-            contentHtml += '<div class="sources-list"><strong>Fuentes:</strong><br>';
+            const list = document.createElement('div');
+            list.className = 'sources-list';
+            const heading = document.createElement('strong');
+            heading.textContent = 'Fuentes:';
+            list.append(heading, document.createElement('br'));
+
             sources.forEach(source => {
                 const date = source.published ? new Date(source.published).toLocaleDateString() : '';
-                contentHtml += `<a href="${source.url}" target="_blank" class="source-item">
-                    ▶ ${source.title} ${date ? `(${date})` : ''}
-                </a>`;
+                const link = document.createElement('a');
+                link.className = 'source-item';
+                link.href = source.timestamp_url || source.url;
+                link.target = '_blank';
+                link.textContent = `▶ ${source.title} ${source.timestamp ? `[${source.timestamp}]` : ''} ${date ? `(${date})` : ''}`;
+                list.appendChild(link);
             });
-            contentHtml += '</div>';
+            content.appendChild(list);
         }
 
-        messageDiv.innerHTML = `
-            <div class="message-content">
-                ${contentHtml}
-            </div>
-        `;
-
-        chatMessages.appendChild(messageDiv);
+        messageDiv.replaceChildren(content);
         scrollToBottom();
-        return messageDiv.id;
     }
 
     function addTypingIndicator() {
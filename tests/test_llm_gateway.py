@@ -0,0 +1,57 @@
+"""
+Circuit breaker de la pasarela del LLM: una llamada de prueba cancelada
+no debe dejar el breaker en half_open para siempre
+"""
+import asyncio
+import time
+import unittest
+
+from backend.llm_gateway import LLMGateway, CircuitBreaker
+
+
+def half_open_gateway():
+    """Pasarela con el breaker abierto y ya fuera del tiempo de espera"""
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    return LLMGateway('test', deadline=1, retries=0, hedge=False, breaker=breaker)
+
+
+class CancelledProbeTest(unittest.TestCase):
+
+    def test_cancelled_async_probe_releases_breaker(self):
+        gateway = half_open_gateway()
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def main():
+            probe = asyncio.create_task(gateway.call_async(hang))
+            await asyncio.sleep(0.05)
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+
+            async def ok():
+                return 'ok'
+            return await gateway.call_async(ok)
+
+        self.assertEqual(asyncio.run(main()), 'ok')
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_stale_release_does_not_free_a_newer_probe(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        _, first = breaker.acquire()
+        breaker.record_failure()
+        time.sleep(0.02)
+        _, second = breaker.acquire()
+        breaker.release(first)
+        self.assertFalse(breaker.allow())
+        breaker.release(second)
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()